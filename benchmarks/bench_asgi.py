@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Load-test the I/O-bound endpoints under WSGI and ASGI.
+
+Starts a local Stripe stand-in (answers ``POST /v1/payment_intents`` after
+``--stripe-latency`` seconds), prepares a throwaway SQLite database with a
+customer, a cart and an order, then runs gunicorn twice with the same number
+of workers: sync workers on ``jewelry_catalog.wsgi`` and uvicorn workers on
+``jewelry_catalog.asgi``. Each endpoint (``health_check``, ``stripe_webhook``
+with a signed event, ``create_order_ajax`` and ``s3_diagnostic``) is hit by
+``--concurrency`` client threads for ``--duration`` seconds. Reports req/s,
+errors and p50/p95/p99 latency.
+
+Usage: python benchmarks/bench_asgi.py [--workers 2] [--concurrency 32] [--duration 10] [--stripe-latency 0.2]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from common import BASE_DIR, SERVERS, sqlite_url, start_server, start_stripe, summarize
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+ENDPOINTS = ['health_check', 'stripe_webhook', 'create_order_ajax', 's3_diagnostic']
+
+
+def prepare_database(env):
+    """Migrate and create the fixtures in a child process; returns the session key and order id."""
+    script = """
+import json, django
+django.setup()
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import Client
+from accounts.models import User
+from cart.models import Cart, CartItem
+from orders.models import Order
+from products.models import Category, Product
+
+call_command('migrate', verbosity=0)
+user = User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+category = Category.objects.create(name='Anillos', slug='anillos')
+cart, _ = Cart.objects.get_or_create(user=user)
+for index in range(3):
+    product = Product.objects.create(
+        name=f'Producto {index}', slug=f'producto-{index}', description='Producto de prueba',
+        price=Decimal('25.00'), category=category, stock=1000,
+    )
+    CartItem.objects.create(cart=cart, product=product, quantity=2)
+order = Order.objects.create(
+    user=user, shipping_address='Calle 1', subtotal=Decimal('150.00'), total=Decimal('150.00'),
+)
+client = Client()
+client.force_login(user)
+print(json.dumps({'session': client.cookies['sessionid'].value, 'order_id': order.id}))
+"""
+    result = subprocess.run(
+        [sys.executable, '-c', script], env=env, cwd=BASE_DIR, check=True, capture_output=True, text=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def webhook_request(order_id):
+    payload = json.dumps({
+        'id': 'evt_benchmark', 'object': 'event', 'type': 'payment_intent.succeeded',
+        'data': {'object': {
+            'id': 'pi_benchmark', 'object': 'payment_intent', 'metadata': {'order_id': str(order_id)},
+        }},
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return {'data': payload, 'headers': {
+        'Content-Type': 'application/json', 'Stripe-Signature': f't={timestamp},v1={signature}',
+    }}
+
+
+def requests_for(endpoint, base_url, fixtures):
+    """Return ``(method, url, kwargs builder)`` for one endpoint."""
+    if endpoint == 'health_check':
+        return 'GET', f'{base_url}/health/', dict
+    if endpoint == 'stripe_webhook':
+        return 'POST', f'{base_url}/orders/webhooks/stripe/', lambda: webhook_request(fixtures['order_id'])
+    if endpoint == 'create_order_ajax':
+        data = {'shipping_address': 'Calle 1', 'billing_option': 'same', 'payment_method': 'credit_card'}
+        return 'POST', f'{base_url}/orders/create-order/', lambda: {'data': data}
+    return 'GET', f'{base_url}/products/diagnostic/s3/', dict
+
+
+def load(method, url, build, cookies, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        session.cookies.update(cookies)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, allow_redirects=False, timeout=30, **build())
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            (latencies if ok else errors).append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors), time.perf_counter() - start
+
+
+def report(mode, endpoint, latencies, errors, elapsed):
+    summary = summarize(latencies, elapsed)
+    print(
+        f"{mode:<5} {endpoint:<18} {summary['rps']:8.1f} req/s  {errors:5d} errors  "
+        f"p50 {summary.get('p50_ms', 0):7.1f} ms  p95 {summary.get('p95_ms', 0):7.1f} ms  "
+        f"p99 {summary.get('p99_ms', 0):7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--stripe-latency', type=float, default=0.2)
+    parser.add_argument('--endpoint', choices=ENDPOINTS, action='append')
+    args = parser.parse_args()
+
+    stripe = start_stripe(args.stripe_latency)
+    database = Path(tempfile.mkdtemp()) / 'bench_asgi.sqlite3'
+    os.makedirs(BASE_DIR / 'logs', exist_ok=True)
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='jewelry_catalog.settings',
+        SECRET_KEY='benchmark',
+        DEBUG='True',
+        ALLOWED_HOSTS='127.0.0.1,localhost',
+        DATABASE_URL=sqlite_url(database),
+        STRIPE_SECRET_KEY='sk_test_benchmark',
+        STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+        STRIPE_API_BASE=f'http://127.0.0.1:{stripe.server_address[1]}',
+    )
+    fixtures = prepare_database(env)
+    cookies = {'sessionid': fixtures['session']}
+
+    print(
+        f'workers={args.workers} concurrency={args.concurrency} duration={args.duration}s '
+        f'stripe_latency={args.stripe_latency * 1000:.0f}ms'
+    )
+    for mode in SERVERS:
+        process, base_url = start_server(mode, args.workers, env)
+        try:
+            for endpoint in args.endpoint or ENDPOINTS:
+                method, url, build = requests_for(endpoint, base_url, fixtures)
+                report(mode, endpoint, *load(method, url, build, cookies, args.concurrency, args.duration))
+        finally:
+            process.terminate()
+            process.wait()
+    stripe.shutdown()
+    database.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark the streaming product export against building it in memory.
+
+Creates a throwaway SQLite catalog (on disk, so each page is a real read),
+then exports it in every format with ``ProductExporter`` and once
+with the old approach (model instances and one in-memory CSV). Reports
+rows/s and peak Python memory from tracemalloc.
+
+Usage: python benchmarks/bench_export.py [--rows 100000] [--chunk-size 2000]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+DATABASE = Path(tempfile.mkdtemp()) / 'bench_export.sqlite3'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jewelry_catalog.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.makedirs(BASE_DIR / 'logs', exist_ok=True)
+django.setup()
+
+from django.core.management import call_command
+
+from products.exports import FORMATS, ProductExporter
+from products.models import Category, Product
+
+
+def create_catalog(size):
+    categories = Category.objects.bulk_create(
+        Category(name=f'Categoría {index}', slug=f'categoria-{index}') for index in range(10)
+    )
+    types = [code for code, _ in Product.JEWELRY_TYPES]
+    materials = [code for code, _ in Product.MATERIALS]
+    for offset in range(0, size, 5000):
+        Product.objects.bulk_create(
+            Product(
+                name=f'Producto {index}',
+                slug=f'producto-{index}',
+                description='Producto de prueba',
+                price=Decimal(index % 500) + Decimal('0.99'),
+                jewelry_type=types[index % len(types)],
+                material=materials[index % len(materials)],
+                category=categories[index % len(categories)],
+                stock=10,
+            )
+            for index in range(offset, min(offset + 5000, size))
+        )
+
+
+def legacy_csv(queryset):
+    """The previous admin export: every row in memory, display methods per row."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Nombre', 'Tipo', 'Material', 'Precio', 'Stock', 'Disponible'])
+    for product in queryset:
+        writer.writerow([
+            product.name, product.get_jewelry_type_display(), product.get_material_display(),
+            product.price, product.stock, 'Sí' if product.available else 'No',
+        ])
+    queryset.count()
+    return [output.getvalue()]
+
+
+def measure(label, chunks, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks())
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f'{label:<10} {rows / duration:10.0f} rows/s  {size / 1e6:8.1f} MB out  '
+        f'{peak / 1e6:7.1f} MB peak memory'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    create_catalog(args.rows)
+    queryset = Product.objects.all()
+
+    print(f'rows={args.rows} chunk_size={args.chunk_size}')
+    measure('legacy', lambda: legacy_csv(queryset.all()), args.rows)
+    for fmt in FORMATS:
+        measure(fmt, lambda: ProductExporter(queryset.all(), fmt, args.chunk_size), args.rows)
+    DATABASE.unlink()
+
+
+if __name__ == '__main__':
+    main()
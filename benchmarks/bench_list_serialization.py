@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark ProductListSerializer against its ``.values()`` fast path.
+
+Serializes one page of products (page_size=100 by default) both ways on a
+throwaway in-memory SQLite database, checks the JSON is byte-identical and
+reports timings and query counts.
+
+Usage: python benchmarks/bench_list_serialization.py [--page-size 100] [--rounds 50]
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jewelry_catalog.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['DATABASE_URL'] = 'sqlite://:memory:'
+os.makedirs(BASE_DIR / 'logs', exist_ok=True)
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Category, Product
+from products.serializers import ProductListSerializer
+
+
+def create_catalog(size):
+    categories = Category.objects.bulk_create(
+        Category(name=f'Categoría {index}', slug=f'categoria-{index}') for index in range(10)
+    )
+    Product.objects.bulk_create(
+        Product(
+            name=f'Producto {index}',
+            slug=f'producto-{index}',
+            description='Producto de prueba',
+            price=Decimal(index % 500) + Decimal('0.99'),
+            category=categories[index % len(categories)],
+            stock=10,
+            image=f'/media/products/producto-{index}.jpg',
+        )
+        for index in range(size)
+    )
+
+
+def run(label, serialize, rounds):
+    with CaptureQueriesContext(connection) as queries:
+        body = JSONRenderer().render(serialize())
+    start = time.perf_counter()
+    for _ in range(rounds):
+        JSONRenderer().render(serialize())
+    per_page = (time.perf_counter() - start) / rounds * 1000
+    print(f'{label:<12} {per_page:8.2f} ms/page  {len(queries):3d} queries')
+    return body, per_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    create_catalog(args.page_size)
+
+    request = RequestFactory().get('/api/products/', HTTP_HOST='localhost')
+    queryset = Product.objects.filter(available=True).order_by('-created_at')[:args.page_size]
+
+    print(f'page_size={args.page_size} rounds={args.rounds}')
+    drf_body, drf_time = run(
+        'serializer',
+        lambda: ProductListSerializer(queryset.all(), many=True, context={'request': request}).data,
+        args.rounds,
+    )
+    fast_body, fast_time = run(
+        'values',
+        lambda: ProductListSerializer.serialize_values(
+            ProductListSerializer.values_queryset(queryset.all()), request
+        ),
+        args.rounds,
+    )
+
+    if drf_body != fast_body:
+        print('ERROR: fast path output differs from ProductListSerializer')
+        sys.exit(1)
+    print(f'identical output, speedup x{drf_time / fast_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for serializers, cart iteration and checkout.
+
+Builds a dataset with ``datagen.populate`` on a throwaway SQLite database,
+then times each case ``--rounds`` times in-process and counts its queries.
+Checkout cases run in a transaction that is rolled back, so every round
+starts from the same data. ``--json`` writes a report tagged with the git
+revision; ``--baseline`` compares against an earlier one. Log records below
+WARNING are dropped, so the timings leave out console logging.
+
+Usage: python benchmarks/bench_micro.py [--products 5000] [--orders 5000] [--rounds 200] [--json out.json] [--baseline old.json]
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import print_comparison, setup_django, sqlite_url, summarize, write_report
+
+DATABASE = Path(tempfile.mkdtemp()) / 'bench_micro.sqlite3'
+setup_django(sqlite_url(DATABASE))
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from cart.cart import CartSession
+from cart.models import Cart, CartItem
+from datagen import populate
+from orders.models import Order
+from orders.serializers import OrderListSerializer, OrderSerializer
+from orders.views import _create_order_from_cart
+from products.models import Product
+from products.serializers import ProductListSerializer, ProductSerializer
+
+CART_SIZE = 10
+
+
+def build_cases(page_size):
+    request = RequestFactory().get('/', HTTP_HOST='localhost')
+    user = get_user_model().objects.filter(orders__isnull=False).first()
+    products = Product.objects.filter(available=True).order_by('-created_at')
+    product_ids = list(products.values_list('pk', flat=True)[:CART_SIZE])
+    order_id = Order.objects.filter(user=user).values_list('pk', flat=True).first()
+
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.bulk_create(CartItem(cart=cart, product_id=pk, quantity=2) for pk in product_ids)
+    session_request = RequestFactory().get('/')
+    session_request.session = SessionStore()
+    session_cart = CartSession(session_request)
+    for product in Product.objects.filter(pk__in=product_ids):
+        session_cart.add(product, 2)
+
+    checkout_request = RequestFactory().post('/orders/create-order/', {
+        'shipping_address': 'Calle 1', 'billing_option': 'same', 'payment_method': 'credit_card',
+    })
+
+    def checkout():
+        with transaction.atomic():
+            order, errors = _create_order_from_cart(checkout_request, user)
+            assert order and not errors, errors
+            transaction.set_rollback(True)
+
+    def db_cart():
+        cart = Cart.objects.get(user=user)
+        return cart.subtotal, cart.total_items, [item.total_price for item in cart.items.all()]
+
+    def session_cart_iteration():
+        return session_cart.subtotal, [item['total_price'] for item in session_cart]
+
+    return {
+        'product_list_values': lambda: ProductListSerializer.serialize_values(
+            ProductListSerializer.values_queryset(products[:page_size]), request
+        ),
+        'product_list_serializer': lambda: ProductListSerializer(
+            products[:page_size], many=True, context={'request': request}
+        ).data,
+        'product_detail': lambda: ProductSerializer(
+            Product.objects.select_related('category').get(pk=product_ids[0]), context={'request': request}
+        ).data,
+        'order_list': lambda: OrderListSerializer(
+            Order.objects.filter(user=user).order_by('-created_at')[:20], many=True, context={'request': request}
+        ).data,
+        'order_detail': lambda: OrderSerializer(Order.objects.get(pk=order_id), context={'request': request}).data,
+        'cart_db_iteration': db_cart,
+        'cart_session_iteration': session_cart_iteration,
+        'checkout_create_order': checkout,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--case', action='append', help='run only these cases')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with a report written by --json')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    call_command('migrate', verbosity=0)
+    populate(args.products, args.users, args.orders, args.seed)
+    cases = build_cases(args.page_size)
+
+    print(f'products={args.products} orders={args.orders} rounds={args.rounds}')
+    results = {}
+    for name, case in cases.items():
+        if args.case and name not in args.case:
+            continue
+        with CaptureQueriesContext(connection) as queries:
+            case()
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - start)
+        results[name] = dict(summarize(timings), queries=len(queries))
+        summary = results[name]
+        print(
+            f"{name:<24} mean {summary['mean_ms']:8.2f} ms  p50 {summary['p50_ms']:8.2f} ms  "
+            f"p95 {summary['p95_ms']:8.2f} ms  {summary['queries']:3d} queries"
+        )
+
+    if args.json:
+        write_report(args.json, 'micro', vars(args), results)
+    if args.baseline:
+        print_comparison(results, args.baseline)
+    DATABASE.unlink()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
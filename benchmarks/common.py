@@ -0,0 +1,159 @@
+"""
+Helpers shared by the benchmark scripts.
+
+- ``setup_django``: configure a throwaway database and call ``django.setup()``.
+- ``start_stripe``: a local Stripe stand-in with a fixed latency.
+- ``start_server`` / ``wait_until_ready``: run gunicorn (WSGI or ASGI) on a free port
+  and wait for ``/ready/``.
+- ``summarize``, ``write_report``, ``print_comparison``: latency percentiles
+  and JSON reports tagged with the git revision, so runs of different
+  commits can be compared (``--baseline``).
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SERVERS = {
+    'wsgi': ['jewelry_catalog.wsgi:application', '-k', 'sync'],
+    'asgi': ['jewelry_catalog.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def sqlite_url(path):
+    """SQLite URL where concurrent writers queue for the lock instead of failing."""
+    return f'sqlite:///{path}?transaction_mode=IMMEDIATE&timeout=30&init_command=PRAGMA+journal_mode%3DWAL'
+
+
+def setup_django(database_url, settings_module='jewelry_catalog.settings'):
+    if str(BASE_DIR) not in sys.path:
+        sys.path.append(str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = database_url
+    os.makedirs(BASE_DIR / 'logs', exist_ok=True)
+    import django
+    django.setup()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stripe(latency):
+    """Answer every POST (PaymentIntent create/confirm) after ``latency`` seconds, like a remote API."""
+
+    class StripeHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                'id': 'pi_benchmark', 'object': 'payment_intent',
+                'client_secret': 'pi_benchmark_secret', 'status': 'succeeded',
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), StripeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_server(mode, workers, env, port=None):
+    """Start gunicorn with ``workers`` workers; returns ``(process, base_url)`` once it answers."""
+    app, *worker = SERVERS[mode]
+    port = port or free_port()
+    process = subprocess.Popen(
+        ['gunicorn', app, *worker, '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'warning', '--timeout', '120'],
+        env=env, cwd=BASE_DIR,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    wait_until_ready(base_url, process)
+    return process, base_url
+
+
+def wait_until_ready(base_url, process):
+    import requests
+
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            # Workers warm up before accepting, and /ready/ answers 503 if that failed
+            if requests.get(f'{base_url}/ready/', timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def summarize(latencies, elapsed=None):
+    """Return ``{count, rps, mean_ms, p50_ms, p95_ms, p99_ms}`` for latencies in seconds."""
+    summary = {'count': len(latencies)}
+    if elapsed:
+        summary['rps'] = round(len(latencies) / elapsed, 1)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+        summary.update(
+            mean_ms=round(statistics.fmean(latencies) * 1000, 2),
+            p50_ms=round(cuts[49] * 1000, 2),
+            p95_ms=round(cuts[94] * 1000, 2),
+            p99_ms=round(cuts[98] * 1000, 2),
+        )
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_report(path, name, parameters, results):
+    """Write ``results`` (``{label: summary}``) as JSON, tagged with the revision and parameters."""
+    report = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': parameters,
+        'results': results,
+    }
+    Path(path).write_text(json.dumps(report, indent=2))
+    return report
+
+
+def print_comparison(results, baseline_path, metrics=('p50_ms', 'p95_ms', 'queries')):
+    """Print ``metric: old -> new (change)`` per label against a previous report."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\ncompared with {baseline['revision']} ({baseline['timestamp']})")
+    for label, summary in results.items():
+        old = baseline['results'].get(label)
+        if not old:
+            continue
+        changes = []
+        for metric in metrics:
+            if metric in summary and old.get(metric):
+                change = (summary[metric] - old[metric]) / old[metric] * 100
+                changes.append(f'{metric} {old[metric]} -> {summary[metric]} ({change:+.0f}%)')
+        print(f"{label:<24} {'  '.join(changes)}")
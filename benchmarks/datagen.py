@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Generate a benchmark dataset with ``create_sample_data`` at scale.
+
+A thin wrapper over ``create_sample_data --products --users --orders --seed``
+(see ``products.sample_data``) for scripts that build their own throwaway
+database. The same ``--seed`` always produces the same data.
+
+Usage: python benchmarks/datagen.py --database-url sqlite:////tmp/bench.sqlite3 [--products 10000] [--users 1000] [--orders 20000] [--seed 0]
+"""
+import argparse
+import time
+from io import StringIO
+
+from common import setup_django
+
+
+def populate(products=10000, users=1000, orders=20000, seed=0):
+    """Create the dataset in the configured database; returns ``{model: rows}``."""
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from orders.models import Order, OrderItem
+    from products.models import Product
+
+    call_command(
+        'create_sample_data', products=products, users=users, orders=orders, seed=seed, stdout=StringIO(),
+    )
+    return {
+        'products': Product.objects.count(),
+        'users': get_user_model().objects.count(),
+        'orders': Order.objects.count(),
+        'order_items': OrderItem.objects.count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    start = time.perf_counter()
+    counts = populate(args.products, args.users, args.orders, args.seed)
+    print(f"{counts} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
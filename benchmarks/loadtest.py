@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Scripted storefront load test: browse, add to cart, check out.
+
+Builds a dataset with ``datagen.populate`` on a throwaway SQLite database,
+logs in ``--clients`` customers, then starts gunicorn with
+``benchmarks.settings`` (query counts in response headers, emails kept in
+memory) and a local Stripe stand-in. Each client repeats the journey
+
+    product list -> product API -> product detail -> add to cart -> checkout page -> place order
+
+for ``--duration`` seconds. Reports, per step, req/s, p50/p95/p99 latency and
+mean queries and database time per request. ``--json`` writes the report
+tagged with the git revision; ``--baseline`` compares against an earlier one.
+
+The server runs with DEBUG=True (no HTTPS redirects or collected static
+files needed), so checkout also confirms the PaymentIntent as in development.
+
+Usage: python benchmarks/loadtest.py [--products 5000] [--clients 16] [--workers 4] [--duration 30] [--json out.json] [--baseline old.json]
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+from common import print_comparison, setup_django, sqlite_url, start_server, start_stripe, summarize, write_report
+
+STEPS = ['product_list', 'product_api', 'product_detail', 'cart_add', 'checkout_page', 'place_order']
+CHECKOUT_DATA = {
+    'shipping_address': 'Calle 1', 'billing_option': 'same', 'payment_method': 'credit_card', 'agree_terms': 'on',
+}
+
+
+def prepare(database, args):
+    """Create the dataset and log in the clients; returns ``(session keys, [(product id, slug)])``."""
+    setup_django(sqlite_url(database))
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test import Client
+
+    from accounts.models import User
+    from datagen import populate
+    from products.models import Product
+
+    logging.disable(logging.INFO)
+    call_command('migrate', verbosity=0)
+    populate(args.products, max(args.users, args.clients), args.orders, args.seed)
+    sessions = []
+    for user in User.objects.filter(username__startswith='cliente').order_by('pk')[:args.clients]:
+        client = Client()
+        client.force_login(user)
+        sessions.append(client.cookies['sessionid'].value)
+    products = list(
+        Product.objects.filter(available=True, stock__gte=10).order_by('?').values_list('pk', 'slug')[:500]
+    )
+    logging.disable(logging.NOTSET)
+    connections.close_all()
+    return sessions, products
+
+
+class Journey:
+    """One client walking the storefront; records ``(step, seconds, queries, db ms, ok)``."""
+
+    def __init__(self, base_url, session_key, products, record, seed):
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.http.cookies.set('sessionid', session_key)
+        self.products = products
+        self.record = record
+        self.rng = random.Random(seed)
+
+    def request(self, step, method, path, ok=lambda response: response.status_code < 400, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.http.cookies.get('csrftoken', '')
+        start = time.perf_counter()
+        try:
+            response = self.http.request(
+                method, self.base_url + path, headers=headers, allow_redirects=False, timeout=60, **kwargs
+            )
+        except requests.RequestException:
+            self.record(step, time.perf_counter() - start, None, None, False)
+            return None
+        self.record(
+            step, time.perf_counter() - start, int(response.headers.get('X-Queries', 0)),
+            float(response.headers.get('X-DB-Time', 0)), ok(response),
+        )
+        return response
+
+    def run_once(self):
+        product_id, slug = self.rng.choice(self.products)
+        self.request('product_list', 'GET', '/products/')
+        self.request('product_api', 'GET', '/api/products/list/')
+        self.request('product_detail', 'GET', f'/products/{product_id}/{slug}/')
+        self.request(
+            'cart_add', 'POST', f'/cart/add/{product_id}/', data={'quantity': 1},
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        self.request('checkout_page', 'GET', '/orders/checkout/')
+        self.request(
+            'place_order', 'POST', '/orders/checkout/', data=CHECKOUT_DATA,
+            ok=lambda response: 'confirmation' in response.headers.get('Location', ''),
+        )
+
+
+def run_load(base_url, sessions, products, duration, seed):
+    samples = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(step, seconds, queries, db_ms, ok):
+        with lock:
+            samples[step].append((seconds, queries, db_ms, ok))
+
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        journey = Journey(base_url, sessions[index], products, record, seed + index)
+        while time.perf_counter() < deadline:
+            journey.run_once()
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(len(sessions))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def report(samples, elapsed):
+    results = {}
+    for step in STEPS:
+        rows = samples.get(step, [])
+        succeeded = [row for row in rows if row[3]]
+        summary = summarize([row[0] for row in succeeded], elapsed)
+        counted = [row for row in succeeded if row[1] is not None]
+        if counted:
+            summary['queries'] = round(sum(row[1] for row in counted) / len(counted), 1)
+            summary['db_ms'] = round(sum(row[2] for row in counted) / len(counted), 2)
+        summary['errors'] = len(rows) - len(succeeded)
+        results[step] = summary
+        print(
+            f"{step:<16} {summary.get('rps', 0):7.1f} req/s  {summary['errors']:4d} errors  "
+            f"p50 {summary.get('p50_ms', 0):8.1f} ms  p95 {summary.get('p95_ms', 0):8.1f} ms  "
+            f"p99 {summary.get('p99_ms', 0):8.1f} ms  {summary.get('queries', 0):6.1f} queries  "
+            f"{summary.get('db_ms', 0):7.2f} ms db"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--stripe-latency', type=float, default=0.1)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with a report written by --json')
+    args = parser.parse_args()
+
+    database = Path(tempfile.mkdtemp()) / 'loadtest.sqlite3'
+    sessions, products = prepare(database, args)
+    stripe = start_stripe(args.stripe_latency)
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='benchmarks.settings',
+        SECRET_KEY='benchmark',
+        DEBUG='True',
+        ALLOWED_HOSTS='127.0.0.1,localhost',
+        DATABASE_URL=sqlite_url(database),
+        STRIPE_SECRET_KEY='sk_test_benchmark',
+        STRIPE_API_BASE=f'http://127.0.0.1:{stripe.server_address[1]}',
+    )
+    process, base_url = start_server('wsgi', args.workers, env)
+    try:
+        print(
+            f'products={args.products} clients={args.clients} workers={args.workers} '
+            f'duration={args.duration}s stripe_latency={args.stripe_latency * 1000:.0f}ms'
+        )
+        samples, elapsed = run_load(base_url, sessions, products, args.duration, args.seed)
+        results = report(samples, elapsed)
+    finally:
+        process.terminate()
+        process.wait()
+        stripe.shutdown()
+
+    if args.json:
+        write_report(args.json, 'loadtest', vars(args), results)
+    if args.baseline:
+        print_comparison(results, args.baseline)
+    database.unlink()
+
+
+if __name__ == '__main__':
+    main()
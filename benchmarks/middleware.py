@@ -0,0 +1,34 @@
+"""Response headers with the number of queries and database time of each request (load tests only)."""
+import time
+
+from django.db import connections
+
+
+class QueryCountMiddleware:
+    """Count the queries of every database connection while the request is handled."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'queries': 0, 'seconds': 0.0}
+
+        def count(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['seconds'] += time.perf_counter() - start
+
+        wrappers = [connection.execute_wrapper(count) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        response['X-Queries'] = stats['queries']
+        response['X-DB-Time'] = f"{stats['seconds'] * 1000:.2f}"
+        return response
@@ -0,0 +1,14 @@
+"""
+Settings for servers under load test (``DJANGO_SETTINGS_MODULE=benchmarks.settings``).
+
+The project settings plus:
+
+- ``QueryCountMiddleware``, which reports each response's database work in
+  ``X-Queries`` and ``X-DB-Time`` headers (without DEBUG's query log).
+- Emails kept in memory instead of sent.
+"""
+from jewelry_catalog.settings import *  # noqa: F401,F403
+from jewelry_catalog.settings import MIDDLEWARE
+
+MIDDLEWARE = ['benchmarks.middleware.QueryCountMiddleware', *MIDDLEWARE]
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration, read automatically from the working directory
+(``gunicorn jewelry_catalog.wsgi:application`` in the Procfile, or the ASGI
+command in the README).
+
+Every worker warms up (``jewelry_catalog.warmup``) before it accepts its
+first connection. The hook is ``post_worker_init``, not ``post_fork``: a
+forked worker only loads Django afterwards, unless ``preload_app`` is set.
+Warmed objects are then frozen out of garbage collection (``gc.freeze``).
+Set ``WARMUP_ON_START=False`` to skip it; ``/ready/`` then warms each worker
+on its first probe instead.
+"""
+import gc
+import os
+
+
+def post_worker_init(worker):
+    if os.getenv('WARMUP_ON_START', 'True') != 'True':
+        return
+    from jewelry_catalog.warmup import warm_up
+
+    # Heartbeat after each step, so a slow warm-up is not taken for a hung worker
+    state = warm_up(progress=lambda step: worker.notify())
+    # Move what warm-up built (modules, templates, cached catalog) out of the
+    # collector's reach: otherwise the next full collection, in the middle of
+    # some request, walks all of it
+    gc.collect()
+    gc.freeze()
+    if not state['ready']:
+        failed = [name for name, result in state['steps'].items() if not result['ok']]
+        worker.log.warning(f"Worker {worker.pid} warm-up incomplete ({', '.join(failed)}); /ready/ will retry")
@@ -1,6 +1,7 @@
 # home/views.py
 from django.shortcuts import render
 from django.views.generic import TemplateView
+from django.core.cache import cache
 from products.models import Product
 from .models import Banner, SocialMedia
 import logging
@@ -8,6 +9,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def get_featured_products():
+    """Featured products for the home page, cached until the catalog changes."""
+    featured_products = cache.get('featured_products')
+    if featured_products is None:
+        featured_products = list(
+            Product.objects.filter(available=True).select_related('category').order_by('-created_at')[:8]
+        )
+        cache.set('featured_products', featured_products, 600)
+    return featured_products
+
+
 class IndexView(TemplateView):
     """Class-based view for the home page."""
     template_name = 'home/index.html'
@@ -22,8 +34,8 @@ class IndexView(TemplateView):
             # Obtener redes sociales activas ordenadas por prioridad
             active_social_media = SocialMedia.objects.filter(is_active=True).order_by('order', 'platform')
 
-            # Obtener productos destacados
-            featured_products = Product.objects.filter(available=True).order_by('-created_at')[:8]
+            # Obtener productos destacados (cacheados hasta que cambie el catálogo)
+            featured_products = get_featured_products()
 
             logger.debug(f"Mostrando {len(active_banners)} banners, {len(active_social_media)} redes sociales y {len(featured_products)} productos")
 
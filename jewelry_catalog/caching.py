@@ -0,0 +1,28 @@
+"""
+Cache timeouts that hold across worker processes.
+
+``LocMemCache`` (the default, and production's fallback without Redis) is
+per process: deleting a key or bumping a version only reaches the worker
+that made the change. Data invalidated that way must not be cached for long
+in such a cache, or the other workers keep serving it. ``shared_timeout``
+caps its timeout at ``LOCAL_CACHE_TIMEOUT`` seconds when the cache is per
+process, so every worker catches up within that window; with a shared cache
+(Redis) the timeout is left alone.
+"""
+from django.conf import settings
+
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def is_process_local(alias='default'):
+    """Whether cache ``alias`` is private to each process."""
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+def shared_timeout(timeout, alias='default'):
+    """``timeout`` (None: forever), capped at ``LOCAL_CACHE_TIMEOUT`` for a per-process cache."""
+    if not is_process_local(alias):
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_TIMEOUT
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
@@ -315,6 +315,12 @@ def get_system_health():
         cache.set('health_check', 'ok', 10)
         cache_status = "healthy" if cache.get('health_check') == 'ok' else "unhealthy"
 
+        # Media storage latency from the cached background probe (never probed inline)
+        from products.storage_probe import get_storage_health
+        from .storage import storage_metrics
+        storage_status = get_storage_health()
+        storage_status['operations'] = storage_metrics.snapshot()
+
         # Get metrics summary
         metrics = metrics_collector.get_metrics_summary()
 
@@ -322,6 +328,7 @@ def get_system_health():
             'status': 'healthy',
             'database': db_status,
             'cache': cache_status,
+            'storage': storage_status,
             'metrics': metrics,
             'timestamp': timezone.now().isoformat(),
         }
@@ -1,39 +1,129 @@
+"""
+Monitoring and logging middleware.
+
+Every class is hybrid (``sync_capable`` and ``async_capable``): under WSGI
+it runs ``__call__`` as before, under ASGI Django hands it an async
+``get_response`` and the request goes through ``__acall__`` on the event
+loop, with no ``sync_to_async`` thread hop per middleware. Subclasses of
+``HybridMiddleware`` only implement ``process_request`` and
+``process_response``, which must not touch the database: the user is only
+read when something else already loaded it (``_get_loaded_user``).
+"""
 import time
+import traceback
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
 import logging
-from django.utils.deprecation import MiddlewareMixin
-from django.conf import settings
 
 logger = logging.getLogger('api')
 performance_logger = logging.getLogger('cache')
 
+SUSPICIOUS_USER_AGENTS = [
+    'sqlmap',
+    'nmap',
+    'masscan',
+    'dirbuster',
+    'gobuster',
+    'nikto',
+    'acunetix',
+    'openvas'
+]
+# Paths where unauthenticated requests are logged as access attempts
+MONITORED_PATHS = ['/accounts/login/', '/api/orders/']
 
-class PerformanceMonitoringMiddleware(MiddlewareMixin):
-    """Middleware for monitoring API performance and logging requests."""
+
+def _get_client_ip(request):
+    """Get the client IP address."""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _is_api_request(request):
+    """Check if the request is to an API endpoint."""
+    return (
+        request.path.startswith('/api/') or
+        'application/json' in request.META.get('HTTP_ACCEPT', '') or
+        request.META.get('CONTENT_TYPE', '').startswith('application/json')
+    )
+
+
+def _get_loaded_user(request):
+    """
+    Return the request's user if the view (or DRF) already loaded it, else None.
+
+    Never queries: evaluating ``request.user`` would hit the session and user
+    tables from the middleware, and is not allowed on the event loop.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject):
+        user = getattr(request, '_cached_user', None) or getattr(request, '_acached_user', None)
+    return user
+
+
+def _get_user_label(request):
+    user = _get_loaded_user(request)
+    if user is None:
+        return 'unknown'
+    return user.id if user.is_authenticated else 'anonymous'
+
+
+class HybridMiddleware:
+    """Base for middleware that runs natively in both the sync and the async stack."""
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+
+class PerformanceMonitoringMiddleware(HybridMiddleware):
+    """Middleware for monitoring API performance and logging requests."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
         self.api_logger = logging.getLogger('api')
         self.performance_logger = logging.getLogger('cache')
 
-    def __call__(self, request):
+    def process_request(self, request):
         # Start timing
-        start_time = time.time()
+        request._monitoring_start = time.perf_counter()
 
         # Log incoming request
-        if self._is_api_request(request):
+        if _is_api_request(request):
             self.api_logger.info(
                 f"API Request: {request.method} {request.path} "
-                f"from {self._get_client_ip(request)}"
+                f"from {_get_client_ip(request)}"
             )
 
-        # Process request
-        response = self.get_response(request)
-
+    def process_response(self, request, response):
         # Calculate response time
-        duration = time.time() - start_time
+        duration = time.perf_counter() - request._monitoring_start
 
         # Log performance metrics
-        if self._is_api_request(request):
+        if _is_api_request(request):
             self._log_api_performance(request, response, duration)
         elif duration > 1.0:  # Log slow requests (> 1 second)
             self.performance_logger.warning(
@@ -43,45 +133,21 @@ class PerformanceMonitoringMiddleware(MiddlewareMixin):
 
         return response
 
-    def _is_api_request(self, request):
-        """Check if the request is to an API endpoint."""
-        return (
-            request.path.startswith('/api/') or
-            'application/json' in request.META.get('HTTP_ACCEPT', '') or
-            request.META.get('CONTENT_TYPE', '').startswith('application/json')
-        )
-
-    def _get_client_ip(self, request):
-        """Get the client IP address."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
     def _log_api_performance(self, request, response, duration):
         """Log API performance metrics."""
         status_code = response.status_code
-        method = request.method
-        path = request.path
-        user = getattr(request, 'user', None)
-        user_id = user.id if user and user.is_authenticated else 'anonymous'
 
         # Determine log level based on response status
         if status_code >= 500:
-            log_level = 'error'
             log_method = self.api_logger.error
         elif status_code >= 400:
-            log_level = 'warning'
             log_method = self.api_logger.warning
         else:
-            log_level = 'info'
             log_method = self.api_logger.info
 
         log_method(
-            f"API Response: {method} {path} {status_code} "
-            f"({duration:.3f}s) User: {user_id}"
+            f"API Response: {request.method} {request.path} {status_code} "
+            f"({duration:.3f}s) User: {_get_user_label(request)}"
         )
 
         # Log additional details for errors
@@ -91,17 +157,14 @@ class PerformanceMonitoringMiddleware(MiddlewareMixin):
             )
 
 
-class CacheMonitoringMiddleware(MiddlewareMixin):
+class CacheMonitoringMiddleware(HybridMiddleware):
     """Middleware for monitoring cache performance."""
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.cache_logger = logging.getLogger('cache')
 
-    def __call__(self, request):
-        # Track cache hits/misses if available
-        response = self.get_response(request)
-
+    def process_response(self, request, response):
         # Log cache headers if present
         cache_control = response.get('Cache-Control', '')
         if cache_control:
@@ -112,106 +175,103 @@ class CacheMonitoringMiddleware(MiddlewareMixin):
         return response
 
 
-class SecurityMonitoringMiddleware(MiddlewareMixin):
+class SecurityMonitoringMiddleware(HybridMiddleware):
     """Middleware for monitoring security-related events."""
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.security_logger = logging.getLogger('django.security')
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self._check_user_agent(request)
+        # Monitor failed authentication attempts
+        if request.path in MONITORED_PATHS and hasattr(request, 'user'):
+            self._check_authentication(request, request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._check_user_agent(request)
+        # Only these paths load the user, which the view needs anyway
+        if request.path in MONITORED_PATHS and hasattr(request, 'auser'):
+            self._check_authentication(request, await request.auser())
+        return await self.get_response(request)
+
+    def _check_user_agent(self, request):
         # Monitor suspicious activities
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         if self._is_suspicious_user_agent(user_agent):
             self.security_logger.warning(
-                f"Suspicious User-Agent: {user_agent} from {self._get_client_ip(request)}"
+                f"Suspicious User-Agent: {user_agent} from {_get_client_ip(request)}"
             )
 
-        # Monitor failed authentication attempts
-        if hasattr(request, 'user') and not request.user.is_authenticated:
-            if request.path in ['/accounts/login/', '/api/orders/']:
-                self.security_logger.info(
-                    f"Unauthenticated access attempt: {request.method} {request.path}"
-                )
-
-        response = self.get_response(request)
-        return response
+    def _check_authentication(self, request, user):
+        if not user.is_authenticated:
+            self.security_logger.info(
+                f"Unauthenticated access attempt: {request.method} {request.path}"
+            )
 
     def _is_suspicious_user_agent(self, user_agent):
         """Check for suspicious user agents."""
-        suspicious_patterns = [
-            'sqlmap',
-            'nmap',
-            'masscan',
-            'dirbuster',
-            'gobuster',
-            'nikto',
-            'acunetix',
-            'openvas'
-        ]
-        return any(pattern.lower() in user_agent.lower() for pattern in suspicious_patterns)
-
-    def _get_client_ip(self, request):
-        """Get the client IP address."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        user_agent = user_agent.lower()
+        return any(pattern in user_agent for pattern in SUSPICIOUS_USER_AGENTS)
 
 
-import logging
-import traceback
+class ErrorLoggingMiddleware(HybridMiddleware):
+    """Log unhandled exceptions with their traceback before re-raising them."""
 
-class ErrorLoggingMiddleware:
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.logger = logging.getLogger('django.request')
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         try:
             return self.get_response(request)
         except Exception as e:
-            self.logger.error(
-                "Unhandled exception on %s %s: %s\n%s",
-                request.method,
-                request.path,
-                str(e),
-                traceback.format_exc()
-            )
+            self._log_exception(request, e)
             raise
 
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            self._log_exception(request, e)
+            raise
+
+    def _log_exception(self, request, e):
+        self.logger.error(
+            "Unhandled exception on %s %s: %s\n%s",
+            request.method,
+            request.path,
+            str(e),
+            traceback.format_exc()
+        )
+
 
-class RequestLoggingMiddleware(MiddlewareMixin):
+class RequestLoggingMiddleware(HybridMiddleware):
     """Enhanced request logging middleware."""
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.request_logger = logging.getLogger('django.request')
 
-    def __call__(self, request):
+    def process_request(self, request):
         # Log detailed request information
-        self.request_logger.debug(
-            f"Request: {request.method} {request.path} "
-            f"User: {getattr(request, 'user', 'anonymous')} "
-            f"IP: {self._get_client_ip(request)}"
-        )
-
-        response = self.get_response(request)
+        if self.request_logger.isEnabledFor(logging.DEBUG):
+            self.request_logger.debug(
+                f"Request: {request.method} {request.path} "
+                f"IP: {_get_client_ip(request)}"
+            )
 
+    def process_response(self, request, response):
         # Log response information
-        self.request_logger.debug(
-            f"Response: {response.status_code} for {request.path}"
-        )
+        if self.request_logger.isEnabledFor(logging.DEBUG):
+            self.request_logger.debug(
+                f"Response: {response.status_code} for {request.path} "
+                f"User: {_get_user_label(request)}"
+            )
 
         return response
-
-    def _get_client_ip(self, request):
-        """Get the client IP address."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
@@ -6,10 +6,6 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Configurar PyMySQL para MySQL
-import pymysql
-pymysql.install_as_MySQLdb()
-
 # Load environment variables
 load_dotenv()
 
@@ -27,6 +23,7 @@ CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'http://localhost:8000,
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
 
 
 # =======================
@@ -96,6 +93,16 @@ TEMPLATES = [
     },
 ]
 
+# Cached loader: each template is compiled once per process. Django already
+# defaults to it, but set explicitly outside DEBUG (see below) it stays on
+# whatever the defaults become. 'loaders' and APP_DIRS are exclusive.
+CACHED_TEMPLATE_LOADERS = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
 WSGI_APPLICATION = 'jewelry_catalog.wsgi.application'
 
 # =======================
@@ -130,6 +137,14 @@ else:
         }
     }
 
+# Configurar PyMySQL para MySQL (solo si se usa: no cargarlo en cada worker)
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.mysql':
+    import pymysql
+    pymysql.install_as_MySQLdb()
+    # MySQL has no partial indexes: Django skips the catalog's (models.W037)
+    # and migration products/0006_query_indexes creates composite ones instead
+    SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 # =======================
 # Authentication
 # =======================
@@ -183,6 +198,14 @@ else:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Django 5.1+ reads storages only from STORAGES (STATICFILES_STORAGE above is
+# not used). Media goes through the instrumented backends of
+# jewelry_catalog.storage; settings_production switches it to S3.
+STORAGES = {
+    'default': {'BACKEND': 'jewelry_catalog.storage.InstrumentedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # =======================
 # Custom Settings
 # =======================
@@ -193,6 +216,33 @@ DEFAULT_SHIPPING_COST = float(os.getenv('DEFAULT_SHIPPING_COST', 5.00))
 # Cart Settings
 CART_SESSION_ID = 'cart'
 
+# Longest time, in seconds, a worker may serve data another worker has
+# invalidated, when the cache is per process (jewelry_catalog.caching)
+LOCAL_CACHE_TIMEOUT = int(os.getenv('LOCAL_CACHE_TIMEOUT', 60))
+
+# Catalog snapshot: optional directory shared by workers for pre-serialized JSON
+CATALOG_SNAPSHOT_DIR = os.getenv('CATALOG_SNAPSHOT_DIR')
+
+# Largest accepted image upload, in bytes
+IMAGE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+
+# Lifetime of direct-to-storage (presigned) upload URLs, in seconds
+PRESIGNED_UPLOAD_EXPIRY = 15 * 60
+
+# Image derivatives (thumbnails) generated after upload
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1280)
+IMAGE_DERIVATIVE_FORMATS = ('webp', 'jpeg')
+IMAGE_DERIVATIVES_ASYNC = os.getenv('IMAGE_DERIVATIVES_ASYNC', 'True') == 'True'
+
+# Storage health probe (products.storage_probe): seconds between probes, and
+# whether web processes may run it in a background thread when it is stale
+STORAGE_PROBE_INTERVAL = int(os.getenv('STORAGE_PROBE_INTERVAL', 5 * 60))
+STORAGE_PROBE_IN_PROCESS = os.getenv('STORAGE_PROBE_IN_PROCESS', 'True') == 'True'
+
+# Per-template and per-include render timing (jewelry_catalog.template_timing),
+# reported by /metrics/
+TEMPLATE_TIMING = os.getenv('TEMPLATE_TIMING', 'False') == 'True'
+
 # =======================
 # Production Security & Performance
 # =======================
@@ -210,6 +260,8 @@ if not DEBUG:
 
     # Performance optimizations
     CONN_MAX_AGE = 60  # Database connection pooling
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = CACHED_TEMPLATE_LOADERS
     USE_TZ = True
 
     # File handling
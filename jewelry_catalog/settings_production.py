@@ -1,17 +1,22 @@
 """
 Production settings for jewelry catalog application.
 This file contains production-specific configurations.
+
+Nothing here prints or touches the filesystem: this module is imported by
+every worker at boot. ``/products/diagnostic/s3/`` and ``profile_startup`` report
+the resulting configuration.
 """
 import os
 from .settings import *
+import logging
 
 # Override production settings
 DEBUG = False
+# Compile templates once per process, even if DEBUG was on in the environment
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = CACHED_TEMPLATE_LOADERS
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'yourdomain.com,www.yourdomain.com').split(',')
 
-# Debug ALLOWED_HOSTS
-print(f"[HOSTS] ALLOWED_HOSTS: {ALLOWED_HOSTS}")
-
 # Database - Use DATABASE_URL for production (Render standard)
 if os.getenv('DATABASE_URL'):
     import dj_database_url
@@ -82,23 +87,6 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-# Debug static files configuration
-print(f"[STATIC] STATIC_URL: {STATIC_URL}")
-print(f"[STATIC] STATICFILES_DIRS: {STATICFILES_DIRS}")
-print(f"[STATIC] STATIC_ROOT: {STATIC_ROOT}")
-print(f"[STATIC] STATICFILES_STORAGE: {STATICFILES_STORAGE}")
-
-# Verify banners exist in static directory
-banners_dir = os.path.join(BASE_DIR, 'static', 'images', 'banners')
-if os.path.exists(banners_dir):
-    banner_files = os.listdir(banners_dir)
-    print(f"[BANNERS] Found banner files: {banner_files}")
-    for banner_file in banner_files:
-        banner_path = os.path.join(banners_dir, banner_file)
-        print(f"[BANNERS] {banner_file}: exists={os.path.exists(banner_path)}")
-else:
-    print(f"[BANNERS] ERROR: Banners directory not found at {banners_dir}")
-
 # Security settings
 SECURE_SSL_REDIRECT = True
 SECURE_HSTS_SECONDS = 31536000  # 1 year
@@ -161,44 +149,28 @@ AWS_S3_FILE_OVERWRITE = False
 AWS_S3_VERIFY = True
 
 # Use S3 for media files (only if credentials are available)
-print(f"[S3] === S3 CONFIGURATION CHECK ===")
-print(f"[S3] AWS_ACCESS_KEY_ID: '{AWS_ACCESS_KEY_ID}' (length: {len(AWS_ACCESS_KEY_ID) if AWS_ACCESS_KEY_ID else 0})")
-print(f"[S3] AWS_SECRET_ACCESS_KEY: '{'***' + AWS_SECRET_ACCESS_KEY[-4:] if AWS_SECRET_ACCESS_KEY else 'None'}' (length: {len(AWS_SECRET_ACCESS_KEY) if AWS_SECRET_ACCESS_KEY else 0})")
-print(f"[S3] AWS_STORAGE_BUCKET_NAME: '{AWS_STORAGE_BUCKET_NAME}'")
-print(f"[S3] AWS_S3_REGION_NAME: '{AWS_S3_REGION_NAME}'")
-
 if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and AWS_STORAGE_BUCKET_NAME:
-    print(f"[S3] ✅ All credentials present - configuring S3 storage")
-    print(f"[S3] Bucket: {AWS_STORAGE_BUCKET_NAME}")
-    print(f"[S3] Region: {AWS_S3_REGION_NAME}")
-    print(f"[S3] Custom domain: {AWS_S3_CUSTOM_DOMAIN}")
-
-    # Use standard S3 storage (compatible with django-storages 1.14.4)
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    # S3 storage with a shared, pooled client and per-operation metrics
+    DEFAULT_FILE_STORAGE = 'jewelry_catalog.storage.InstrumentedS3Storage'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/'
-    print(f"[S3] ✅ S3 storage configured successfully")
-    print(f"[S3] Media URL: {MEDIA_URL}")
-
 else:
-    print(f"[S3] ❌ S3 credentials incomplete - using local storage fallback")
-    if not AWS_ACCESS_KEY_ID:
-        print(f"[S3] ❌ AWS_ACCESS_KEY_ID is missing or empty")
-    if not AWS_SECRET_ACCESS_KEY:
-        print(f"[S3] ❌ AWS_SECRET_ACCESS_KEY is missing or empty")
-    if not AWS_STORAGE_BUCKET_NAME:
-        print(f"[S3] ❌ AWS_STORAGE_BUCKET_NAME is missing or empty")
+    missing = [
+        name for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_STORAGE_BUCKET_NAME')
+        if not globals()[name]
+    ]
+    # Logging is not configured yet: warnings go to stderr
+    logging.getLogger('jewelry_catalog').warning(
+        f"S3 credentials incomplete ({', '.join(missing)} missing) - using local media storage"
+    )
 
     # Fallback to local storage if S3 is not configured
-    DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    DEFAULT_FILE_STORAGE = 'jewelry_catalog.storage.InstrumentedFileSystemStorage'
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-    print(f"[S3] ✅ Local storage configured as fallback")
-    print(f"[S3] Media URL: {MEDIA_URL}")
-    print(f"[S3] Media Root: {MEDIA_ROOT}")
 
-print(f"[S3] Final DEFAULT_FILE_STORAGE: {DEFAULT_FILE_STORAGE}")
-print(f"[S3] Final MEDIA_URL: {MEDIA_URL}")
-print(f"[S3] === END S3 CONFIGURATION ===")
+# Django 5.1+ only reads STORAGES
+STORAGES = {**STORAGES, 'default': {'BACKEND': DEFAULT_FILE_STORAGE}}
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', 50))
 
 # Optional: Configure static files on S3 (if needed)
 # STATICFILES_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
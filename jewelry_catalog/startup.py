@@ -0,0 +1,170 @@
+"""
+Worker startup profiling.
+
+``profile_startup`` boots the project in a fresh interpreter under
+``python -X importtime`` and measures, inside that process:
+
+- ``interpreter``: from spawning the process to running the first line;
+- ``setup``: settings, ``django.setup()`` and the WSGI handler with its
+  middleware, i.e. what a gunicorn worker does before it accepts;
+- ``first_request``: the first request, which also imports the URLconf and
+  every view module behind it;
+- ``second_request``: the same request again, for comparison.
+
+Resident memory (RSS) is read after each phase. The import log is parsed into a tree
+(``parse_importtime``) tagged with the phase that paid for each import, so
+the heavy ones can be found and deferred to the code that needs them.
+"""
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+PHASES = ['interpreter', 'setup', 'first_request', 'second_request']
+PHASE_MARKER = '# phase: '
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+# Runs in the profiled interpreter: standard library only before Django loads
+CHILD_SCRIPT = '''
+import time
+started = time.time()
+import json, resource, sys
+from wsgiref.util import setup_testing_defaults
+
+spawned, path, host = float(sys.argv[1]), sys.argv[2], sys.argv[3]
+phases = {}
+
+def rss_kb():
+    # ru_maxrss would include the parent: Linux keeps it across exec
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def mark(name, ms):
+    phases[name] = {'ms': ms, 'rss_kb': rss_kb()}
+    sys.stderr.flush()
+    sys.stderr.write(MARKER + name + "\\n")
+    sys.stderr.flush()
+
+def request():
+    environ = {'PATH_INFO': path, 'HTTP_HOST': host, 'wsgi.url_scheme': 'https', 'HTTPS': 'on'}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        getattr(response, 'close', lambda: None)()
+    return statuses[0]
+
+def timed(name, function):
+    since = time.perf_counter()
+    result = function()
+    mark(name, (time.perf_counter() - since) * 1000)
+    return result
+
+mark('interpreter', (started - spawned) * 1000)
+from django.core.wsgi import get_wsgi_application
+application = timed('setup', get_wsgi_application)
+phases['status'] = timed('first_request', request)
+timed('second_request', request)
+print(json.dumps(phases))
+'''.replace('MARKER', repr(PHASE_MARKER))
+
+
+def parse_importtime(log):
+    """
+    Parse ``-X importtime`` output into a list of top-level imports.
+
+    Each import is ``{name, self_ms, cumulative_ms, phase, children}``; the
+    phase comes from the ``PHASE_MARKER`` lines the child writes after each
+    phase (imports before the first marker belong to ``interpreter``).
+    """
+    phase_index = 0
+    pending = defaultdict(list)
+    roots = []
+    for line in log.splitlines():
+        if line.startswith(PHASE_MARKER):
+            phase_index = min(phase_index + 1, len(PHASES) - 1)
+            continue
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        level = len(indent) // 2
+        node = {
+            'name': name,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+            'phase': PHASES[phase_index],
+            # Imports are logged after their own imports finish
+            'children': pending.pop(level + 1, []),
+        }
+        if level:
+            pending[level].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def walk(nodes, depth=0):
+    """Yield ``(depth, node)`` for ``nodes`` and all their descendants."""
+    for node in nodes:
+        yield depth, node
+        yield from walk(node['children'], depth + 1)
+
+
+def package_totals(roots):
+    """Self time per top-level package (``stripe``, ``rest_framework``, ...), slowest first."""
+    totals = defaultdict(float)
+    for _, node in walk(roots):
+        totals[node['name'].split('.')[0]] += node['self_ms']
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def run_child(path, host):
+    """Profile one fresh interpreter; returns ``(phases, imports)``."""
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT, repr(spawned), path, host],
+        capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Startup profile failed:\n{result.stderr[-2000:]}")
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return phases, parse_importtime(result.stderr)
+
+
+def profile_startup(path='/', host='localhost', runs=3):
+    """
+    Boot the project ``runs`` times; returns the median phase timings and
+    RSS, the response status and the import tree of the last run.
+
+    The child inherits the environment, so ``DJANGO_SETTINGS_MODULE`` (and
+    ``manage.py --settings``) choose the settings profiled.
+    """
+    samples = []
+    for _ in range(max(1, runs)):
+        phases, imports = run_child(path, host)
+        samples.append(phases)
+    summary = {}
+    for phase in PHASES:
+        summary[phase] = {
+            key: round(statistics.median(sample[phase][key] for sample in samples), 1)
+            for key in samples[0][phase]
+        }
+    return {
+        'path': path,
+        'status': samples[-1]['status'],
+        'runs': len(samples),
+        'phases': summary,
+        'time_to_first_response_ms': round(sum(summary[phase]['ms'] for phase in PHASES[:3]), 1),
+        'imports': imports,
+    }
@@ -0,0 +1,251 @@
+"""
+Instrumented media storage backends.
+
+``InstrumentedFileSystemStorage`` and ``InstrumentedS3Storage`` time every
+storage operation (save/open/delete/exists/size/listdir/modified time) and
+record call counts, bytes written and errors in ``storage_metrics``, which
+``get_system_health`` reports. Both offer ``delete_many`` for bulk cleanup;
+on S3 it sends batched ``DeleteObjects`` requests instead of one DELETE per
+file.
+
+The S3 backend shares one boto3 resource per process and configuration:
+botocore clients are thread-safe, and a single client keeps one connection
+pool (sized by ``AWS_S3_MAX_POOL_CONNECTIONS``) instead of one per thread.
+Retries use botocore's adaptive mode and are counted from the responses.
+
+``InstrumentedS3Storage`` is built on first access (module ``__getattr__``),
+so processes using the filesystem backend never import boto3.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+import logging
+
+logger = logging.getLogger('api')
+performance_logger = logging.getLogger('cache')
+
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+SLOW_OPERATION_SECONDS = 1.0
+
+
+class StorageMetrics:
+    """Thread-safe, per-process counters for storage operations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.retries = 0
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.retries = 0
+
+    def record(self, operation, duration, nbytes=0, error=False):
+        with self._lock:
+            stats = self.operations.setdefault(
+                operation, {'count': 0, 'errors': 0, 'bytes': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            )
+            ms = duration * 1000
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['bytes'] += nbytes
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+        if duration > SLOW_OPERATION_SECONDS:
+            performance_logger.warning(f"Slow storage operation: {operation} took {duration:.3f}s")
+
+    def record_retries(self, count):
+        with self._lock:
+            self.retries += count
+
+    def snapshot(self):
+        """Return ``{'operations': {op: {count, errors, bytes, avg_ms, max_ms}}, 'retries': n}``."""
+        with self._lock:
+            operations = {
+                operation: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'bytes': stats['bytes'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                }
+                for operation, stats in self.operations.items()
+            }
+            return {'operations': operations, 'retries': self.retries}
+
+
+storage_metrics = StorageMetrics()
+
+
+class InstrumentedStorageMixin:
+    """Record timing, bytes and errors of the storage operations in ``storage_metrics``."""
+
+    @contextmanager
+    def _timed(self, operation, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            storage_metrics.record(operation, time.perf_counter() - start, error=True)
+            raise
+        storage_metrics.record(operation, time.perf_counter() - start, nbytes)
+
+    def _save(self, name, content):
+        with self._timed('save', getattr(content, 'size', None) or 0):
+            return super()._save(name, content)
+
+    def _open(self, name, mode='rb'):
+        with self._timed('open'):
+            return super()._open(name, mode)
+
+    def delete(self, name):
+        with self._timed('delete'):
+            return super().delete(name)
+
+    def exists(self, name):
+        with self._timed('exists'):
+            return super().exists(name)
+
+    def size(self, name):
+        with self._timed('size'):
+            return super().size(name)
+
+    def listdir(self, path):
+        with self._timed('listdir'):
+            return super().listdir(path)
+
+    def get_modified_time(self, name):
+        with self._timed('modified_time'):
+            return super().get_modified_time(name)
+
+    def delete_many(self, names):
+        """Delete ``names``; returns the names that could not be deleted."""
+        failed = []
+        with self._timed('delete_many'):
+            for name in names:
+                try:
+                    super().delete(name)
+                except Exception as e:
+                    logger.warning(f"Could not delete {name}: {e}")
+                    failed.append(name)
+        return failed
+
+
+class InstrumentedFileSystemStorage(InstrumentedStorageMixin, FileSystemStorage):
+    pass
+
+
+_resources = {}
+_resources_lock = threading.Lock()
+
+
+def get_client_config(base=None):
+    """Return the botocore Config for the shared S3 client."""
+    from botocore.config import Config
+
+    tuned = Config(
+        max_pool_connections=getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 50),
+        connect_timeout=getattr(settings, 'AWS_S3_CONNECT_TIMEOUT', 5),
+        read_timeout=getattr(settings, 'AWS_S3_READ_TIMEOUT', 30),
+        retries={'max_attempts': getattr(settings, 'AWS_S3_MAX_ATTEMPTS', 5), 'mode': 'adaptive'},
+        tcp_keepalive=True,
+    )
+    return base.merge(tuned) if base is not None else tuned
+
+
+def _count_retries(parsed=None, **kwargs):
+    attempts = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    if attempts:
+        storage_metrics.record_retries(attempts)
+
+
+def _build_s3_storage():
+    # django-storages/boto3 are only needed with S3
+    from storages.backends.s3 import S3Storage
+
+    class InstrumentedS3Storage(InstrumentedStorageMixin, S3Storage):
+        """S3 storage with a shared, tuned connection per process and batched deletes."""
+
+        def __init__(self, **settings_overrides):
+            super().__init__(**settings_overrides)
+            self.client_config = get_client_config(self.client_config)
+
+        @property
+        def connection(self):
+            key = (
+                self.access_key, self.secret_key, self.security_token, self.session_profile,
+                self.region_name, self.endpoint_url, self.use_ssl, self.verify,
+                self.addressing_style, self.signature_version,
+            )
+            resource = _resources.get(key)
+            if resource is None:
+                with _resources_lock:
+                    resource = _resources.get(key)
+                    if resource is None:
+                        resource = self._create_session().resource(
+                            's3',
+                            region_name=self.region_name,
+                            use_ssl=self.use_ssl,
+                            endpoint_url=self.endpoint_url,
+                            config=self.client_config,
+                            verify=self.verify,
+                        )
+                        resource.meta.client.meta.events.register('after-call.s3', _count_retries)
+                        _resources[key] = resource
+            return resource
+
+        def delete_many(self, names):
+            """Delete ``names`` with batched DeleteObjects requests; returns the names that failed."""
+            from storages.utils import clean_name
+
+            keys = {self._normalize_name(clean_name(name)): name for name in names}
+            failed = []
+            key_list = list(keys)
+            for offset in range(0, len(key_list), DELETE_BATCH_SIZE):
+                batch = key_list[offset:offset + DELETE_BATCH_SIZE]
+                with self._timed('delete_many'):
+                    response = self.connection.meta.client.delete_objects(
+                        Bucket=self.bucket_name,
+                        Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+                    )
+                for error in response.get('Errors', ()):
+                    logger.warning(f"Could not delete {error['Key']}: {error.get('Code')} {error.get('Message')}")
+                    failed.append(keys.get(error['Key'], error['Key']))
+            return failed
+
+    # Importable (and picklable) as jewelry_catalog.storage.InstrumentedS3Storage
+    InstrumentedS3Storage.__qualname__ = 'InstrumentedS3Storage'
+    return InstrumentedS3Storage
+
+
+def __getattr__(name):
+    if name == 'InstrumentedS3Storage':
+        try:
+            storage_class = _build_s3_storage()
+        except ImportError as e:
+            raise AttributeError(f"{name} needs django-storages and boto3: {e}") from e
+        globals()[name] = storage_class
+        return storage_class
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def delete_many(names, storage=default_storage):
+    """Delete ``names`` from ``storage`` in bulk when it supports it; returns the names that failed."""
+    names = list(names)
+    if not names:
+        return []
+    if hasattr(storage, 'delete_many'):
+        return storage.delete_many(names)
+    failed = []
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.warning(f"Could not delete {name}: {e}")
+            failed.append(name)
+    return failed
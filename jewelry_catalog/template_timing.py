@@ -0,0 +1,88 @@
+"""
+Template render timing.
+
+With ``TEMPLATE_TIMING = True`` every template render is timed: the page
+template, its ``{% extends %}`` parents and each ``{% include %}`` (the
+product grid includes ``_product_card.html`` once per card). Per template,
+``template_metrics`` keeps the number of renders, the total time and the
+self time (total minus the templates rendered inside it), and ``/metrics/``
+reports the slowest. Off by default: it adds two clock reads per render.
+
+Renders are timed by replacing ``Template._render``, the hook Django's test
+runner instruments the same way (and replaces again during tests).
+"""
+import threading
+import time
+
+from django.template.base import Template
+import logging
+
+performance_logger = logging.getLogger('cache')
+
+SLOW_RENDER_SECONDS = 0.5
+
+_local = threading.local()
+
+
+class TemplateMetrics:
+    """Thread-safe, per-process render counters per template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.templates = {}
+
+    def reset(self):
+        with self._lock:
+            self.templates = {}
+
+    def record(self, name, duration, self_duration):
+        with self._lock:
+            stats = self.templates.setdefault(name, {'count': 0, 'total_ms': 0.0, 'self_ms': 0.0, 'max_ms': 0.0})
+            ms = duration * 1000
+            stats['count'] += 1
+            stats['total_ms'] += ms
+            stats['self_ms'] += self_duration * 1000
+            stats['max_ms'] = max(stats['max_ms'], ms)
+
+    def snapshot(self, limit=None):
+        """Return ``{template: {count, total_ms, self_ms, avg_ms, max_ms}}``, most total time first."""
+        with self._lock:
+            rows = sorted(self.templates.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            return {
+                name: {
+                    'count': stats['count'],
+                    'total_ms': round(stats['total_ms'], 2),
+                    'self_ms': round(stats['self_ms'], 2),
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 3),
+                    'max_ms': round(stats['max_ms'], 2),
+                }
+                for name, stats in rows[:limit]
+            }
+
+
+template_metrics = TemplateMetrics()
+
+
+def timed_render(self, context):
+    """``Template._render`` that records the time spent in this template and in nested ones."""
+    # One accumulator of nested render time per template being rendered
+    nested = getattr(_local, 'nested', None)
+    if nested is None:
+        nested = _local.nested = []
+    nested.append(0.0)
+    start = time.perf_counter()
+    try:
+        return self.nodelist.render(context)
+    finally:
+        duration = time.perf_counter() - start
+        inner = nested.pop()
+        if nested:
+            nested[-1] += duration
+        name = self.origin.template_name or self.name or '<string>'
+        template_metrics.record(name, duration, duration - inner)
+        if not nested and duration > SLOW_RENDER_SECONDS:
+            performance_logger.warning(f"Slow template render: {name} took {duration:.3f}s")
+
+
+def install():
+    Template._render = timed_render
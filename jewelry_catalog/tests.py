@@ -0,0 +1,271 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from asgiref.sync import SyncToAsync
+from botocore.stub import Stubber
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from products import snapshot
+from products.facets import get_facet_counts
+from products.product_urls import category_url, product_url
+from products.tests import CatalogTestMixin
+
+from . import warmup
+from .startup import PHASE_MARKER, package_totals, parse_importtime
+from .storage import InstrumentedFileSystemStorage, InstrumentedS3Storage, delete_many, storage_metrics
+from .template_timing import template_metrics, timed_render
+
+
+class InstrumentedStorageTestCase(TestCase):
+    """Test the instrumented storage backends."""
+
+    def setUp(self):
+        storage_metrics.reset()
+        self.addCleanup(storage_metrics.reset)
+
+    def make_s3_storage(self):
+        storage = InstrumentedS3Storage(
+            bucket_name='catalogo', access_key='test', secret_key='test', region_name='us-east-1'
+        )
+        stubber = Stubber(storage.connection.meta.client)
+        stubber.activate()
+        self.addCleanup(stubber.deactivate)
+        return storage, stubber
+
+    def test_s3_delete_many_batches_delete_objects(self):
+        """Test that bulk deletes send one DeleteObjects per 1000 keys and report failures."""
+        storage, stubber = self.make_s3_storage()
+        names = [f'blobs/{index}.png' for index in range(1001)]
+        stubber.add_response(
+            'delete_objects',
+            {'Errors': [{'Key': 'blobs/7.png', 'Code': 'AccessDenied', 'Message': 'Access Denied'}]},
+            {'Bucket': 'catalogo', 'Delete': {'Objects': [{'Key': name} for name in names[:1000]], 'Quiet': True}},
+        )
+        stubber.add_response(
+            'delete_objects', {},
+            {'Bucket': 'catalogo', 'Delete': {'Objects': [{'Key': names[1000]}], 'Quiet': True}},
+        )
+
+        self.assertEqual(storage.delete_many(names), ['blobs/7.png'])
+        stubber.assert_no_pending_responses()
+        self.assertEqual(storage_metrics.snapshot()['operations']['delete_many']['count'], 2)
+
+    def test_s3_operations_are_timed_and_share_a_connection(self):
+        """Test that S3 calls are recorded, errors included, over one shared client."""
+        storage, stubber = self.make_s3_storage()
+        other = InstrumentedS3Storage(
+            bucket_name='otro', access_key='test', secret_key='test', region_name='us-east-1'
+        )
+        self.assertIs(other.connection, storage.connection)
+        self.assertEqual(storage.connection.meta.client.meta.config.retries['mode'], 'adaptive')
+
+        stubber.add_response('head_object', {'ContentLength': 12}, {'Bucket': 'catalogo', 'Key': 'a.png'})
+        stubber.add_client_error('head_object', http_status_code=403)
+        self.assertEqual(storage.size('a.png'), 12)
+        with self.assertRaises(Exception):
+            storage.size('b.png')
+
+        size_stats = storage_metrics.snapshot()['operations']['size']
+        self.assertEqual((size_stats['count'], size_stats['errors']), (2, 1))
+
+    def test_filesystem_storage_records_bytes(self):
+        """Test that the local backend records writes and bulk deletes."""
+        with tempfile.TemporaryDirectory() as directory:
+            storage = InstrumentedFileSystemStorage(location=directory)
+            names = [storage.save(f'{index}.txt', SimpleUploadedFile('x.txt', b'hola')) for index in range(3)]
+            self.assertEqual(delete_many(names, storage), [])
+            self.assertEqual(storage.listdir('')[1], [])
+
+        operations = storage_metrics.snapshot()['operations']
+        self.assertEqual(operations['save']['count'], 3)
+        self.assertEqual(operations['save']['bytes'], 12)
+
+
+class WarmupTestCase(CatalogTestMixin, TestCase):
+    """Test the worker warm-up and the readiness endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        state = mock.patch.dict(warmup._state, ready=False, running=False, steps={})
+        state.start()
+        self.addCleanup(state.stop)
+
+    def test_warm_up_primes_caches(self):
+        """Test that every step succeeds and the catalog caches are filled afterwards."""
+        state = warmup.warm_up()
+
+        self.assertTrue(state['ready'])
+        self.assertEqual(list(state['steps']), [name for name, _ in warmup.STEPS])
+        self.assertIn('1 products', state['steps']['caches']['detail'])
+        self.assertEqual(cache.get('featured_products'), [self.product])
+        with self.assertNumQueries(0):
+            get_facet_counts()
+            snapshot.get_entry(snapshot.FEATURED)
+
+    def test_ready_only_after_warm_up(self):
+        """Test that /ready/ warms a cold process and answers 503 while a step fails."""
+        def failing():
+            raise ConnectionError('sin base de datos')
+
+        with mock.patch.object(warmup, 'STEPS', [('urls', warmup.warm_urls), ('database', failing)]):
+            response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['steps']['database']['error'], 'sin base de datos')
+
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ready'])
+        with mock.patch.object(warmup, 'warm_up') as warm_up:
+            self.assertEqual(self.client.get(reverse('readiness')).status_code, 200)
+        warm_up.assert_not_called()
+
+
+class StartupProfileTestCase(TestCase):
+    """Test the startup profiler and the on-demand loading of heavy SDKs."""
+
+    def test_parse_importtime_builds_tree_per_phase(self):
+        """Test that the import log becomes a tree with the phase that paid for each import."""
+        log = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        100 | site',
+            PHASE_MARKER + 'interpreter',
+            'import time:       300 |        300 |     stripe._http_client',
+            'import time:       200 |        500 |   stripe',
+            'import time:       400 |        900 | orders.views',
+            'INFO some log line',
+            PHASE_MARKER + 'setup',
+            'import time:        50 |         50 | products.views',
+        ])
+        roots = parse_importtime(log)
+
+        self.assertEqual([(node['name'], node['phase']) for node in roots], [
+            ('site', 'interpreter'), ('orders.views', 'setup'), ('products.views', 'first_request'),
+        ])
+        self.assertEqual(roots[1]['cumulative_ms'], 0.9)
+        self.assertEqual(roots[1]['children'][0]['children'][0]['name'], 'stripe._http_client')
+        self.assertEqual(package_totals(roots)[0], ('stripe', 0.5))
+
+    def test_worker_boot_skips_heavy_sdks(self):
+        """Test that loading the app and every view imports neither Stripe, boto3 nor pymysql."""
+        script = (
+            'import sys; from jewelry_catalog.wsgi import application; from django.urls import get_resolver; '
+            'get_resolver().url_patterns; print(sorted({"stripe", "boto3", "pymysql"} & set(sys.modules)))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='jewelry_catalog.settings', DATABASE_URL='sqlite:///:memory:'),
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
+
+
+class TemplateRenderingTestCase(CatalogTestMixin, TestCase):
+    """Test template render timing, the cached loader and the precomputed product URLs."""
+
+    def setUp(self):
+        super().setUp()
+        template_metrics.reset()
+        self.addCleanup(template_metrics.reset)
+
+    def test_timing_reports_pages_and_includes(self):
+        """Test that the page, its parent and each included card are timed, self time within total."""
+        # The test runner replaces Template._render for its own instrumentation
+        from django.template.base import Template
+
+        with mock.patch.object(Template, '_render', timed_render):
+            response = self.client.get(reverse('products:product_list'))
+        self.assertEqual(response.status_code, 200)
+
+        stats = template_metrics.snapshot()
+        self.assertEqual(stats['products/_product_card.html']['count'], 1)
+        for name in ('products/product_list.html', 'home/base.html'):
+            self.assertIn(name, stats)
+        page = stats['products/product_list.html']
+        self.assertLessEqual(page['self_ms'], page['total_ms'])
+        self.assertLess(page['self_ms'], page['total_ms'] - stats['products/_product_card.html']['total_ms'] + 0.01)
+
+    def test_product_urls_match_reverse(self):
+        """Test that the precomputed URLs equal reverse(), also under a script prefix."""
+        self.assertEqual(
+            product_url(self.product.id, self.product.slug),
+            reverse('products:product_detail', args=[self.product.id, self.product.slug]),
+        )
+        self.assertEqual(
+            category_url(self.category.slug), reverse('products:product_list_by_category', args=[self.category.slug])
+        )
+        with mock.patch('products.product_urls.get_script_prefix', return_value='/tienda/'), \
+                mock.patch('django.urls.base.get_script_prefix', return_value='/tienda/'):
+            self.assertEqual(product_url(7, 'collar-987654321'), '/tienda/products/7/collar-987654321/')
+
+        response = self.client.get(reverse('products:product_list'))
+        detail_url = reverse('products:product_detail', args=[self.product.id, self.product.slug])
+        self.assertContains(response, f'href="{detail_url}"')
+        self.assertContains(response, f'href="{category_url(self.category.slug)}"')
+
+    def test_cached_loader_outside_debug(self):
+        """Test that templates are compiled once per process when DEBUG is off."""
+        script = (
+            'import django; django.setup(); from django.template import engines; '
+            'print([type(loader).__module__ for loader in engines["django"].engine.template_loaders])'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env=dict(
+                os.environ, DJANGO_SETTINGS_MODULE='jewelry_catalog.settings', DEBUG='False',
+                DATABASE_URL='sqlite:///:memory:',
+            ),
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "['django.template.loaders.cached']")
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class AsyncMiddlewareTestCase(TestCase):
+    """Test that the monitoring middleware runs on the event loop under ASGI."""
+
+    custom_middleware = [path for path in settings.MIDDLEWARE if path.startswith('jewelry_catalog.middleware.')]
+
+    async def count_thread_hops(self, middleware):
+        """Serve one async view through ``middleware``; return the number of sync_to_async calls."""
+        hops = []
+        sync_to_async_call = SyncToAsync.__call__
+
+        async def counting_call(adapter, *args, **kwargs):
+            hops.append(adapter.func)
+            return await sync_to_async_call(adapter, *args, **kwargs)
+
+        with override_settings(MIDDLEWARE=middleware), mock.patch.object(SyncToAsync, '__call__', counting_call):
+            # The webhook rejects a bad signature without touching the database
+            response = await AsyncClient().post(
+                reverse('orders:stripe_webhook'), '{}', content_type='application/json',
+                headers={'Stripe-Signature': 't=1,v1=invalid', 'User-Agent': 'sqlmap/1.7'},
+            )
+        self.assertEqual(response.status_code, 400)
+        return len(hops)
+
+    async def test_custom_middleware_adds_no_thread_hops(self):
+        """Test that the custom middleware costs no thread switch per request, alone or in the full stack."""
+        self.assertEqual(len(self.custom_middleware), 5)
+        baseline = await self.count_thread_hops([])
+        with self.assertLogs('django.security', 'WARNING'):
+            self.assertEqual(await self.count_thread_hops(self.custom_middleware), baseline)
+
+        without_custom = [path for path in settings.MIDDLEWARE if path not in self.custom_middleware]
+        self.assertEqual(
+            await self.count_thread_hops(settings.MIDDLEWARE), await self.count_thread_hops(without_custom)
+        )
+
+    def test_sync_stack_logs_api_requests(self):
+        """Test that the same middleware still serves WSGI requests."""
+        with self.assertLogs('api', 'INFO') as logs:
+            response = self.client.get(reverse('products_api:api_product_list'), HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('from 203.0.113.7', logs.output[0])
+        self.assertIn('User: anonymous', logs.output[-1])
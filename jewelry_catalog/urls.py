@@ -18,6 +18,7 @@ urlpatterns = [
 
     # Monitoring URLs
     path('health/', views.health_check, name='health_check'),
+    path('ready/', views.readiness, name='readiness'),
     path('metrics/', views.metrics, name='metrics'),
     path('alerts/', views.alerts, name='alerts'),
 ]
@@ -1,10 +1,14 @@
 """
 System monitoring and health check views.
 """
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from django.views.decorators.cache import cache_page
 from .metrics import get_system_health, metrics_collector
+from .template_timing import template_metrics
+from .warmup import ensure_warm
 import logging
 
 logger = logging.getLogger('api')
@@ -12,7 +16,7 @@ logger = logging.getLogger('api')
 
 @require_GET
 @cache_page(60)  # Cache for 1 minute
-def health_check(request):
+async def health_check(request):
     """
     Health check endpoint for monitoring system status.
 
@@ -21,9 +25,12 @@ def health_check(request):
     - Cache status
     - API metrics summary
     - Overall system status
+
+    Async: under ASGI the checks run in Django's sync thread while the
+    event loop keeps serving other requests.
     """
     try:
-        health_data = get_system_health()
+        health_data = await sync_to_async(get_system_health)()
 
         # Return appropriate HTTP status based on health
         status_code = 200 if health_data['status'] == 'healthy' else 503
@@ -37,10 +44,23 @@ def health_check(request):
         return JsonResponse({
             'status': 'error',
             'error': str(e),
-            'timestamp': health_data.get('timestamp') if 'health_data' in locals() else None
+            'timestamp': None
         }, status=500)
 
 
+@require_GET
+def readiness(request):
+    """
+    Readiness endpoint for the load balancer / deploy checks.
+
+    Answers 200 once this process has warmed up (see ``jewelry_catalog.warmup``)
+    and 503 until then, with the time taken by each warm-up step. Never cached:
+    it reports on the process that serves it.
+    """
+    state = ensure_warm()
+    return JsonResponse(state, status=200 if state['ready'] else 503)
+
+
 @require_GET
 def metrics(request):
     """
@@ -68,6 +88,9 @@ def metrics(request):
             },
             'timestamp': metrics_summary.get('timestamp', None),
         })
+        if settings.TEMPLATE_TIMING:
+            # Per process: the worker that answered
+            metrics_summary['templates'] = template_metrics.snapshot(limit=20)
 
         logger.info(f"Metrics requested by {request.user.username}")
 
@@ -0,0 +1,189 @@
+"""
+Worker warm-up.
+
+A fresh worker initializes everything lazily, so without a warm-up its
+first requests pay for resolving the URLconf (and importing every view),
+compiling templates, connecting to the database, filling the per-process
+caches and DRF's first serializations. ``warm_up`` does that work up front:
+
+- ``urls``: import the URLconf and build the reverse lookup tables;
+- ``templates``: compile the project's templates into the cached loader;
+- ``database``: open the connection of every database alias;
+- ``caches``: prime the catalog snapshot, facet counts and featured products;
+- ``serializers``: serialize a product and an order once.
+
+``gunicorn.conf.py`` runs it in each worker after the application loads and
+before the worker accepts connections; ``manage.py warmup`` runs it on its
+own to time the steps. ``/ready/`` answers 503 until warm-up has succeeded
+in the process serving it, warming the process itself if no hook did (e.g.
+under ``runserver``).
+
+Django connections are per thread: the warm connection is the one a sync
+worker's requests use. With ``CONN_MAX_AGE = 0`` it is closed when the first
+request starts.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+import logging
+
+logger = logging.getLogger('api')
+
+TEMPLATE_SUFFIXES = ('.html', '.txt')
+
+_lock = threading.Lock()
+_state = {'ready': False, 'running': False, 'pid': None, 'seconds': None, 'steps': {}}
+
+
+def get_local_host():
+    """First concrete host in ALLOWED_HOSTS, for requests built inside the process."""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host[:1] not in ('', '.', '*')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def warm_urls():
+    from django.urls import NoReverseMatch, get_resolver, resolve, reverse
+
+    resolve('/')
+    resolver = get_resolver()
+    names = len(resolver.reverse_dict)
+    for namespace, (_, namespace_resolver) in resolver.namespace_dict.items():
+        view_names = [key for key in namespace_resolver.reverse_dict if isinstance(key, str)]
+        names += len(view_names)
+        # reverse() builds (and caches) a prefixed resolver per namespace on first use
+        try:
+            reverse(f'{namespace}:{view_names[0]}')
+        except (IndexError, NoReverseMatch):
+            pass
+    return f'{names} url names'
+
+
+def warm_templates():
+    from django.template import TemplateSyntaxError, engines
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    compiled = failed = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory).resolve()
+            # Project templates only: admin and third-party ones are rarely rendered
+            third_party = 'site-packages' in directory.parts
+            if third_party or not directory.is_relative_to(base_dir) or not directory.is_dir():
+                continue
+            for path in directory.rglob('*'):
+                if path.suffix not in TEMPLATE_SUFFIXES:
+                    continue
+                name = path.relative_to(directory).as_posix()
+                try:
+                    engine.get_template(name)
+                    compiled += 1
+                except TemplateSyntaxError as e:
+                    failed += 1
+                    logger.warning(f"Warm-up could not compile template {name}: {e}")
+    return f'{compiled} templates' + (f', {failed} failed' if failed else '')
+
+
+def warm_database():
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.ensure_connection()
+    return f'{len(connections.all())} connections'
+
+
+def warm_caches():
+    from home.views import get_featured_products
+    from products import snapshot
+    from products.facets import get_facet_counts
+    from products.image_urls import get_media_base_url, get_placeholder_url
+
+    index = snapshot.get_entry(snapshot.index_page_name(1))
+    snapshot.get_entry(snapshot.FEATURED)
+    get_facet_counts()
+    get_featured_products()
+    get_media_base_url()
+    get_placeholder_url()
+    return f"{index['count'] if index else 0} products in the snapshot"
+
+
+def warm_serializers():
+    from django.http import HttpRequest
+
+    from orders.models import Order
+    from orders.serializers import OrderSerializer
+    from products.models import Product
+    from products.serializers import ProductListSerializer, ProductSerializer
+
+    request = HttpRequest()
+    request.META['HTTP_HOST'] = get_local_host()
+    context = {'request': request}
+    product = Product.objects.select_related('category').filter(available=True).first()
+    if product is not None:
+        ProductSerializer(product, context=context).data
+        ProductListSerializer([product], many=True, context=context).data
+    order = Order.objects.prefetch_related('items__product').first()
+    if order is not None:
+        OrderSerializer(order, context=context).data
+    return f'product {product.pk if product else None}, order {order.pk if order else None}'
+
+
+STEPS = [
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('database', warm_database),
+    ('caches', warm_caches),
+    ('serializers', warm_serializers),
+]
+
+
+def warm_up(progress=None):
+    """
+    Run every warm-up step and return the readiness state.
+
+    A failing step is logged and recorded, and the others still run; the
+    process is ready only if all of them succeed. ``progress(name)`` is
+    called after each step (gunicorn's heartbeat, see ``gunicorn.conf.py``).
+    """
+    start = time.perf_counter()
+    _state['running'] = True
+    steps = {}
+    for name, step in STEPS:
+        step_start = time.perf_counter()
+        try:
+            steps[name] = {'ok': True, 'detail': step()}
+        except Exception as e:
+            logger.error(f"Warm-up step {name} failed: {e}")
+            steps[name] = {'ok': False, 'error': str(e)}
+        steps[name]['ms'] = round((time.perf_counter() - step_start) * 1000, 1)
+        if progress:
+            progress(name)
+
+    _state.update(
+        ready=all(result['ok'] for result in steps.values()),
+        running=False,
+        pid=os.getpid(),
+        seconds=round(time.perf_counter() - start, 3),
+        steps=steps,
+    )
+    logger.info(
+        f"Warm-up {'done' if _state['ready'] else 'incomplete'} in {_state['seconds']}s (pid {_state['pid']}): "
+        + ', '.join(f"{name} {result['ms']:.0f}ms" for name, result in steps.items())
+    )
+    return get_state()
+
+
+def get_state():
+    return dict(_state, steps={name: dict(result) for name, result in _state['steps'].items()})
+
+
+def ensure_warm():
+    """Warm the process up unless it is ready or another thread is at it; returns the state."""
+    if _state['ready'] or not _lock.acquire(blocking=False):
+        return get_state()
+    try:
+        return warm_up()
+    finally:
+        _lock.release()
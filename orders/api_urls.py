@@ -8,4 +8,7 @@ urlpatterns = [
     path('detail/<str:order_number>/', views.OrderDetailAPIView.as_view(), name='api_order_detail'),
     path('cancel/<str:order_number>/', views.cancel_order_api, name='api_cancel_order'),
     path('history/', views.order_history_api, name='api_order_history'),
+    path('reports/sales/', views.sales_report_api, name='api_sales_report'),
+    path('reports/top-products/', views.top_products_report_api, name='api_top_products_report'),
+    path('reports/categories/', views.category_sales_report_api, name='api_category_sales_report'),
 ]
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from ...rollups import rebuild
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily sales rollups from the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Orders read per query',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        processed = rebuild(
+            chunk_size=options['chunk_size'],
+            progress=self.report_progress if options['verbosity'] > 1 else None,
+        )
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt sales rollups from {processed} orders in {duration:.2f}s')
+        )
+
+    def report_progress(self, processed):
+        self.stdout.write(f'  {processed} orders')
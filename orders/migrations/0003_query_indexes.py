@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_notes_order_payment_date_order_tracking_number_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_query_indexes'),
+        ('products', '0007_facet_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['period', 'bucket', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'status'), name='unique_sales_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to='products.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.product')),
+            ],
+            options={
+                'ordering': ['period', 'bucket'],
+                'indexes': [models.Index(fields=['period', 'category', 'bucket'], name='product_rollup_category_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'product'), name='unique_product_sales_rollup')],
+            },
+        ),
+    ]
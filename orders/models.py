@@ -3,7 +3,7 @@ from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from accounts.models import User
-from products.models import Product
+from products.models import Category, Product
 import uuid
 import logging
 
@@ -56,6 +56,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # "My orders": always filtered by user, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number} - {self.user.username}"
@@ -101,6 +105,64 @@ class OrderItem(models.Model):
     def total_price(self):
         return self.price * self.quantity
 
+class SalesRollup(models.Model):
+    """
+    Orders, revenue and units per hour or day and order status.
+
+    Buckets start at the hour/day (UTC) the order was created. Maintained
+    from order events by orders.rollups; ``backfill_sales_rollups`` rebuilds
+    them from history.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['period', 'bucket', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'status'], name='unique_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.status}: {self.orders} orders"
+
+
+class ProductSalesRollup(models.Model):
+    """
+    Units and revenue per hour or day and product, for orders not cancelled.
+
+    ``category`` is the product's category when the rollup row was created,
+    so category totals are a GROUP BY on this table.
+    """
+    period = models.CharField(max_length=4, choices=SalesRollup.PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_rollups'
+    )
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['period', 'bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'product'], name='unique_product_sales_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'category', 'bucket'], name='product_rollup_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.product_id}: {self.units} units"
+
 @receiver(pre_save, sender=Order)
 def update_product_stock(sender, instance, **kwargs):
     """Update product stock when order status changes to processing."""
@@ -1,14 +1,30 @@
-import stripe
 from django.conf import settings
 from orders.models import Order
 import logging
 
 logger = logging.getLogger(__name__)
 
-def initialize_stripe():
+def get_stripe():
+    """
+    Return the ``stripe`` module, configured from settings.
+
+    Imported on first use: the SDK and the HTTP clients it pulls in are the
+    largest part of a worker's import time, and most requests never reach
+    Stripe.
+    """
+    import stripe
+
     stripe.api_key = settings.STRIPE_SECRET_KEY
+    if settings.STRIPE_API_BASE:
+        # stripe-mock or a local stand-in (benchmarks/bench_asgi.py)
+        stripe.api_base = settings.STRIPE_API_BASE
+    return stripe
+
+def initialize_stripe():
+    get_stripe()
 
 def create_stripe_payment_intent(order):
+    stripe = get_stripe()
     try:
         payment_intent = stripe.PaymentIntent.create(
             amount=int(order.total * 100),  # Convert to cents
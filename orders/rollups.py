@@ -0,0 +1,201 @@
+"""
+Hourly and daily sales rollups.
+
+``SalesRollup`` counts orders, revenue and units per bucket and order
+status; ``ProductSalesRollup`` counts units and revenue per bucket and
+product (with its category) for orders that are not cancelled. Both are kept
+current by ``orders.signals``, which turn each order or order item change into
+deltas (remove the old contribution, add the new one) and apply them with
+``F()`` updates in the same transaction. ``rebuild`` recomputes everything
+from the orders in chunks (``backfill_sales_rollups``).
+
+Reports read only these tables: ``sales_series``, ``top_products`` and
+``category_sales`` back the staff API endpoints.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from .models import Order, OrderItem, ProductSalesRollup, SalesRollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('hour', 'day')
+CANCELLED = 'cancelled'
+CENTS = Decimal('0.01')
+
+
+def get_buckets(created_at):
+    """Return ``{period: bucket start}`` (UTC) for an order creation time."""
+    hour = created_at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+class RollupDeltas:
+    """Accumulated changes to both rollup tables."""
+
+    def __init__(self):
+        # (period, bucket, status) -> [orders, revenue, units]
+        self.sales = defaultdict(lambda: [0, Decimal('0'), 0])
+        # (period, bucket, product_id) -> [units, revenue, category_id]
+        self.products = defaultdict(lambda: [0, Decimal('0'), None])
+
+    def add_order(self, status, total, created_at, items=(), sign=1):
+        """Add (``sign=1``) or remove (``sign=-1``) an order and its ``(product_id, category_id, quantity, price)`` items."""
+        total = Decimal(total).quantize(CENTS)
+        for period, bucket in get_buckets(created_at).items():
+            row = self.sales[(period, bucket, status)]
+            row[0] += sign
+            row[1] += sign * total
+        for item in items:
+            self.add_item(status, created_at, *item, sign=sign)
+
+    def add_item(self, status, created_at, product_id, category_id, quantity, price, sign=1):
+        for period, bucket in get_buckets(created_at).items():
+            self.sales[(period, bucket, status)][2] += sign * quantity
+            if status != CANCELLED:
+                row = self.products[(period, bucket, product_id)]
+                row[0] += sign * quantity
+                row[1] += sign * quantity * price
+                row[2] = category_id
+
+    def apply(self):
+        """Write the deltas with ``F()`` updates, creating missing rows."""
+        for (period, bucket, status), (orders, revenue, units) in self.sales.items():
+            if orders or revenue or units:
+                _add(
+                    SalesRollup, {'period': period, 'bucket': bucket, 'status': status},
+                    {'orders': orders, 'revenue': revenue, 'units': units},
+                )
+        for (period, bucket, product_id), (units, revenue, category_id) in self.products.items():
+            if units or revenue:
+                _add(
+                    ProductSalesRollup, {'period': period, 'bucket': bucket, 'product_id': product_id},
+                    {'units': units, 'revenue': revenue}, {'category_id': category_id},
+                )
+
+    def rows(self):
+        """Return unsaved ``(SalesRollup, ProductSalesRollup)`` lists of the totals."""
+        sales = [
+            SalesRollup(period=period, bucket=bucket, status=status, orders=orders, revenue=revenue, units=units)
+            for (period, bucket, status), (orders, revenue, units) in self.sales.items()
+            if orders or revenue or units
+        ]
+        products = [
+            ProductSalesRollup(
+                period=period, bucket=bucket, product_id=product_id, category_id=category_id,
+                units=units, revenue=revenue,
+            )
+            for (period, bucket, product_id), (units, revenue, category_id) in self.products.items()
+            if units or revenue
+        ]
+        return sales, products
+
+
+def _add(model, key, values, defaults=None):
+    updated = model.objects.filter(**key).update(**{field: F(field) + value for field, value in values.items()})
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **values, **(defaults or {}))
+    except IntegrityError:
+        # Created concurrently
+        model.objects.filter(**key).update(**{field: F(field) + value for field, value in values.items()})
+
+
+def order_items(order_id):
+    """Return the ``(product_id, category_id, quantity, price)`` items of an order."""
+    return list(
+        OrderItem.objects.filter(order_id=order_id).values_list('product_id', 'product__category_id', 'quantity', 'price')
+    )
+
+
+def rebuild(chunk_size=1000, progress=None):
+    """
+    Recompute both rollup tables from the orders, reading them in chunks.
+
+    The tables are replaced in one transaction at the end. Returns the
+    number of orders processed.
+    """
+    deltas = RollupDeltas()
+    last_pk = processed = 0
+    while True:
+        orders = list(
+            Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'status', 'total', 'created_at')[:chunk_size]
+        )
+        if not orders:
+            break
+        items = defaultdict(list)
+        rows = OrderItem.objects.filter(order_id__in=[order[0] for order in orders]).values_list(
+            'order_id', 'product_id', 'product__category_id', 'quantity', 'price'
+        )
+        for order_id, *item in rows:
+            items[order_id].append(item)
+        for pk, status, total, created_at in orders:
+            deltas.add_order(status, total, created_at, items[pk])
+        last_pk = orders[-1][0]
+        processed += len(orders)
+        if progress:
+            progress(processed)
+
+    sales, products = deltas.rows()
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        ProductSalesRollup.objects.all().delete()
+        SalesRollup.objects.bulk_create(sales, batch_size=1000)
+        ProductSalesRollup.objects.bulk_create(products, batch_size=1000)
+    logger.info(f"Rebuilt sales rollups from {processed} orders: {len(sales)} sales rows, {len(products)} product rows")
+    return processed
+
+
+def get_range(start=None, end=None, days=30):
+    """Return the ``[start, end)`` datetimes for dates ``start``..``end`` (default: the last ``days`` days)."""
+    end = end or datetime.now(dt_timezone.utc).date()
+    start = start or end - timedelta(days=days - 1)
+    return (
+        datetime.combine(start, time.min, tzinfo=dt_timezone.utc),
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+    )
+
+
+def sales_series(period, start, end):
+    """Return ``[{bucket, orders, revenue, units, by_status}]`` ordered by bucket; revenue excludes cancelled orders."""
+    series = {}
+    rows = SalesRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end).order_by('bucket', 'status')
+    for row in rows.values_list('bucket', 'status', 'orders', 'revenue', 'units'):
+        bucket, status, orders, revenue, units = row
+        entry = series.setdefault(
+            bucket, {'bucket': bucket, 'orders': 0, 'revenue': Decimal('0'), 'units': 0, 'by_status': {}}
+        )
+        entry['by_status'][status] = orders
+        if status != CANCELLED:
+            entry['orders'] += orders
+            entry['revenue'] += revenue
+            entry['units'] += units
+    return list(series.values())
+
+
+def top_products(start, end, limit=10):
+    """Return the best-selling products by revenue: ``[{product_id, name, units, revenue}]``."""
+    rows = (
+        ProductSalesRollup.objects.filter(period='day', bucket__gte=start, bucket__lt=end)
+        .values('product_id', name=F('product__name'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', '-units')[:limit]
+    )
+    return list(rows)
+
+
+def category_sales(start, end):
+    """Return units and revenue per category: ``[{category_id, name, units, revenue}]``."""
+    rows = (
+        ProductSalesRollup.objects.filter(period='day', bucket__gte=start, bucket__lt=end)
+        .values('category_id', name=F('category__name'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
+    return list(rows)
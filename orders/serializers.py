@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
+from products.image_urls import resolve_image_url
 from products.models import Product
 
 
@@ -20,12 +21,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     def get_product_image_url(self, obj):
         """Get full URL for product image."""
-        if obj.product.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.product.get_image_url)
-            return obj.product.get_image_url
-        return None
+        return resolve_image_url(obj.product.image, self.context.get('request'), placeholder=False)
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -133,4 +129,28 @@ class OrderListSerializer(serializers.ModelSerializer):
 
     def get_items_count(self, obj):
         """Get total number of items in order."""
-        return sum(item.quantity for item in obj.items.all())
\ No newline at end of file
+        return sum(item.quantity for item in obj.items.all())
+
+class SalesPeriodSerializer(serializers.Serializer):
+    """One bucket of ``orders.rollups.sales_series``."""
+    bucket = serializers.DateTimeField()
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    by_status = serializers.DictField(child=serializers.IntegerField())
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    """One row of ``orders.rollups.top_products``."""
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    """One row of ``orders.rollups.category_sales``."""
+    category_id = serializers.IntegerField(allow_null=True)
+    name = serializers.CharField(allow_null=True)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Order, OrderItem
+from .rollups import RollupDeltas, order_items
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    """Keep the stored status and total to compute rollup deltas in post_save."""
+    instance._stored_rollup_state = (
+        Order.objects.filter(pk=instance.pk).values_list('status', 'total').first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    """Move the order between rollup rows when it is created or its status or total change."""
+    stored = getattr(instance, '_stored_rollup_state', None)
+    deltas = RollupDeltas()
+    if created or stored is None:
+        deltas.add_order(instance.status, instance.total, instance.created_at)
+    else:
+        status, total = stored
+        if (status, total) == (instance.status, instance.total):
+            return
+        # Units and product sales follow the status; unchanged statuses cancel out
+        items = order_items(instance.pk) if status != instance.status else ()
+        deltas.add_order(status, total, instance.created_at, items, sign=-1)
+        deltas.add_order(instance.status, instance.total, instance.created_at, items)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    """Remove a deleted order (its items were removed before it)."""
+    deltas = RollupDeltas()
+    deltas.add_order(instance.status, instance.total, instance.created_at, sign=-1)
+    deltas.apply()
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_order_item(sender, instance, **kwargs):
+    """Keep the stored item to compute rollup deltas in post_save."""
+    instance._stored_rollup_item = (
+        OrderItem.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'product__category_id', 'quantity', 'price'
+        ).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def add_order_item_to_rollups(sender, instance, **kwargs):
+    """Count the units and product revenue of a new or changed item."""
+    order = instance.order
+    deltas = RollupDeltas()
+    stored = getattr(instance, '_stored_rollup_item', None)
+    if stored:
+        deltas.add_item(order.status, order.created_at, *stored, sign=-1)
+    deltas.add_item(
+        order.status, order.created_at, instance.product_id, instance.product.category_id,
+        instance.quantity, instance.price,
+    )
+    deltas.apply()
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_order_item_from_rollups(sender, instance, **kwargs):
+    """Remove the units and product revenue of a deleted item."""
+    order = Order.objects.filter(pk=instance.order_id).values_list('status', 'created_at').first()
+    if order is None:
+        return
+    deltas = RollupDeltas()
+    deltas.add_item(
+        *order, instance.product_id, instance.product.category_id, instance.quantity, instance.price, sign=-1
+    )
+    deltas.apply()
@@ -1,3 +1,186 @@
-from django.test import TestCase
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+import hashlib
+import hmac
+import json
+import time
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from products.models import Category, Product
+from .models import Order, OrderItem, ProductSalesRollup, SalesRollup
+
+
+class SalesRollupTestCase(TestCase):
+    """Test the incremental sales rollups and the staff reports."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='cliente', email='cliente@example.com', password='secret'
+        )
+        self.category = Category.objects.create(name='Anillos', slug='anillos')
+        self.ring = Product.objects.create(
+            name='Anillo', slug='anillo', description='Anillo', price=Decimal('40.00'),
+            jewelry_type='ring', category=self.category, stock=20,
+        )
+        self.necklace = Product.objects.create(
+            name='Collar', slug='collar', description='Collar', price=Decimal('25.00'), stock=20,
+        )
+
+    def create_order(self, items, status='pending'):
+        subtotal = sum(product.price * quantity for product, quantity in items)
+        order = Order.objects.create(
+            user=self.user, subtotal=subtotal, shipping_cost=Decimal('5.00'),
+            shipping_address='Av. Principal 123', status=status,
+        )
+        for product, quantity in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        return order
+
+    def day_totals(self):
+        return {
+            row.status: (row.orders, row.revenue, row.units)
+            for row in SalesRollup.objects.filter(period='day')
+        }
+
+    def product_units(self):
+        return dict(ProductSalesRollup.objects.filter(period='hour').values_list('product__slug', 'units'))
+
+    def test_order_events_update_rollups(self):
+        """Test that creating, editing and cancelling orders moves the rollup totals."""
+        order = self.create_order([(self.ring, 2), (self.necklace, 1)])
+        self.create_order([(self.ring, 1)], status='delivered')
+        self.assertEqual(self.day_totals(), {
+            'pending': (1, Decimal('110.00'), 3),
+            'delivered': (1, Decimal('45.00'), 1),
+        })
+        self.assertEqual(self.product_units(), {'anillo': 3, 'collar': 1})
+
+        item = order.items.get(product=self.necklace)
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self.product_units(), {'anillo': 3, 'collar': 3})
+
+        order.status = 'cancelled'
+        order.save()
+        totals = self.day_totals()
+        self.assertEqual(totals['pending'], (0, Decimal('0.00'), 0))
+        self.assertEqual(totals['cancelled'], (1, Decimal('110.00'), 5))
+        self.assertEqual(self.product_units(), {'anillo': 1, 'collar': 0})
+
+        order.delete()
+        self.assertEqual(self.day_totals()['cancelled'], (0, Decimal('0.00'), 0))
+
+    def test_backfill_matches_incremental_rollups(self):
+        """Test that rebuilding from history gives the same totals as the events."""
+        self.create_order([(self.ring, 2)])
+        self.create_order([(self.necklace, 4)], status='shipped')
+        old = self.create_order([(self.ring, 1)])
+        Order.objects.filter(pk=old.pk).update(created_at=datetime(2024, 5, 1, 15, 30, tzinfo=dt_timezone.utc))
+        incremental = self.day_totals()
+
+        out = StringIO()
+        call_command('backfill_sales_rollups', chunk_size=2, stdout=out)
+        self.assertIn('from 3 orders', out.getvalue())
+        rebuilt = self.day_totals()
+        self.assertEqual(rebuilt['shipped'], incremental['shipped'])
+        self.assertEqual(rebuilt['pending'], (1, Decimal('85.00'), 2))
+        self.assertTrue(SalesRollup.objects.filter(
+            period='hour', bucket=datetime(2024, 5, 1, 15, tzinfo=dt_timezone.utc), status='pending', units=1,
+        ).exists())
+
+    def test_staff_reports_read_rollups(self):
+        """Test the report endpoints and that they are staff only."""
+        self.create_order([(self.ring, 2), (self.necklace, 1)])
+        cancelled = self.create_order([(self.necklace, 5)])
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('orders_api:api_sales_report')).status_code, 403)
+
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='secret', is_staff=True
+        )
+        client.force_authenticate(staff)
+        with self.assertNumQueries(1):
+            response = client.get(reverse('orders_api:api_sales_report'))
+        day = response.json()['results'][0]
+        self.assertEqual((day['orders'], day['revenue'], day['units']), (1, '110.00', 3))
+        self.assertEqual(day['by_status'], {'cancelled': 1, 'pending': 1})
+
+        top = client.get(reverse('orders_api:api_top_products_report'), {'limit': 1}).json()['results']
+        self.assertEqual([(row['name'], row['units']) for row in top], [('Anillo', 2)])
+        categories = client.get(reverse('orders_api:api_category_sales_report')).json()['results']
+        self.assertEqual({row['name']: row['units'] for row in categories}, {'Anillos': 2, None: 1})
+
+        response = client.get(reverse('orders_api:api_sales_report'), {'start': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncCheckoutTestCase(TestCase):
+    """Test the async order creation and Stripe webhook views."""
+
+    checkout_data = {'shipping_address': 'Av. Principal 123', 'billing_option': 'same', 'payment_method': 'credit_card'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='cliente', email='cliente@example.com', password='secret'
+        )
+        product = Product.objects.create(
+            name='Anillo', slug='anillo', description='Anillo', price=Decimal('40.00'), stock=20,
+        )
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    async def test_create_order_awaits_stripe(self):
+        """Test that the order is created and the PaymentIntent awaited, and removed again if Stripe fails."""
+        await self.async_client.aforce_login(self.user)
+        intent = SimpleNamespace(client_secret='pi_secret')
+        with mock.patch('stripe.PaymentIntent.create_async', return_value=intent) as create:
+            response = await self.async_client.post(reverse('orders:create_order_ajax'), self.checkout_data)
+        self.assertEqual(response.json()['client_secret'], 'pi_secret')
+        order = await Order.objects.aget(pk=response.json()['order_id'])
+        self.assertEqual(order.total, Decimal('91.40'))
+        self.assertEqual(create.call_args.kwargs['amount'], 9140)
+        self.assertEqual(await order.items.acount(), 1)
+
+        with mock.patch('stripe.PaymentIntent.create_async', side_effect=ValueError('Stripe caído')):
+            response = await self.async_client.post(reverse('orders:create_order_ajax'), self.checkout_data)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(await Order.objects.acount(), 1)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+    async def test_webhook_marks_order_paid(self):
+        """Test that a signed payment_intent.succeeded event marks the order as paid."""
+        order = await Order.objects.acreate(
+            user=self.user, subtotal=Decimal('80.00'), shipping_address='Av. Principal 123',
+        )
+        payload = json.dumps({
+            'id': 'evt_test', 'object': 'event', 'type': 'payment_intent.succeeded',
+            'data': {'object': {'id': 'pi_test', 'object': 'payment_intent', 'metadata': {'order_id': str(order.pk)}}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        response = await self.async_client.post(
+            reverse('orders:stripe_webhook'), payload, content_type='application/json',
+            headers={'Stripe-Signature': f't={timestamp},v1={signature}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        await order.arefresh_from_db()
+        self.assertTrue(order.payment_status)
+
+        response = await self.async_client.post(
+            reverse('orders:stripe_webhook'), payload, content_type='application/json',
+            headers={'Stripe-Signature': f't={timestamp},v1=invalid'},
+        )
+        self.assertEqual(response.status_code, 400)
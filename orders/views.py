@@ -13,7 +13,7 @@ from django.conf import settings
 from decimal import Decimal
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
@@ -21,13 +21,17 @@ from rest_framework import filters
 from cart.models import Cart, CartItem
 from .models import Order, OrderItem
 from .forms import CheckoutForm
+from .payments import get_stripe
+from .rollups import category_sales, get_range, sales_series, top_products
 from .serializers import (
     OrderSerializer, OrderListSerializer,
-    OrderCreateSerializer, OrderItemSerializer
+    OrderCreateSerializer, OrderItemSerializer,
+    SalesPeriodSerializer, ProductSalesSerializer, CategorySalesSerializer
 )
 from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from django.utils.dateparse import parse_date
 import logging
-import stripe
 
 logger = logging.getLogger('orders')
 api_logger = logging.getLogger('api')
@@ -35,7 +39,7 @@ api_logger = logging.getLogger('api')
 # Constants
 DEFAULT_SHIPPING_COST = Decimal('5.00')
 TAX_RATE = Decimal('0.08')  # 8%
-stripe.api_key = settings.STRIPE_SECRET_KEY
+
 def checkout(request):
     """Handle the checkout process and order creation."""
     from cart.cart import CartSession
@@ -108,6 +112,7 @@ def checkout(request):
 
                     # Process payment based on selected method
                     if payment_method == 'credit_card':
+                        stripe = get_stripe()
                         try:
                             intent = stripe.PaymentIntent.create(
                                 amount=int(order.total * 100),
@@ -174,65 +179,82 @@ def checkout(request):
     
     return render(request, 'orders/checkout.html', context)
 
-@csrf_exempt
-@login_required
-def create_order_ajax(request):
-    """AJAX endpoint for order creation."""
-    if request.method == 'POST':
-        try:
-            cart = Cart.objects.get(user=request.user)
-            form = CheckoutForm(request.POST, user=request.user)
-            
-            if form.is_valid():
-                with transaction.atomic():
-                    # Create order
-                    order = form.save(commit=False)
-                    order.user = request.user
-                    order.subtotal = cart.subtotal
-                    order.shipping_cost = DEFAULT_SHIPPING_COST
-                    order.tax = (cart.subtotal * TAX_RATE).quantize(Decimal('0.01'))
-                    order.total = (order.subtotal + order.shipping_cost + order.tax).quantize(Decimal('0.01'))
-                    order.save()
+def _create_order_from_cart(request, user):
+    """Validate the checkout form and create the order from the user's cart; returns ``(order, errors)``."""
+    cart = Cart.objects.get(user=user)
+    form = CheckoutForm(request.POST, user=user)
+    if not form.is_valid():
+        return None, form.errors.as_json()
 
-                    # Create order items
-                    for cart_item in cart.items.all():
-                        OrderItem.objects.create(
-                            order=order,
-                            product=cart_item.product,
-                            quantity=cart_item.quantity,
-                            price=cart_item.product.price
-                        )
+    with transaction.atomic():
+        order = form.save(commit=False)
+        order.user = user
+        order.subtotal = cart.subtotal
+        order.shipping_cost = DEFAULT_SHIPPING_COST
+        order.tax = (cart.subtotal * TAX_RATE).quantize(Decimal('0.01'))
+        order.total = (order.subtotal + order.shipping_cost + order.tax).quantize(Decimal('0.01'))
+        order.save()
 
-                    # Create Stripe PaymentIntent
-                    intent = stripe.PaymentIntent.create(
-                        amount=int(order.total * 100),  # Amount in cents
-                        currency='usd',
-                        metadata={
-                            'order_id': order.id,
-                            'user_id': request.user.id
-                        },
-                        description=f"Order #{order.order_number}"
-                    )
+        # Create order items
+        for cart_item in cart.items.select_related('product'):
+            OrderItem.objects.create(
+                order=order,
+                product=cart_item.product,
+                quantity=cart_item.quantity,
+                price=cart_item.product.price
+            )
+    return order, None
 
-                    return JsonResponse({
-                        'success': True,
-                        'order_id': order.id,
-                        'client_secret': intent.client_secret
-                    })
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'errors': form.errors.as_json()
-                }, status=400)
-                
-        except Exception as e:
-            logger.error(f"Order creation failed: {str(e)}")
+
+@csrf_exempt
+@login_required
+async def create_order_ajax(request):
+    """
+    AJAX endpoint for order creation.
+
+    Async: the order is written in a worker thread, then the Stripe call
+    awaits without holding a thread or a database transaction. If Stripe
+    fails the order is deleted again, as the old single transaction did.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=405)
+
+    user = await request.auser()
+    try:
+        order, errors = await sync_to_async(_create_order_from_cart)(request, user)
+        if errors:
             return JsonResponse({
                 'success': False,
-                'error': str(e)
-            }, status=500)
-    
-    return JsonResponse({'success': False}, status=405)
+                'errors': errors
+            }, status=400)
+
+        # Create Stripe PaymentIntent
+        try:
+            intent = await get_stripe().PaymentIntent.create_async(
+                amount=int(order.total * 100),  # Amount in cents
+                currency='usd',
+                metadata={
+                    'order_id': order.id,
+                    'user_id': user.id
+                },
+                description=f"Order #{order.order_number}"
+            )
+        except Exception:
+            await order.adelete()
+            raise
+
+        return JsonResponse({
+            'success': True,
+            'order_id': order.id,
+            'client_secret': intent.client_secret
+        })
+
+    except Exception as e:
+        logger.error(f"Order creation failed: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
 
 def process_order(request, cart, form):
     """Process and create a new order (legacy fallback)."""
@@ -385,6 +407,7 @@ def cancel_order(request, order_id):
             # Create Stripe refund if payment was processed
             if order.payment_status:
                 try:
+                    stripe = get_stripe()
                     payment_intents = stripe.PaymentIntent.list(
                         metadata={'order_id': order.id}
                     )
@@ -436,11 +459,12 @@ def delete_order(request, order_id):
     return redirect('orders:order_history')
 
 @csrf_exempt
-def stripe_webhook(request):
-    """Handle Stripe webhooks."""
+async def stripe_webhook(request):
+    """Handle Stripe webhooks (async: signature check in the loop, one awaited save)."""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
     event = None
+    stripe = get_stripe()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -459,10 +483,10 @@ def stripe_webhook(request):
         order_id = payment_intent.metadata.get('order_id')
         
         try:
-            order = Order.objects.get(id=order_id)
+            order = await Order.objects.aget(id=order_id)
             order.payment_status = True
             order.payment_date = timezone.now()
-            order.save()
+            await order.asave()
             logger.info(f"Payment succeeded for order {order.order_number}")
         except Order.DoesNotExist:
             logger.error(f"Order {order_id} not found for payment intent {payment_intent.id}")
@@ -472,6 +496,7 @@ def stripe_webhook(request):
 # Helper Functions
 def process_payment(order):
     """Process payment through Stripe."""
+    stripe = get_stripe()
     try:
         intent = stripe.PaymentIntent.create(
             amount=int(order.total * 100),
@@ -626,4 +651,56 @@ def order_history_api(request):
     paginated_orders = paginator.paginate_queryset(orders, request)
     serializer = OrderListSerializer(paginated_orders, many=True, context={'request': request})
 
-    return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
+    return paginator.get_paginated_response(serializer.data)
+
+
+# Staff reports: read only the sales rollups (see orders.rollups)
+def _report_range(request):
+    """Return ``(start, end)`` from the ``start``/``end`` dates (YYYY-MM-DD) or raise ValueError."""
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.query_params.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            raise ValueError(f'Invalid {name} date: {value}')
+    return get_range(dates['start'], dates['end'])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_report_api(request):
+    """Orders, revenue and units per day or hour."""
+    period = request.query_params.get('period', 'day')
+    if period not in ('day', 'hour'):
+        return Response({'error': 'period must be day or hour'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start, end = _report_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results = SalesPeriodSerializer(sales_series(period, start, end), many=True).data
+    return Response({'period': period, 'start': start, 'end': end, 'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def top_products_report_api(request):
+    """Best-selling products by revenue."""
+    try:
+        start, end = _report_range(request)
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results = ProductSalesSerializer(top_products(start, end, limit), many=True).data
+    return Response({'start': start, 'end': end, 'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def category_sales_report_api(request):
+    """Units and revenue per category."""
+    try:
+        start, end = _report_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results = CategorySalesSerializer(category_sales(start, end), many=True).data
+    return Response({'start': start, 'end': end, 'results': results})
@@ -1,13 +1,15 @@
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import stripe
 import json
 
+from .payments import get_stripe
+
 @csrf_exempt
 def stripe_webhook(request):
     payload = request.body
     sig_header = request.META['HTTP_STRIPE_SIGNATURE']
     event = None
+    stripe = get_stripe()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -1,7 +1,16 @@
 # products/admin.py
 from django.contrib import admin
+from django.db import transaction
+from django import forms
 from django.forms import ModelForm
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from .models import Category, Product, ImageUpload
+from .bulk import save_products, update_products
+from .catalog_import import FORMATS, ProductImporter
+from .exports import export_response
+import io
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +31,12 @@ class ProductAdminForm(ModelForm):
         model = Product
         fields = '__all__'
 
+class ProductImportForm(forms.Form):
+    """Upload form for the bulk product import."""
+    file = forms.FileField(label='Archivo', help_text='CSV o JSONL, un producto por fila')
+    format = forms.ChoiceField(label='Formato', choices=[(fmt, fmt.upper()) for fmt in FORMATS])
+    dry_run = forms.BooleanField(label='Solo validar', required=False)
+
 class ProductAdmin(admin.ModelAdmin):
     form = ProductAdminForm
     list_display = ('name', 'jewelry_type', 'material', 'price', 'stock', 'available', 'image_preview', 'created_at')
@@ -35,42 +50,26 @@ class ProductAdmin(admin.ModelAdmin):
     list_per_page = 25
 
     # Actions en lote
-    actions = ['make_available', 'make_unavailable', 'export_csv']
+    actions = ['make_available', 'make_unavailable', 'export_csv', 'export_jsonl']
 
     def make_available(self, request, queryset):
-        updated = queryset.update(available=True)
+        updated = update_products(queryset, available=True)
         self.message_user(request, f'{updated} productos marcados como disponibles.')
     make_available.short_description = 'Marcar productos como disponibles'
 
     def make_unavailable(self, request, queryset):
-        updated = queryset.update(available=False)
+        updated = update_products(queryset, available=False)
         self.message_user(request, f'{updated} productos marcados como no disponibles.')
     make_unavailable.short_description = 'Marcar productos como no disponibles'
 
     def export_csv(self, request, queryset):
-        import csv
-        from django.http import HttpResponse
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="productos.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Nombre', 'Tipo', 'Material', 'Precio', 'Stock', 'Disponible'])
-
-        for product in queryset:
-            writer.writerow([
-                product.name,
-                product.get_jewelry_type_display(),
-                product.get_material_display(),
-                product.price,
-                product.stock,
-                'Sí' if product.available else 'No'
-            ])
-
-        self.message_user(request, f'Exportados {queryset.count()} productos a CSV.')
-        return response
+        return export_response(queryset, 'csv')
     export_csv.short_description = 'Exportar productos a CSV'
 
+    def export_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+    export_jsonl.short_description = 'Exportar productos a JSONL'
+
     fieldsets = (
         ('Información Básica', {
             'fields': ('name', 'slug', 'description')
@@ -97,7 +96,7 @@ class ProductAdmin(admin.ModelAdmin):
             try:
                 return f'''
                 <div style="text-align: center;">
-                    <img src="{obj.image.url}" style="max-height: 50px; max-width: 50px; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
+                    <img src="{obj.thumbnail_url}" style="max-height: 50px; max-width: 50px; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
                     <br><small style="color: #666;">{obj.name[:20]}...</small>
                 </div>
                 '''
@@ -107,7 +106,61 @@ class ProductAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Image Preview'
     image_preview.allow_tags = True
 
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='products_product_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """Bulk import (upsert by slug) from an uploaded CSV/JSONL file."""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect('admin:products_product_changelist')
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            source = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            importer = ProductImporter(source, fmt=form.cleaned_data['format'], dry_run=form.cleaned_data['dry_run'])
+            stats = importer.run()
+            logger.info(f"Product import '{upload.name}' by {request.user}: {stats}")
+            prefix = 'Validados' if form.cleaned_data['dry_run'] else 'Importados'
+            self.message_user(
+                request,
+                f"{prefix} {stats['rows'] - stats['failed']} productos "
+                f"({stats['created']} nuevos, {stats['updated']} actualizados, {stats['failed']} con errores).",
+            )
+            for line_number, error in importer.errors[:20]:
+                self.message_user(request, f'Línea {line_number}: {error}', level='warning')
+            return redirect('admin:products_product_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Importar productos',
+        }
+        return TemplateResponse(request, 'admin/products/product/import.html', context)
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST' or '_save' not in request.POST:
+            return super().changelist_view(request, extra_context)
+
+        # list_editable: collect the edited rows and write them in one statement
+        request._edited_products = []
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            edited = request._edited_products
+            if edited:
+                fields = sorted({field for _, fields in edited for field in fields})
+                save_products([obj for obj, _ in edited], fields)
+                logger.info(f"{len(edited)} products updated from the list by {request.user}")
+        return response
+
     def save_model(self, request, obj, form, change):
+        edited = getattr(request, '_edited_products', None)
+        if change and edited is not None:
+            edited.append((obj, form.changed_data))
+            return
         super().save_model(request, obj, form, change)
         logger.info(f"Product '{obj.name}' was {'updated' if change else 'created'} by {request.user}")
 
@@ -137,7 +190,7 @@ class ImageUploadAdmin(admin.ModelAdmin):
             try:
                 return f'''
                 <div style="text-align: center;">
-                    <img src="{obj.image.url}" style="max-height: 50px; max-width: 50px; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
+                    <img src="{obj.thumbnail_url}" style="max-height: 50px; max-width: 50px; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
                     <br><small style="color: #666;">{obj.title[:20]}...</small>
                 </div>
                 '''
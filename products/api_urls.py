@@ -9,5 +9,12 @@ urlpatterns = [
     path('categories/list/', views.CategoryListAPIView.as_view(), name='api_category_list'),
     path('categories/detail/<int:pk>/', views.CategoryDetailAPIView.as_view(), name='api_category_detail'),
     path('featured/', views.featured_products_api, name='api_featured_products'),
+    path('index/', views.catalog_index_api, name='api_catalog_index'),
+    path('uploads/', views.upload_session_create, name='api_upload_session_create'),
+    path('uploads/<str:session_id>/', views.upload_session_detail, name='api_upload_session_detail'),
+    path('uploads/<str:session_id>/complete/', views.upload_session_complete, name='api_upload_session_complete'),
+    path('presigned/', views.presigned_upload_create, name='api_presigned_upload_create'),
+    path('presigned/upload/<str:token>/', views.presigned_upload_put, name='api_presigned_upload_put'),
+    path('presigned/complete/', views.presigned_upload_complete, name='api_presigned_upload_complete'),
     path('category/<slug:category_slug>/', views.products_by_category_api, name='api_products_by_category'),
 ]
\ No newline at end of file
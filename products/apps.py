@@ -8,3 +8,8 @@ class ProductsConfig(AppConfig):
     def ready(self):
         """Import signals when the app is ready."""
         import products.signals  # noqa
+        from django.conf import settings
+
+        if settings.TEMPLATE_TIMING:
+            from jewelry_catalog.template_timing import install
+            install()
@@ -0,0 +1,178 @@
+"""
+Reference counting and garbage collection for content-addressed image blobs.
+
+Uploads never delete a blob file themselves: they only release their
+reference. ``collect_garbage`` later removes blobs that stayed unreferenced
+for a grace period, plus stray files under ``ImageBlob.PREFIX`` without a
+row (e.g. left by a crash between storing a file and recording it). Storage
+is read in batched listings, so the store can be swept without loading every
+key at once.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from jewelry_catalog.storage import delete_many
+from .derivatives import derivative_name
+from .models import ImageBlob, ImageUpload, Product
+import logging
+
+logger = logging.getLogger('image_upload')
+
+DERIVATIVE_SUFFIX_RE = re.compile(r'__\d+w\.\w+$')
+
+
+def acquire_blob(blob_id):
+    ImageBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release_blob(blob_id):
+    # updated_at marks when the blob was last released, for the GC grace period
+    ImageBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1, updated_at=timezone.now()
+    )
+
+
+def blob_files(blob):
+    """Return the storage names of a blob and every thumbnail it may have."""
+    names = [blob.name]
+    for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+        for width in settings.IMAGE_DERIVATIVE_WIDTHS:
+            names.append(derivative_name(blob.name, width, image_format))
+    return names
+
+
+def iter_storage_files(storage, prefix, batch_size=1000):
+    """
+    Yield lists of up to ``batch_size`` ``(name, last_modified)`` pairs under ``prefix``.
+
+    S3 storages are read with paginated ``ListObjects`` calls, which carry
+    each object's ``LastModified``. Other storages are walked directory by
+    directory and give None: ask ``storage.get_modified_time`` when needed.
+    """
+    if hasattr(storage, 'bucket') and hasattr(storage, '_normalize_name'):
+        location = storage.location.strip('/')
+        key_prefix = storage._normalize_name(prefix)
+        batch = []
+        for summary in storage.bucket.objects.filter(Prefix=key_prefix).page_size(batch_size):
+            key = summary.key
+            batch.append((key[len(location) + 1:] if location else key, summary.last_modified))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    batch = []
+    pending = [prefix.rstrip('/')]
+    while pending:
+        directory = pending.pop()
+        try:
+            directories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        pending.extend(f'{directory}/{name}' for name in directories)
+        for name in files:
+            batch.append((f'{directory}/{name}', None))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def iter_storage_names(storage, prefix, batch_size=1000):
+    """Yield lists of up to ``batch_size`` file names stored under ``prefix``."""
+    for batch in iter_storage_files(storage, prefix, batch_size):
+        yield [name for name, _ in batch]
+
+
+def _stem(name):
+    """Return ``name`` without its extension or thumbnail suffix."""
+    if DERIVATIVE_SUFFIX_RE.search(name):
+        return DERIVATIVE_SUFFIX_RE.sub('', name)
+    return name.rsplit('.', 1)[0]
+
+
+def _referenced_by_products(names):
+    media_url = settings.MEDIA_URL
+    candidates = list(names) + [f'{media_url}{name}' for name in names]
+    referenced = set()
+    for image in Product.objects.filter(image__in=candidates).values_list('image', flat=True):
+        referenced.add(image[len(media_url):] if image.startswith(media_url) else image)
+    return referenced
+
+
+def delete_unreferenced(blob_ids, cutoff=None, storage=default_storage):
+    """
+    Delete the blobs among ``blob_ids`` that are still unreferenced; returns them.
+
+    The rows go first, locked and re-checked (``ref_count`` zero, released
+    before ``cutoff``, no upload pointing at them), so a blob acquired in the
+    meantime keeps its row and its files. The files of the deleted rows are
+    removed once the deletion commits.
+    """
+    with transaction.atomic():
+        rows = ImageBlob.objects.select_for_update().filter(pk__in=blob_ids, ref_count=0).exclude(
+            pk__in=ImageUpload.objects.filter(blob__in=blob_ids, blob__isnull=False).values('blob')
+        )
+        if cutoff is not None:
+            rows = rows.filter(updated_at__lt=cutoff)
+        blobs = list(rows)
+        if blobs:
+            ImageBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+            names = [name for blob in blobs for name in blob_files(blob)]
+            transaction.on_commit(lambda: delete_many(names, storage))
+    return blobs
+
+
+def collect_garbage(grace=timedelta(hours=24), batch_size=500, dry_run=False, storage=default_storage):
+    """
+    Delete unreferenced blobs and stray blob files; returns a stats dict.
+
+    A blob is removed when its ``ref_count`` is zero, it was released more
+    than ``grace`` ago and no product image points at it.
+    """
+    cutoff = timezone.now() - grace
+    stats = {'blobs_deleted': 0, 'files_scanned': 0, 'orphans_deleted': 0}
+
+    # Unreferenced blob rows
+    candidates = ImageBlob.objects.filter(ref_count=0, updated_at__lt=cutoff).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(candidates.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        in_use = _referenced_by_products([blob.name for blob in batch])
+        in_use |= set(ImageUpload.objects.filter(blob__in=batch).values_list('blob__name', flat=True))
+        garbage = [blob for blob in batch if blob.name not in in_use]
+        if garbage and not dry_run:
+            garbage = delete_unreferenced([blob.pk for blob in garbage], cutoff, storage)
+        stats['blobs_deleted'] += len(garbage)
+
+    # Files in the store without a blob row (originals and thumbnails share a stem)
+    for files in iter_storage_files(storage, ImageBlob.PREFIX, batch_size):
+        stats['files_scanned'] += len(files)
+        stems = {name: _stem(name) for name, _ in files}
+        known = {
+            _stem(name) for name in ImageBlob.objects.filter(
+                sha256__in={stem.rsplit('/', 1)[-1] for stem in stems.values()}
+            ).values_list('name', flat=True)
+        }
+        orphans = [
+            name for name, modified in files
+            if stems[name] not in known and (modified or storage.get_modified_time(name)) < cutoff
+        ]
+        if orphans and not dry_run:
+            delete_many(orphans, storage)
+        stats['orphans_deleted'] += len(orphans)
+
+    logger.info(f"[GC] Image blob collection {'(dry run) ' if dry_run else ''}finished: {stats}")
+    return stats
@@ -0,0 +1,135 @@
+"""
+Bulk changes to products without per-row saves.
+
+``update_products`` applies the same values to a queryset in one UPDATE and
+``save_products`` writes edited instances with one ``bulk_update``. Neither
+sends ``post_save``, so both adjust the facet counters themselves and send a
+single ``products_changed`` signal once the transaction commits, listing
+the affected product and category ids; ``products.signals`` invalidates the
+caches for all of them at once.
+
+``bulk_create_with_pks`` is ``bulk_create`` for callers that need the new
+primary keys, also on MySQL, which does not return them from bulk inserts.
+"""
+from collections import Counter, defaultdict, deque
+
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.dispatch import Signal
+from django.utils import timezone
+from .facets import FACET_FIELDS, apply_deltas, change_deltas, product_keys, row_keys, update_deltas
+from .models import Product
+import logging
+
+logger = logging.getLogger('products')
+
+# Sent with product_ids and category_ids (sets, or None for everything) after bulk changes commit
+products_changed = Signal()
+
+
+def bulk_create_with_pks(model, objs, key, batch_size=None):
+    """
+    ``model.objects.bulk_create(objs)`` leaving every object with its pk.
+
+    Backends that cannot return rows from a bulk insert leave the pks unset;
+    they are read back by ``key`` (attribute names telling the new rows
+    apart, e.g. ``('order_number',)``) among the rows above the largest pk
+    before the insert. Objects sharing a key get their pks in insertion order.
+    """
+    objs = list(objs)
+    db = router.db_for_write(model)
+    if not objs or connections[db].features.can_return_rows_from_bulk_insert:
+        return model.objects.using(db).bulk_create(objs, batch_size=batch_size)
+
+    last_pk = model.objects.using(db).aggregate(last=Max('pk'))['last'] or 0
+    model.objects.using(db).bulk_create(objs, batch_size=batch_size)
+    pending = defaultdict(deque)
+    for obj in objs:
+        pending[tuple(getattr(obj, field) for field in key)].append(obj)
+    rows = model.objects.using(db).filter(pk__gt=last_pk).order_by('pk').values_list('pk', *key)
+    for pk, *values in rows.iterator():
+        waiting = pending.get(tuple(values))
+        if waiting:
+            waiting.popleft().pk = pk
+    missing = sum(len(waiting) for waiting in pending.values())
+    if missing:
+        raise RuntimeError(f"{missing} {model._meta.object_name} rows created by bulk_create could not be read back")
+    return objs
+
+
+def notify_products_changed(product_ids, category_ids=()):
+    """
+    Send ``products_changed`` once the current transaction commits.
+
+    ``product_ids=None`` stands for the whole catalog (large imports).
+    """
+    if product_ids is not None:
+        product_ids, category_ids = set(product_ids), set(category_ids) - {None}
+        if not product_ids and not category_ids:
+            return
+    transaction.on_commit(
+        lambda: products_changed.send(sender=Product, product_ids=product_ids, category_ids=category_ids)
+    )
+
+
+def _category_id(values):
+    category = values.get('category', values.get('category_id'))
+    return getattr(category, 'pk', category)
+
+
+def update_products(queryset, **values):
+    """
+    Set ``values`` on every product of ``queryset`` in one statement.
+
+    Rows that already have all the values are left alone. Returns the
+    number of products updated.
+    """
+    literal = {field: value for field, value in values.items() if not hasattr(value, 'resolve_expression')}
+    changing = queryset.exclude(**literal) if literal else queryset
+    with transaction.atomic():
+        rows = list(changing.select_for_update().values_list('pk', 'category_id').order_by())
+        if not rows:
+            return 0
+        changing = Product.objects.filter(pk__in=[pk for pk, _ in rows])
+        apply_deltas(update_deltas(changing, values))
+        # update() skips auto_now; updated_at drives the API's Last-Modified
+        updated = changing.update(updated_at=timezone.now(), **values)
+
+        category_ids = {category_id for _, category_id in rows}
+        if 'category' in values or 'category_id' in values:
+            category_ids.add(_category_id(values))
+        notify_products_changed([pk for pk, _ in rows], category_ids)
+    logger.info(f"Bulk updated {updated} products: {', '.join(sorted(values))}")
+    return updated
+
+
+def save_products(products, fields):
+    """
+    Write ``fields`` of already-saved ``products`` with one ``bulk_update``.
+
+    Used where every product gets its own values (the admin's list_editable).
+    Returns the number of products written.
+    """
+    products = [product for product in products if product.pk]
+    if not products:
+        return 0
+    fields = [field for field in fields if field not in ('id', 'updated_at')] + ['updated_at']
+    now = timezone.now()
+    with transaction.atomic():
+        stored = {
+            row['pk']: row
+            for row in Product.objects.select_for_update().filter(pk__in=[p.pk for p in products])
+            .values('pk', *FACET_FIELDS).order_by()
+        }
+        deltas = Counter()
+        for product in products:
+            product.updated_at = now
+            before = row_keys(stored[product.pk]) if product.pk in stored else []
+            deltas.update(change_deltas(before, product_keys(product)))
+        apply_deltas(deltas)
+        Product.objects.bulk_update(products, fields)
+
+        category_ids = {p.category_id for p in products} | {row['category_id'] for row in stored.values()}
+        notify_products_changed([p.pk for p in products], category_ids)
+    logger.info(f"Bulk saved {len(products)} products: {', '.join(fields)}")
+    return len(products)
@@ -0,0 +1,301 @@
+"""
+Bulk import of products from CSV or JSON-lines files, upserting by slug.
+
+Records are streamed from the file and handled in batches. Each batch is
+validated with the ``ProductForm`` field rules (the category column is
+resolved with one query per batch), slugs are generated with ``slugify``
+for rows without one, and each batch is written in its own transaction:
+rows whose slug exists update that product with ``bulk_update``, only on the
+columns present in the file; the rest are created with
+``bulk_create(update_conflicts=True)``, which also absorbs a product created
+with the same slug in the meantime (new rows carry every required column).
+
+``bulk_create`` sends no signals, so the facet counters are adjusted per
+batch and one ``products_changed`` event is sent at the end of the import.
+The exporter's CSV (Spanish headers, display labels) imports back as is.
+"""
+import csv
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from .bulk import notify_products_changed
+from .exports import COLUMNS
+from .facets import FACET_FIELDS, apply_deltas, change_deltas, row_keys
+from .forms import ProductForm
+from .models import Category, Product
+import logging
+
+logger = logging.getLogger('products')
+
+FORMATS = ('csv', 'jsonl')
+IMPORT_FIELDS = [
+    'name', 'slug', 'description', 'price', 'jewelry_type', 'material',
+    'category', 'stock', 'available', 'image',
+]
+REQUIRED_FIELDS = ('name', 'description', 'price')
+# Column headers accepted besides the field names (the exporter's CSV)
+HEADER_ALIASES = {
+    **{header.lower(): field for field, header in COLUMNS},
+    'category__name': 'category',
+    'categoría': 'category',
+    'categoria': 'category',
+}
+TRUE_VALUES = {'1', 'true', 'sí', 'si', 'yes', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'off', ''}
+# Above this many products the caches are invalidated wholesale
+MAX_NOTIFIED_PRODUCTS = 5000
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, {field: value})`` from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield line_number, e
+                    continue
+                if not isinstance(record, dict):
+                    record = ValueError('se esperaba un objeto JSON')
+                yield line_number, record
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _choices(choices):
+    lookup = {}
+    for code, label in choices:
+        lookup[code.lower()] = code
+        lookup[label.lower()] = code
+    return lookup
+
+
+class ProductImporter:
+    """
+    Import the records of a CSV or JSONL stream; see the module docstring.
+
+    ``progress`` is called with the running stats after every batch.
+    """
+
+    def __init__(self, stream, fmt='csv', batch_size=500, dry_run=False, progress=None):
+        self.stream = stream
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.progress = progress
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'seconds': 0.0}
+        self.errors = []
+        # One unbound ProductForm supplies the field checks and clean_<field> rules for every row
+        self.form = ProductForm()
+        self.form.cleaned_data = {}
+        self.choices = {
+            'jewelry_type': _choices(Product.JEWELRY_TYPES),
+            'material': _choices(Product.MATERIALS),
+        }
+        self._seen_slugs = set()
+        self._generated_slugs = Counter()
+        self._product_ids = set()
+        self._category_ids = set()
+        self._notify_all = False
+
+    def run(self):
+        start = time.perf_counter()
+        records = read_records(self.stream, self.fmt)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch)
+            self.stats['seconds'] = time.perf_counter() - start
+            if self.progress:
+                self.progress(self.stats)
+
+        if not self.dry_run:
+            if self._notify_all:
+                notify_products_changed(None, None)
+            else:
+                notify_products_changed(self._product_ids, self._category_ids)
+        self.stats['seconds'] = time.perf_counter() - start
+        logger.info(f"Imported products: {self.stats}")
+        return self.stats
+
+    def _fail(self, line_number, message):
+        self.stats['failed'] += 1
+        self.errors.append((line_number, message))
+
+    def _normalize(self, record):
+        values = {}
+        for header, value in record.items():
+            if header is None:
+                continue
+            field = HEADER_ALIASES.get(header.strip().lower(), header.strip().lower())
+            if field in IMPORT_FIELDS:
+                values[field] = value.strip() if isinstance(value, str) else value
+        return values
+
+    def _clean(self, values, categories):
+        """Return ``(cleaned, errors)`` for one normalized record."""
+        cleaned, errors = {}, []
+        for field, value in values.items():
+            if field == 'slug':
+                continue
+            if field == 'category':
+                if value in (None, ''):
+                    cleaned['category'] = None
+                elif str(value).lower() in categories:
+                    cleaned['category'] = categories[str(value).lower()]
+                else:
+                    errors.append(f"category: Categoría desconocida: {value}")
+                continue
+            if field in self.choices and isinstance(value, str):
+                value = self.choices[field].get(value.lower(), value)
+            elif field == 'available' and isinstance(value, str):
+                if value.lower() not in TRUE_VALUES | FALSE_VALUES:
+                    errors.append(f"available: Valor no válido: {value}")
+                    continue
+                value = value.lower() in TRUE_VALUES
+            try:
+                value = self.form.fields[field].clean(value)
+                Product._meta.get_field(field).run_validators(value)
+                # clean_image stores uploaded files; imports only carry names or URLs
+                if field != 'image' and hasattr(self.form, f'clean_{field}'):
+                    self.form.cleaned_data[field] = value
+                    value = getattr(self.form, f'clean_{field}')()
+                cleaned[field] = value
+            except ValidationError as e:
+                errors.append(f"{field}: {' '.join(e.messages)}")
+        return cleaned, errors
+
+    def _slug(self, values, cleaned):
+        slug = values.get('slug')
+        if slug:
+            return slugify(slug)
+        base = slugify(cleaned.get('name') or '')
+        if not base:
+            return ''
+        # Rows of the same file that share a name get -2, -3...: stable across re-imports
+        self._generated_slugs[base] += 1
+        count = self._generated_slugs[base]
+        return base if count == 1 else f'{base}-{count}'
+
+    def _slug_errors(self, slug, values, existing):
+        if not slug:
+            return ["slug: No se pudo generar el slug."]
+        if len(slug) > Product._meta.get_field('slug').max_length:
+            return ["slug: El slug es demasiado largo."]
+        if slug in self._seen_slugs:
+            return [f"slug: Slug repetido en el archivo: {slug}"]
+        if slug in existing:
+            return []
+        # New products need every required column; updates only the ones they change
+        return [f"{field}: Este campo es obligatorio." for field in REQUIRED_FIELDS if values.get(field) in (None, '')]
+
+    def _resolve_categories(self, batch):
+        wanted = {
+            str(values['category']) for _, values in batch
+            if not isinstance(values, Exception) and values.get('category') not in (None, '')
+        }
+        if not wanted:
+            return {}
+        categories = {}
+        query = Q(slug__in=wanted) | Q(name__in=wanted) | Q(pk__in=[v for v in wanted if v.isdigit()])
+        for category in Category.objects.filter(query):
+            for key in (category.slug, category.name, str(category.pk)):
+                categories[key.lower()] = category
+        return categories
+
+    def _import_batch(self, batch):
+        self.stats['rows'] += len(batch)
+        normalized = [
+            (line_number, record if isinstance(record, Exception) else self._normalize(record))
+            for line_number, record in batch
+        ]
+        categories = self._resolve_categories(normalized)
+
+        checked = []
+        for line_number, values in normalized:
+            if isinstance(values, Exception):
+                checked.append((line_number, {}, {}, [f"Registro no válido: {values}"], None))
+                continue
+            cleaned, errors = self._clean(values, categories)
+            slug = self._slug(values, cleaned)
+            checked.append((line_number, values, cleaned, errors, slug))
+
+        existing = set(
+            Product.objects.filter(slug__in=[slug for *_, slug in checked if slug]).values_list('slug', flat=True)
+        )
+        rows = {}
+        for line_number, values, cleaned, errors, slug in checked:
+            if slug is not None:
+                errors += self._slug_errors(slug, values, existing)
+            if errors:
+                self._fail(line_number, ' '.join(errors))
+                continue
+            self._seen_slugs.add(slug)
+            rows[slug] = cleaned
+        if rows:
+            self._upsert(rows)
+
+    def _upsert(self, rows):
+        """Write the cleaned ``{slug: values}`` of one batch."""
+        with transaction.atomic():
+            stored = {
+                row['slug']: row
+                for row in Product.objects.filter(slug__in=rows).values('pk', 'slug', *FACET_FIELDS).order_by()
+            }
+            self.stats['created'] += len(rows) - len(stored)
+            self.stats['updated'] += len(stored)
+            if self.dry_run:
+                return
+
+            now = timezone.now()
+            products, deltas = [], Counter()
+            for slug, values in rows.items():
+                product = Product(pk=stored.get(slug, {}).get('pk'), slug=slug, updated_at=now, **values)
+                products.append(product)
+                after = {field: getattr(product, field) for field in FACET_FIELDS}
+                before = []
+                if slug in stored:
+                    # Columns missing from the file keep their stored values
+                    before = row_keys(stored[slug])
+                    after.update({
+                        field: stored[slug][field] for field in FACET_FIELDS
+                        if field.removesuffix('_id') not in values
+                    })
+                deltas.update(change_deltas(before, row_keys(after)))
+                self._category_ids.update({after['category_id'], stored.get(slug, {}).get('category_id')})
+
+            # One statement per set of columns (every row of a CSV has the same).
+            # Updates go through bulk_update: an upsert would also insert the
+            # missing required columns as NULL, which fails before the conflict.
+            groups = {}
+            for product, values in zip(products, rows.values()):
+                groups.setdefault((product.pk is not None, tuple(sorted(values))), []).append(product)
+            # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target (slug is the only unique key)
+            target = {'unique_fields': ['slug']} if connection.features.supports_update_conflicts_with_target else {}
+            for (exists, fields), group in groups.items():
+                if exists:
+                    Product.objects.bulk_update(group, [*fields, 'updated_at'])
+                else:
+                    Product.objects.bulk_create(
+                        group, update_conflicts=True, update_fields=[*fields, 'updated_at'], **target,
+                    )
+            apply_deltas(deltas)
+
+            if not self._notify_all:
+                self._product_ids.update(Product.objects.filter(slug__in=rows).values_list('pk', flat=True))
+                if len(self._product_ids) > MAX_NOTIFIED_PRODUCTS:
+                    self._notify_all = True
+                    self._product_ids = set()
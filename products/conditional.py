@@ -0,0 +1,131 @@
+"""
+HTTP conditional request support for the catalog API.
+
+Validators (ETag / Last-Modified) are derived from a single aggregate query
+over the result set, so clients that poll an unchanged listing get a 304
+without any rows being fetched or serialized.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+import logging
+
+logger = logging.getLogger('cache')
+
+# Cache-Control directives per endpoint. Shared caches (CDN) may keep
+# responses longer than browsers since they revalidate with the ETag.
+CACHE_CONTROL = {
+    'product_list': {'public': True, 'max_age': 60, 's_maxage': 300},
+    'product_detail': {'public': True, 'max_age': 300, 's_maxage': 900},
+    'category_list': {'public': True, 'max_age': 600, 's_maxage': 3600},
+    'featured_products': {'public': True, 'max_age': 120, 's_maxage': 600},
+}
+
+CatalogValidators = namedtuple('CatalogValidators', ['etag', 'last_modified'])
+
+
+def get_catalog_validators(request, queryset, related=()):
+    """
+    Compute ETag and Last-Modified for a queryset with one aggregate query.
+
+    ``related`` lists extra ``updated_at`` lookups whose changes alter the
+    payload (e.g. ``category__updated_at`` for the denormalized category name).
+    The row count is part of the ETag so deletions invalidate it too.
+    """
+    aggregates = {'_count': Count('pk', distinct=True), '_updated': Max('updated_at')}
+    for index, lookup in enumerate(related):
+        aggregates[f'_related_{index}'] = Max(lookup)
+    if not queryset.query.is_sliced:
+        queryset = queryset.order_by()
+    values = queryset.aggregate(**aggregates)
+
+    timestamps = [value for key, value in values.items() if key != '_count' and value is not None]
+    last_modified = max(timestamps) if timestamps else None
+
+    renderer = getattr(request, 'accepted_renderer', None)
+    fingerprint = '|'.join([
+        str(values['_count']),
+        *(value.isoformat() if value else '-' for key, value in sorted(values.items()) if key != '_count'),
+        getattr(renderer, 'format', ''),
+        request.get_full_path(),
+    ])
+    etag = quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+    return CatalogValidators(etag, last_modified)
+
+
+def get_not_modified_response(request, validators):
+    """Return a 304/412 response if the request preconditions allow it, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # HTTP dates have second resolution
+    last_modified = int(validators.last_modified.timestamp()) if validators.last_modified else None
+    response = get_conditional_response(request, etag=validators.etag, last_modified=last_modified)
+    if response is not None:
+        _set_validator_headers(response, validators)
+        logger.debug(f"Conditional response {response.status_code} for {request.path}")
+    return response
+
+
+def patch_catalog_headers(request, response, validators, endpoint):
+    """Attach validators and the endpoint's Cache-Control policy to a response."""
+    if validators is None or response.status_code != 200:
+        return response
+    _set_validator_headers(response, validators)
+    patch_vary_headers(response, ['Accept'])
+
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is None or renderer.format == 'json':
+        patch_cache_control(response, **CACHE_CONTROL[endpoint])
+    else:
+        # Browsable API pages embed per-user markup and must not be shared.
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _set_validator_headers(response, validators):
+    response['ETag'] = validators.etag
+    if validators.last_modified:
+        response['Last-Modified'] = http_date(validators.last_modified.timestamp())
+
+
+class ConditionalGetMixin:
+    """
+    Mixin for DRF generic views adding ETag/Last-Modified revalidation.
+
+    Validators are checked before the queryset is evaluated, so a matching
+    ``If-None-Match`` skips both the row fetch and serialization.
+    """
+    cache_control_endpoint = None
+    validator_related = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        self.catalog_validators = get_catalog_validators(request, queryset, self.validator_related)
+        not_modified = get_not_modified_response(request, self.catalog_validators)
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        validators = get_catalog_validators(request, queryset, self.validator_related)
+        if validators.last_modified is not None:
+            self.catalog_validators = validators
+            not_modified = get_not_modified_response(request, validators)
+            if not_modified is not None:
+                return not_modified
+        return super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            patch_catalog_headers(
+                request, response, getattr(self, 'catalog_validators', None), self.cache_control_endpoint
+            )
+        return response
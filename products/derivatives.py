@@ -0,0 +1,176 @@
+"""
+Thumbnail (derivative) generation for uploaded images.
+
+Each original stored in the default storage gets resized WebP and JPEG copies
+saved next to it (``<name>__<width>w.<ext>``). Generation runs in a small
+background thread pool once the upload transaction commits, and the result is
+recorded on the model's ``derivatives`` field::
+
+    {"source": "uploads/2025/01/01/anillo.jpg",
+     "webp": {"320": "uploads/2025/01/01/anillo__320w.webp", ...},
+     "jpeg": {"320": "uploads/2025/01/01/anillo__320w.jpg", ...}}
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from jewelry_catalog.storage import delete_many
+from PIL import Image, ImageOps
+from .image_urls import get_storage_name
+from .models import ImageBlob, ImageUpload, Product
+import logging
+
+logger = logging.getLogger('image_upload')
+
+FORMATS = {
+    'webp': {'extension': 'webp', 'pillow_format': 'WEBP', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'extension': 'jpg', 'pillow_format': 'JPEG', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+
+
+def derivative_name(name, width, image_format):
+    root, _ = os.path.splitext(name)
+    return f"{root}__{width}w.{FORMATS[image_format]['extension']}"
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Create the configured thumbnails for the stored image ``name``.
+
+    Widths larger than the original are skipped, except that the smallest
+    width is always produced so every image has at least one thumbnail.
+    Returns the ``derivatives`` mapping.
+    """
+    widths = sorted(settings.IMAGE_DERIVATIVE_WIDTHS)
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    derivatives = {'source': name}
+    for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+        spec = FORMATS[image_format]
+        sizes = {}
+        for width in widths:
+            if width > image.width and sizes:
+                break
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+            if spec['pillow_format'] == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+
+            buffer = BytesIO()
+            resized.save(buffer, spec['pillow_format'], **spec['options'])
+            target = derivative_name(name, width, image_format)
+            if storage.exists(target):
+                storage.delete(target)
+            sizes[str(width)] = storage.save(target, ContentFile(buffer.getvalue()))
+        derivatives[image_format] = sizes
+
+    logger.info(f"[DERIVATIVES] Generated {sum(len(v) for k, v in derivatives.items() if k != 'source')} thumbnails for {name}")
+    return derivatives
+
+
+def delete_derivatives(derivatives, storage=default_storage):
+    """Delete the files listed in a ``derivatives`` mapping."""
+    names = [
+        name for image_format, sizes in (derivatives or {}).items() if image_format != 'source'
+        for name in sizes.values()
+    ]
+    for name in delete_many(names, storage):
+        logger.warning(f"[DERIVATIVES] Could not delete {name}")
+
+
+def get_source_name(instance):
+    """Return the storage name of the original image of a Product or ImageUpload."""
+    image = instance.image
+    if hasattr(image, 'name'):
+        return image.name or None
+    return get_storage_name(image)
+
+
+def schedule_derivatives(instance):
+    """
+    Queue thumbnail generation for ``instance`` after the transaction commits.
+
+    Stale thumbnails of a replaced image are removed first. Runs inline when
+    ``IMAGE_DERIVATIVES_ASYNC`` is off (tests, management commands).
+    """
+    source = get_source_name(instance)
+    derivatives = instance.derivatives or {}
+    if derivatives.get('source') == source:
+        return
+    if derivatives:
+        if not derivatives.get('source', '').startswith(ImageBlob.PREFIX):
+            delete_derivatives(derivatives)
+        type(instance).objects.filter(pk=instance.pk).update(derivatives={})
+    if source is None:
+        return
+
+    shared = find_derivatives(source)
+    if shared:
+        # Deduplicated images share one set of thumbnails
+        type(instance).objects.filter(pk=instance.pk).update(derivatives=shared)
+        return
+
+    model, pk = type(instance), instance.pk
+    if settings.IMAGE_DERIVATIVES_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(_run_in_worker, model, pk))
+    else:
+        transaction.on_commit(lambda: process_derivatives(model, pk))
+
+
+def find_derivatives(source):
+    """Return thumbnails already generated for ``source`` by another row, if any."""
+    if not source.startswith(ImageBlob.PREFIX):
+        return None
+    for model in (ImageUpload, Product):
+        derivatives = (
+            model.objects.filter(derivatives__source=source).values_list('derivatives', flat=True).first()
+        )
+        if derivatives:
+            return derivatives
+    return None
+
+
+def process_derivatives(model, pk):
+    """Generate and record thumbnails for one row; returns the mapping or None."""
+    instance = model.objects.filter(pk=pk).first()
+    source = get_source_name(instance) if instance else None
+    if source is None:
+        return None
+    try:
+        derivatives = generate_derivatives(source)
+    except Exception as e:
+        logger.error(f"[DERIVATIVES] Failed for {model.__name__} {pk} ({source}): {str(e)}")
+        return None
+
+    updates = {'derivatives': derivatives}
+    if any(field.name == 'updated_at' for field in model._meta.fields):
+        # Listings revalidate on updated_at and embed srcset
+        updates['updated_at'] = timezone.now()
+    # Only record them if the image was not replaced meanwhile
+    lookup = {'image': instance.image.name if hasattr(instance.image, 'name') else instance.image}
+    if not model.objects.filter(pk=pk, **lookup).update(**updates):
+        if not source.startswith(ImageBlob.PREFIX):
+            delete_derivatives(derivatives)
+        return None
+
+    if model is Product:
+        from .snapshot import invalidate_snapshot
+        invalidate_snapshot()
+    return derivatives
+
+
+def _run_in_worker(model, pk):
+    try:
+        process_derivatives(model, pk)
+    finally:
+        connections.close_all()
@@ -0,0 +1,121 @@
+"""
+Streaming product exports.
+
+``ProductExporter`` reads the products in pages of ``chunk_size`` rows keyed
+on the primary key (``pk > last``), one query per page, and yields the export
+in text chunks of the same size. Memory stays flat however many rows are
+exported, also on MySQL, where the driver buffers a whole result set and
+``.iterator()`` would not stream. Formats:
+
+- ``csv``: the admin spreadsheet, with Spanish headers and display labels.
+- ``jsonl``: one JSON object per product, with the stored codes.
+- ``compact``: a JSON array of field names, then one JSON array per product.
+
+Used by the admin export actions (``export_response``) and the
+``export_products`` management command.
+"""
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .models import Product
+
+# (values_list field, CSV header)
+COLUMNS = [
+    ('id', 'ID'),
+    ('name', 'Nombre'),
+    ('slug', 'Slug'),
+    ('category__name', 'Categoría'),
+    ('jewelry_type', 'Tipo'),
+    ('material', 'Material'),
+    ('price', 'Precio'),
+    ('stock', 'Stock'),
+    ('available', 'Disponible'),
+]
+FIELDS = [field for field, _ in COLUMNS]
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'compact': ('application/x-ndjson', 'compact.jsonl'),
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+JEWELRY_TYPE_LABELS = dict(Product.JEWELRY_TYPES)
+MATERIAL_LABELS = dict(Product.MATERIALS)
+TYPE_INDEX = FIELDS.index('jewelry_type')
+MATERIAL_INDEX = FIELDS.index('material')
+AVAILABLE_INDEX = FIELDS.index('available')
+ID_INDEX = FIELDS.index('id')
+
+
+class ProductExporter:
+    """Iterate over the export of ``queryset`` as text chunks; ``rows`` counts the products written."""
+
+    def __init__(self, queryset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.queryset = queryset
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+    def __iter__(self):
+        encode = getattr(self, f'_{self.fmt}')()
+        header = next(encode)
+        if header:
+            yield header
+        for batch in self._batches():
+            self.rows += len(batch)
+            yield encode.send(batch)
+
+    def _batches(self):
+        rows = self.queryset.order_by('pk').values_list(*FIELDS)
+        page = rows
+        while True:
+            batch = list(page[:self.chunk_size])
+            if batch:
+                yield batch
+            if len(batch) < self.chunk_size:
+                return
+            page = rows.filter(pk__gt=batch[-1][ID_INDEX])
+
+    def _csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([header for _, header in COLUMNS])
+        while True:
+            batch = yield _drain(buffer)
+            for row in batch:
+                row = list(row)
+                row[TYPE_INDEX] = JEWELRY_TYPE_LABELS.get(row[TYPE_INDEX], row[TYPE_INDEX])
+                row[MATERIAL_INDEX] = MATERIAL_LABELS.get(row[MATERIAL_INDEX], row[MATERIAL_INDEX])
+                row[AVAILABLE_INDEX] = 'Sí' if row[AVAILABLE_INDEX] else 'No'
+                writer.writerow(row)
+
+    def _jsonl(self):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        batch = yield ''
+        while True:
+            batch = yield ''.join(encoder.encode(dict(zip(FIELDS, row))) + '\n' for row in batch)
+
+    def _compact(self):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        batch = yield encoder.encode(FIELDS) + '\n'
+        while True:
+            batch = yield ''.join(encoder.encode(row) + '\n' for row in batch)
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def export_response(queryset, fmt='csv', filename='productos'):
+    """Return a StreamingHttpResponse with the export of ``queryset``."""
+    content_type, extension = FORMATS[fmt]
+    response = StreamingHttpResponse(ProductExporter(queryset, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
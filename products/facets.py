@@ -0,0 +1,141 @@
+"""
+Counts of available products per category, jewelry type and material.
+
+Counts live in ``FacetCount`` rows and are adjusted by deltas: product
+saves and deletes go through ``products.signals``, bulk changes through
+``products.bulk`` (``queryset.update`` sends no signals).
+Reads are a single query on a small table, cached until the next change;
+with a per-process cache, other workers only see that change once their
+copy expires (``shared_timeout``).
+``reconcile`` recomputes everything from the products table.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from jewelry_catalog.caching import shared_timeout
+from .models import FacetCount, Product
+
+FACETS = ('category', 'jewelry_type', 'material')
+FACET_FIELDS = ('available', 'category_id', 'jewelry_type', 'material')
+CACHE_KEY = 'product_facet_counts'
+
+
+def facet_keys(category_id, jewelry_type, material):
+    """Return the ``(facet, value)`` pairs an available product counts towards."""
+    keys = [('all', ''), ('jewelry_type', jewelry_type), ('material', material)]
+    if category_id is not None:
+        keys.append(('category', str(category_id)))
+    return keys
+
+
+def product_keys(product):
+    """``facet_keys`` for a Product instance, or [] if it is not available."""
+    if not product.available:
+        return []
+    return facet_keys(product.category_id, product.jewelry_type, product.material)
+
+
+def apply_deltas(deltas):
+    """Add ``{(facet, value): delta}`` to the counters."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    for (facet, value), delta in deltas.items():
+        updated = FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    FacetCount.objects.create(facet=facet, value=value, count=delta)
+            except IntegrityError:
+                # Created concurrently
+                FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def change_deltas(old_keys, new_keys):
+    deltas = Counter(new_keys)
+    deltas.subtract(Counter(old_keys))
+    return deltas
+
+
+def update_deltas(queryset, changes):
+    """
+    Counter deltas for applying ``queryset.update(**changes)``.
+
+    Rows are grouped by their facet values, so this is one query however
+    many products the queryset matches. ``changes`` uses model field names
+    (``category`` may be a Category or an id).
+    """
+    changes = {('category_id' if field == 'category' else field): value for field, value in changes.items()}
+    if 'category_id' in changes:
+        changes['category_id'] = getattr(changes['category_id'], 'pk', changes['category_id'])
+    if not set(changes) & set(FACET_FIELDS):
+        return Counter()
+
+    deltas = Counter()
+    groups = queryset.values(*FACET_FIELDS).annotate(n=Count('pk')).order_by()
+    for group in groups:
+        n = group.pop('n')
+        before = row_keys(group)
+        after = row_keys({**group, **{f: v for f, v in changes.items() if f in FACET_FIELDS}})
+        for key, delta in change_deltas(before, after).items():
+            deltas[key] += delta * n
+    return deltas
+
+
+def row_keys(values):
+    """``facet_keys`` for a ``values()`` row with the ``FACET_FIELDS``."""
+    if not values['available']:
+        return []
+    return facet_keys(values['category_id'], values['jewelry_type'], values['material'])
+
+
+def get_facet_counts():
+    """Return ``{'all': n, 'category': {id: n}, 'jewelry_type': {...}, 'material': {...}}``."""
+    counts = cache.get(CACHE_KEY)
+    if counts is None:
+        counts = {'all': 0, **{facet: {} for facet in FACETS}}
+        for facet, value, count in FacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'count'):
+            if facet == 'all':
+                counts['all'] = count
+            elif facet == 'category':
+                counts['category'][int(value)] = count
+            elif facet in counts:
+                counts[facet][value] = count
+        cache.set(CACHE_KEY, counts, shared_timeout(None))
+    return counts
+
+
+def compute_counts():
+    """Count available products per facet directly from the products table."""
+    expected = Counter()
+    groups = (
+        Product.objects.filter(available=True)
+        .values('category_id', 'jewelry_type', 'material').annotate(n=Count('pk')).order_by()
+    )
+    for group in groups:
+        for key in facet_keys(group['category_id'], group['jewelry_type'], group['material']):
+            expected[key] += group['n']
+    return expected
+
+
+def reconcile(dry_run=False):
+    """Fix counters that drifted from the products table; returns ``{key: (stored, actual)}``."""
+    with transaction.atomic():
+        expected = compute_counts()
+        stored = {
+            (facet, value): count
+            for facet, value, count in FacetCount.objects.select_for_update().values_list('facet', 'value', 'count')
+        }
+        drift = {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in set(stored) | set(expected)
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+        if drift and not dry_run:
+            for (facet, value), (_, actual) in drift.items():
+                FacetCount.objects.update_or_create(facet=facet, value=value, defaults={'count': actual})
+            transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+    return drift
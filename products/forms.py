@@ -1,5 +1,32 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Category, Product, ImageUpload
+from .uploads import ImageStreamWriter, InvalidImageUpload, StoredImageUpload, get_max_upload_size
+
+
+class DirectUploadFileInput(forms.FileInput):
+    """
+    File input that also accepts a storage name posted under the same field name.
+
+    ``static/js/direct_upload.js`` uploads the file straight to storage and
+    replaces the file with the stored name, so the file never reaches the form.
+    """
+
+    def value_from_datadict(self, data, files, name):
+        return files.get(name) or data.get(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return name not in files and name not in data
+
+
+class DirectUploadImageField(forms.CharField):
+    """Image reference field: a directly uploaded storage name or a posted file."""
+    widget = DirectUploadFileInput
+
+    def to_python(self, value):
+        if isinstance(value, UploadedFile):
+            return value
+        return super().to_python(value)
 
 
 class ProductForm(forms.ModelForm):
@@ -44,11 +71,13 @@ class ProductForm(forms.ModelForm):
             'available': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
-            'image': forms.FileInput(attrs={
+            'image': DirectUploadFileInput(attrs={
                 'class': 'form-control',
-                'accept': 'image/*'
+                'accept': 'image/*',
+                'data-direct-upload': 'product'
             }),
         }
+        field_classes = {'image': DirectUploadImageField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -75,6 +104,22 @@ class ProductForm(forms.ModelForm):
             raise forms.ValidationError("El stock no puede ser negativo.")
         return stock
 
+    def clean_image(self):
+        """Store posted files (browsers without JavaScript) and keep the current image if none is given."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            writer = ImageStreamWriter(image.name, content_addressed=True)
+            try:
+                for chunk in image.chunks():
+                    writer.write(chunk)
+                return writer.close().storage_name
+            except InvalidImageUpload as e:
+                writer.abort()
+                raise forms.ValidationError(str(e))
+        if not image and self.instance.pk:
+            return self.instance.image
+        return image
+
 
 class ProductSearchForm(forms.Form):
     """Form for advanced product search and filtering."""
@@ -185,12 +230,22 @@ class ProductSearchForm(forms.Form):
         return cleaned_data
 
 
+class StreamedImageField(forms.ImageField):
+    """ImageField that accepts files already validated and stored while streaming."""
+
+    def to_python(self, data):
+        if isinstance(data, StoredImageUpload):
+            return data
+        return super().to_python(data)
+
+
 class SimpleImageUploadForm(forms.ModelForm):
     """Simple form for uploading images only."""
 
     class Meta:
         model = ImageUpload
         fields = ['title', 'image', 'description']
+        field_classes = {'image': StreamedImageField}
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -200,7 +255,8 @@ class SimpleImageUploadForm(forms.ModelForm):
             'image': forms.FileInput(attrs={
                 'class': 'form-control',
                 'accept': 'image/*',
-                'required': True
+                'required': True,
+                'data-direct-upload': 'upload'
             }),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
@@ -224,7 +280,7 @@ class SimpleImageUploadForm(forms.ModelForm):
         image = self.cleaned_data.get('image')
         if image:
             # Check file size (5MB limit)
-            if image.size > 5 * 1024 * 1024:
+            if image.size > get_max_upload_size():
                 raise forms.ValidationError("El archivo es demasiado grande. Máximo 5MB.")
 
             # Check file type
@@ -232,4 +288,12 @@ class SimpleImageUploadForm(forms.ModelForm):
             if hasattr(image, 'content_type') and image.content_type not in allowed_types:
                 raise forms.ValidationError("Tipo de archivo no permitido. Use JPG, PNG, GIF o WebP.")
 
+            # Streamed uploads are already in storage: keep the stored name
+            if isinstance(image, StoredImageUpload):
+                self.instance.blob = image.blob
+                # Stored blobs are named by hash: title them after the uploaded file
+                if not self.cleaned_data.get('title'):
+                    self.cleaned_data['title'] = ImageUpload.title_from_filename(image.name)
+                return image.storage_name
+
         return image
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""
+Bulk import of image folders and zip archives into ``ImageUpload`` rows.
+
+Images are processed in batches. For each batch a bounded thread pool reads
+and hashes the files, the blobs that are not stored yet are uploaded (again
+in the pool) under their content-addressed names, and the rows are created
+in a single transaction on the calling thread. Thumbnails are generated in
+the pool afterwards. Worker threads only touch files and storage, never the
+database.
+
+Finished entries are appended to a JSON-lines manifest once their batch is
+committed, so an interrupted import resumes where it stopped. Files stored
+by a batch that never committed are left for ``gc_image_blobs``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from .bulk import bulk_create_with_pks
+from .derivatives import find_derivatives, generate_derivatives
+from .image_queries import invalidate_image_stats
+from .models import ImageBlob, ImageUpload
+from .uploads import (
+    MAGIC_LENGTH, READ_SIZE, InvalidImageUpload, get_max_upload_size, sniff_content_type, store_stream
+)
+import logging
+
+logger = logging.getLogger('image_upload')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class ImageSource:
+    """The image files of a directory or a zip archive, addressed by relative path."""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_zip = zipfile.is_zipfile(path) if os.path.isfile(path) else False
+        if not self.is_zip and not os.path.isdir(path):
+            raise ValueError(f'{path} is not a directory or a zip archive')
+        # ZipFile objects must not be shared between threads
+        self._local = threading.local()
+
+    def entries(self):
+        """Return the relative paths of the image files, sorted."""
+        if self.is_zip:
+            with zipfile.ZipFile(self.path) as archive:
+                names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            names = []
+            for directory, dirnames, filenames in os.walk(self.path):
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                relative = os.path.relpath(directory, self.path)
+                names.extend(
+                    filename if relative == '.' else f'{relative}/{filename}'.replace(os.sep, '/')
+                    for filename in filenames
+                )
+        return sorted(
+            name for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+            and not any(part.startswith('.') or part == '__MACOSX' for part in name.split('/'))
+        )
+
+    def open(self, entry):
+        if not self.is_zip:
+            return open(os.path.join(self.path, entry), 'rb')
+        archive = getattr(self._local, 'archive', None)
+        if archive is None:
+            archive = self._local.archive = zipfile.ZipFile(self.path)
+        return archive.open(entry)
+
+    def default_manifest_path(self):
+        return f"{self.path.rstrip('/' + os.sep)}.import-manifest.jsonl"
+
+
+def read_manifest(path):
+    """Return the entries already imported according to the manifest at ``path``."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as manifest:
+        for line in manifest:
+            try:
+                done.add(json.loads(line)['entry'])
+            except (ValueError, KeyError):
+                # A line cut short by an interruption
+                continue
+    return done
+
+
+class ImageImporter:
+    """
+    Import the images of an ``ImageSource``; see the module docstring.
+
+    ``progress`` is called with the running stats after every batch.
+    """
+
+    def __init__(self, source, manifest_path=None, workers=4, batch_size=50,
+                 derivatives=True, storage=default_storage, progress=None):
+        self.source = source
+        self.manifest_path = manifest_path or source.default_manifest_path()
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.derivatives = derivatives
+        self.storage = storage
+        self.progress = progress
+        self.max_size = get_max_upload_size()
+        self.stats = {
+            'imported': 0, 'skipped': 0, 'duplicates': 0, 'failed': 0,
+            'bytes_uploaded': 0, 'thumbnails': 0, 'seconds': 0.0,
+        }
+        self.errors = []
+
+    def run(self):
+        start = time.perf_counter()
+        entries = self.source.entries()
+        done = read_manifest(self.manifest_path)
+        pending = [entry for entry in entries if entry not in done]
+        self.stats['skipped'] = len(entries) - len(pending)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-import') as pool, \
+                open(self.manifest_path, 'a', encoding='utf-8') as manifest:
+            for offset in range(0, len(pending), self.batch_size):
+                self._import_batch(pool, pending[offset:offset + self.batch_size], manifest)
+                self.stats['seconds'] = time.perf_counter() - start
+                if self.progress:
+                    self.progress(self.stats)
+
+        self.stats['seconds'] = time.perf_counter() - start
+        logger.info(f"[IMPORT] Imported {self.source.path}: {self.stats}")
+        return self.stats
+
+    def _inspect(self, entry):
+        """Hash and validate one entry; returns ``(entry, sha256, size, content_type)``."""
+        digest = hashlib.sha256()
+        size = 0
+        with self.source.open(entry) as source:
+            header = source.read(MAGIC_LENGTH)
+            content_type = sniff_content_type(header)
+            if content_type is None:
+                raise InvalidImageUpload('Tipo de archivo no permitido. Use JPG, PNG, GIF o WebP.')
+            data = header
+            while data:
+                size += len(data)
+                if size > self.max_size:
+                    raise InvalidImageUpload(
+                        f"El archivo es demasiado grande. Máximo {self.max_size // (1024 * 1024)}MB."
+                    )
+                digest.update(data)
+                data = source.read(READ_SIZE)
+        return entry, digest.hexdigest(), size, content_type
+
+    def _store(self, entry, name, content_type):
+        with self.source.open(entry) as source:
+            return store_stream(source, name, content_type, self.storage)
+
+    def _run(self, pool, function, items):
+        """Run ``function(*item)`` in the pool; returns ``[(item, result)]`` and records failures."""
+        futures = [(item, pool.submit(function, *item)) for item in items]
+        results = []
+        for item, future in futures:
+            try:
+                results.append((item, future.result()))
+            except Exception as e:
+                self.stats['failed'] += 1
+                self.errors.append((item[0], str(e)))
+                logger.warning(f"[IMPORT] Skipped {item[0]}: {str(e)}")
+        return results
+
+    def _import_batch(self, pool, entries, manifest):
+        inspected = [result for _, result in self._run(pool, self._inspect, [(entry,) for entry in entries])]
+        if not inspected:
+            return
+
+        shas = {sha for _, sha, _, _ in inspected}
+        blobs = {blob.sha256: blob for blob in ImageBlob.objects.filter(sha256__in=shas)}
+        new = {}
+        for entry, sha, size, content_type in inspected:
+            if sha not in blobs and sha not in new:
+                new[sha] = (entry, ImageBlob.build_name(sha, content_type), size, content_type)
+
+        stored = self._run(pool, self._store, [(entry, name, ct) for entry, name, _, ct in new.values()])
+        stored_names = {name for _, name in stored}
+        stored_shas = {sha for sha, (_, name, _, _) in new.items() if name in stored_names}
+        self.stats['bytes_uploaded'] += sum(new[sha][2] for sha in stored_shas)
+
+        with transaction.atomic():
+            ImageBlob.objects.bulk_create(
+                [
+                    ImageBlob(sha256=sha, name=name, size=size, content_type=content_type)
+                    for sha, (_, name, size, content_type) in new.items() if sha in stored_shas
+                ],
+                ignore_conflicts=True,
+            )
+            blobs.update({blob.sha256: blob for blob in ImageBlob.objects.filter(sha256__in=stored_shas)})
+
+            rows = [(entry, blobs[sha]) for entry, sha, _, _ in inspected if sha in blobs]
+            # The manifest and the thumbnails need the new pks, also on MySQL
+            uploads = bulk_create_with_pks(ImageUpload, [
+                ImageUpload(title=ImageUpload.title_from_filename(entry), image=blob.name, blob=blob)
+                for entry, blob in rows
+            ], key=('blob_id', 'title'))
+
+            references = Counter(blob.pk for _, blob in rows)
+            by_count = defaultdict(list)
+            for blob_id, count in references.items():
+                by_count[count].append(blob_id)
+            for count, blob_ids in by_count.items():
+                ImageBlob.objects.filter(pk__in=blob_ids).update(ref_count=F('ref_count') + count)
+
+        # bulk_create sends no signals
+        invalidate_image_stats()
+        for entry, upload in zip((entry for entry, _ in rows), uploads):
+            manifest.write(json.dumps({'entry': entry, 'upload': upload.pk, 'image': upload.image.name}) + '\n')
+        manifest.flush()
+        self.stats['imported'] += len(uploads)
+        self.stats['duplicates'] += len(uploads) - len(stored_shas)
+
+        if self.derivatives:
+            self._generate_derivatives(pool, rows, uploads, stored_shas)
+
+    def _generate_derivatives(self, pool, rows, uploads, stored_shas):
+        upload_ids = defaultdict(list)
+        blobs = {}
+        for (_, blob), upload in zip(rows, uploads):
+            upload_ids[blob.name].append(upload.pk)
+            blobs[blob.name] = blob
+
+        results = {}
+        missing = []
+        for name, blob in blobs.items():
+            shared = None if blob.sha256 in stored_shas else find_derivatives(name)
+            if shared:
+                results[name] = shared
+            else:
+                missing.append((name,))
+        for (name,), derivatives in self._run(pool, self._thumbnails, missing):
+            if derivatives is None:
+                continue
+            results[name] = derivatives
+            self.stats['thumbnails'] += sum(len(sizes) for key, sizes in derivatives.items() if key != 'source')
+
+        for name, derivatives in results.items():
+            ImageUpload.objects.filter(pk__in=upload_ids[name]).update(derivatives=derivatives)
+
+    def _thumbnails(self, name):
+        # A failed thumbnail does not fail the import; generate_image_derivatives retries it
+        try:
+            return generate_derivatives(name, self.storage)
+        except Exception as e:
+            logger.error(f"[IMPORT] Thumbnails failed for {name}: {str(e)}")
+            return None
@@ -0,0 +1,140 @@
+"""
+Queries behind the uploaded image gallery (``image_list``).
+
+- ``get_image_stats``: total and recent upload counts from one conditional
+  aggregate, cached until an upload is added or deleted.
+- ``search_images``: full-text search on title/description (MySQL FULLTEXT
+  index or PostgreSQL ``to_tsvector``), falling back to ``icontains`` on other
+  databases and for words too short for the MySQL index.
+- ``KeysetPage``: cursor pagination on ``(uploaded_at, id)``, so deep pages
+  cost the same as the first one and no ``COUNT(*)`` is needed.
+"""
+import base64
+import re
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ImageUpload
+
+STATS_KEY = 'image_upload_stats'
+# Bounds how stale the "last 7 days" count gets without uploads or deletes
+STATS_TIMEOUT = 5 * 60
+RECENT_DAYS = 7
+PAGE_SIZE = 12
+# Must match the expression indexed by migration 0005 for PostgreSQL to use it
+POSTGRES_DOCUMENT = "to_tsvector('simple', COALESCE(title, '') || ' ' || COALESCE(description, ''))"
+# InnoDB's innodb_ft_min_token_size default: shorter words are not indexed
+MYSQL_MIN_TOKEN = 3
+
+
+def get_image_stats():
+    """Return ``{'total': ..., 'recent': ...}`` for uploaded images."""
+    stats = cache.get(STATS_KEY)
+    if stats is None:
+        since = timezone.now() - timedelta(days=RECENT_DAYS)
+        stats = ImageUpload.objects.aggregate(
+            total=Count('id'),
+            recent=Count('id', filter=Q(uploaded_at__gte=since)),
+        )
+        cache.set(STATS_KEY, stats, STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_image_stats():
+    cache.delete(STATS_KEY)
+
+
+def search_images(queryset, query):
+    """
+    Filter ``queryset`` to uploads whose title or description match ``query``.
+
+    Every word must start a word in the document, so "anil" still finds
+    "anillo": ``+word*`` in MySQL's boolean mode, ``word:*`` prefixes in a
+    PostgreSQL tsquery. Only ``\w`` runs are kept, so no operator reaches
+    either parser. On MySQL, queries with a word shorter than
+    ``MYSQL_MIN_TOKEN`` are not in the index and use ``icontains``.
+    """
+    table = ImageUpload._meta.db_table
+    words = re.findall(r'\w+', query)
+    if connection.vendor == 'mysql' and words and min(map(len, words)) >= MYSQL_MIN_TOKEN:
+        condition = 'MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)'
+        query = ' '.join(f'+{word}*' for word in words)
+    elif connection.vendor == 'postgresql' and words:
+        condition = f"{POSTGRES_DOCUMENT} @@ to_tsquery('simple', %s)"
+        query = ' & '.join(f'{word}:*' for word in words)
+    else:
+        return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+    return queryset.filter(pk__in=RawSQL(f'SELECT id FROM {table} WHERE {condition}', (query,)))
+
+
+def _encode_cursor(image, direction):
+    value = f'{direction}|{image.uploaded_at.isoformat()}|{image.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Return ``(direction, uploaded_at, id)`` or None for a missing/invalid cursor."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, uploaded_at, pk = value.split('|')
+        uploaded_at = parse_datetime(uploaded_at)
+        if direction not in ('next', 'prev') or uploaded_at is None:
+            return None
+        return direction, uploaded_at, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """
+    One page of ``queryset`` ordered newest first, starting at ``cursor``.
+
+    Fetches ``page_size + 1`` rows to know whether there is another page;
+    ``next_cursor``/``previous_cursor`` are None at either end.
+    """
+
+    def __init__(self, queryset, cursor=None, page_size=PAGE_SIZE):
+        position = _decode_cursor(cursor) if cursor else None
+        direction = position[0] if position else 'next'
+
+        if position is None:
+            rows = list(queryset.order_by('-uploaded_at', '-id')[:page_size + 1])
+        elif direction == 'next':
+            _, uploaded_at, pk = position
+            rows = list(
+                queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
+                .order_by('-uploaded_at', '-id')[:page_size + 1]
+            )
+        else:
+            _, uploaded_at, pk = position
+            rows = list(
+                queryset.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=pk))
+                .order_by('uploaded_at', 'id')[:page_size + 1]
+            )
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'prev':
+            rows.reverse()
+        self.object_list = rows
+
+        if direction == 'next':
+            self.has_next, self.has_previous = has_more, position is not None
+        else:
+            self.has_next, self.has_previous = True, has_more
+        self.next_cursor = _encode_cursor(rows[-1], 'next') if rows and self.has_next else None
+        self.previous_cursor = _encode_cursor(rows[0], 'prev') if rows and self.has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
@@ -0,0 +1,138 @@
+"""
+Image URL resolution for products and uploads.
+
+``Product.image`` stores either an absolute URL (Cloudinary, S3) or a path,
+and ``ImageUpload.image`` stores a path relative to the default storage. All
+image URLs shown by templates, the admin and the API go through
+``resolve_image_url`` so that storage lookups happen once per process rather
+than once per row.
+"""
+from functools import lru_cache
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import iri_to_uri
+
+PLACEHOLDER_IMAGE = 'images/placeholder-product.jpg'
+
+
+@lru_cache(maxsize=None)
+def get_media_base_url():
+    """
+    Return the base URL of the default storage, ending with a slash.
+
+    S3 storages with a custom domain serve unsigned URLs, so the base can be
+    derived from the storage settings instead of calling ``url()`` per file.
+    """
+    storage = default_storage
+    custom_domain = getattr(storage, 'custom_domain', None)
+    if custom_domain:
+        protocol = getattr(storage, 'url_protocol', 'https:')
+        location = getattr(storage, 'location', '').strip('/')
+        base_url = f'{protocol}//{custom_domain}/' + (f'{location}/' if location else '')
+    else:
+        base_url = getattr(storage, 'base_url', None) or settings.MEDIA_URL
+    return base_url if base_url.endswith('/') else base_url + '/'
+
+
+@lru_cache(maxsize=None)
+def get_placeholder_url():
+    """Return the URL of the product placeholder image."""
+    return urljoin(settings.STATIC_URL, PLACEHOLDER_IMAGE)
+
+
+@receiver(setting_changed)
+def _clear_url_caches(setting, **kwargs):
+    if setting in ('MEDIA_URL', 'STATIC_URL', 'STORAGES'):
+        get_media_base_url.cache_clear()
+        get_placeholder_url.cache_clear()
+
+
+def is_absolute_url(value):
+    return value.startswith(('http://', 'https://', '//'))
+
+
+def resolve_image_url(value, request=None, placeholder=True):
+    """
+    Return the URL for a stored image reference.
+
+    ``value`` may be an absolute URL (returned as is), a root-relative path
+    such as ``/media/...`` or ``/static/...`` (kept), or a storage path
+    (prefixed with the media base URL). Empty values give the placeholder, or
+    None when ``placeholder`` is false. With a ``request`` the result is made
+    absolute.
+    """
+    return get_image_url_builder(request, placeholder)(value)
+
+
+def get_image_url_builder(request=None, placeholder=True):
+    """
+    Return a ``resolve_image_url`` equivalent bound to one request.
+
+    The media base and the request's scheme/host are computed once, which
+    makes it suitable for serializing many rows.
+    """
+    media_base = get_media_base_url()
+    empty = get_placeholder_url() if placeholder else None
+    host = request.build_absolute_uri('/')[:-1] if request is not None else ''
+    if not is_absolute_url(media_base):
+        media_base = host + media_base
+    if empty is not None and not is_absolute_url(empty):
+        empty = host + empty
+
+    def build(value):
+        if not value:
+            return empty
+        if is_absolute_url(value):
+            return iri_to_uri(value)
+        if value.startswith('/'):
+            return iri_to_uri(host + value)
+        return iri_to_uri(media_base + value)
+
+    return build
+
+
+def get_storage_name(value):
+    """
+    Return the default-storage name an image reference points to.
+
+    Returns None for empty values and for URLs served from elsewhere
+    (Cloudinary, static files), whose files we cannot process.
+    """
+    if not value:
+        return None
+    media_base = get_media_base_url()
+    if value.startswith(media_base):
+        return value[len(media_base):]
+    if is_absolute_url(value) or value.startswith('/'):
+        return None
+    return value
+
+
+def get_srcsets(derivatives, build=None):
+    """
+    Return ``{format: srcset}`` for a derivatives mapping (see ``derivatives``).
+
+    ``build`` is an optional ``get_image_url_builder`` result, to reuse one
+    across many rows.
+    """
+    build = build or get_image_url_builder(placeholder=False)
+    return {
+        image_format: ', '.join(
+            f'{build(name)} {width}w' for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+        )
+        for image_format, sizes in (derivatives or {}).items()
+        if image_format != 'source' and sizes
+    }
+
+
+def get_thumbnail_url(derivatives, image_format='jpeg', build=None):
+    """Return the URL of the smallest derivative in ``image_format``, or None."""
+    sizes = (derivatives or {}).get(image_format)
+    if not sizes:
+        return None
+    build = build or get_image_url_builder(placeholder=False)
+    return build(sizes[min(sizes, key=int)])
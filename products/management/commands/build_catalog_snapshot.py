@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ...snapshot import rebuild_snapshot
+import time
+
+
+class Command(BaseCommand):
+    help = 'Build the materialized catalog snapshot (cache and CATALOG_SNAPSHOT_DIR)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Building catalog snapshot...')
+        start = time.perf_counter()
+        entries = rebuild_snapshot()
+        duration = time.perf_counter() - start
+
+        total_bytes = sum(len(entry['body']) for entry in entries.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Catalog snapshot built: {len(entries)} entries, '
+                f'{total_bytes / 1024:.1f} KB in {duration:.2f}s'
+            )
+        )
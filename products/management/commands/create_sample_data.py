@@ -2,11 +2,23 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from ...models import Category, Product
+from ...sample_data import BATCH_SIZE, CUSTOMER_PASSWORD, SampleDataGenerator
 
 
 class Command(BaseCommand):
     help = 'Create sample data for the jewelry catalog'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0, help='Synthetic products to add')
+        parser.add_argument('--users', type=int, default=None,
+                            help='Synthetic customers to add (default: one per 20 orders)')
+        parser.add_argument('--orders', type=int, default=0, help='Synthetic orders to add')
+        parser.add_argument('--carts', type=int, default=None,
+                            help='Customers to give an open cart (default: one in ten)')
+        parser.add_argument('--days', type=int, default=365, help='Days of order history')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
     def handle(self, *args, **options):
         self.stdout.write('Creating sample data for Jewelry Catalog...')
         self.stdout.write('=' * 50)
@@ -24,6 +36,8 @@ class Command(BaseCommand):
             self.stdout.write('\nCreating users...')
             self.create_users()
 
+            stats = self.generate(options)
+
             self.stdout.write('\n' + '=' * 50)
             self.stdout.write(
                 self.style.SUCCESS('Sample data created successfully!')
@@ -32,6 +46,11 @@ class Command(BaseCommand):
             self.stdout.write(f'   - Categories: {len(categories)}')
             self.stdout.write(f'   - Products: {len(products)}')
             self.stdout.write(f'   - Users: 2 (admin, testuser)')
+            if stats:
+                self.stdout.write(
+                    f"   - Synthetic: {stats['products']} products, {stats['users']} customers, "
+                    f"{stats['orders']} orders, {stats.get('carts', 0)} carts in {stats['seconds']}s"
+                )
 
         except Exception as e:
             self.stdout.write(
@@ -195,4 +214,29 @@ class Command(BaseCommand):
             test_user.save()
             self.stdout.write('[OK] Test user created: testuser / testpass123')
         else:
-            self.stdout.write('[OK] Test user exists')
\ No newline at end of file
+            self.stdout.write('[OK] Test user exists')
+
+    def generate(self, options):
+        """Add the synthetic products, customers, orders and carts requested on the command line."""
+        users = options['users']
+        if users is None:
+            users = max(1, options['orders'] // 20) if options['orders'] else 0
+        carts = options['carts']
+        if carts is None:
+            carts = users // 10
+        if not (options['products'] or users or options['orders'] or carts):
+            return None
+
+        self.stdout.write('\nGenerating synthetic data...')
+
+        def progress(label, done, total):
+            self.stdout.write(f'   {label}: {done}/{total}')
+
+        generator = SampleDataGenerator(
+            products=options['products'], users=users, orders=options['orders'], carts=carts,
+            days=options['days'], seed=options['seed'], batch_size=options['batch_size'], progress=progress,
+        )
+        stats = generator.run()
+        if users:
+            self.stdout.write(f'[OK] Customers: cliente1..cliente{users} / {CUSTOMER_PASSWORD}')
+        return stats
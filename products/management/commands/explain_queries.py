@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from ...query_plans import explain, find_sequential_scans, get_view_queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the listing queries of the views and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help='Exit with an error if any query scans a whole table (for CI)',
+        )
+
+    def handle(self, *args, **options):
+        flagged = []
+        for name, queryset in get_view_queries():
+            plan = explain(queryset)
+            scans = find_sequential_scans(plan)
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"{name}: full scan of {', '.join(scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: uses indexes'))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if not flagged:
+            return
+        note = (
+            f'{len(flagged)} queries scan whole tables on {connection.vendor}. '
+            'Planners prefer scans on small tables; check against production-sized data.'
+        )
+        if options['fail_on_scan']:
+            raise CommandError(note)
+        self.stdout.write(self.style.WARNING(note))
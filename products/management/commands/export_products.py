@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from ...exports import DEFAULT_CHUNK_SIZE, FORMATS, ProductExporter
+from ...models import Product
+import time
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog to a CSV, JSONL or compact JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=sorted(FORMATS),
+            default='csv',
+            help='Export format',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write; "-" writes to standard output',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows fetched and written per chunk',
+        )
+        parser.add_argument(
+            '--available-only',
+            action='store_true',
+            help='Export only available products',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['available_only']:
+            queryset = queryset.filter(available=True)
+        exporter = ProductExporter(queryset, options['format'], options['chunk_size'])
+
+        start = time.perf_counter()
+        if options['output'] == '-':
+            for chunk in exporter:
+                self.stdout.write(chunk, ending='')
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in exporter:
+                    output.write(chunk)
+            report = self.stdout
+        duration = time.perf_counter() - start
+
+        rate = exporter.rows / duration if duration else 0
+        report.write(
+            self.style.SUCCESS(f"Exported {exporter.rows} products in {duration:.2f}s ({rate:.0f} rows/s)")
+        )
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from ...blobs import collect_garbage
+from ...uploads import delete_expired_upload_sessions
+import time
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced content-addressed image blobs, stray blob files and expired upload sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Keep blobs released (or files written) less than this many hours ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows and storage keys processed per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting it',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = collect_garbage(
+            grace=timedelta(hours=options['grace_hours']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        sessions = 0 if options['dry_run'] else delete_expired_upload_sessions()
+        duration = time.perf_counter() - start
+
+        prefix = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {stats['blobs_deleted']} unreferenced blobs and {stats['orphans_deleted']} stray files "
+                f"({stats['files_scanned']} files scanned) in {duration:.2f}s"
+                + (f"; deleted {sessions} expired upload sessions" if sessions else '')
+            )
+        )
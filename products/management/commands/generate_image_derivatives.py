@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from ...derivatives import get_source_name, process_derivatives
+from ...models import ImageUpload, Product
+import time
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails for uploaded and product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate thumbnails that already exist',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        generated = skipped = failed = 0
+
+        for model in (ImageUpload, Product):
+            for instance in model.objects.only('pk', 'image', 'derivatives').iterator():
+                source = get_source_name(instance)
+                if source is None or (not options['force'] and instance.derivatives.get('source') == source):
+                    skipped += 1
+                    continue
+                if process_derivatives(model, instance.pk):
+                    generated += 1
+                else:
+                    failed += 1
+
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Thumbnails generated for {generated} images ({skipped} skipped, {failed} failed) in {duration:.2f}s'
+            )
+        )
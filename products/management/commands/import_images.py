@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...image_import import ImageImporter, ImageSource
+
+
+class Command(BaseCommand):
+    help = 'Import a directory or zip archive of images as image uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or .zip archive with the images')
+        parser.add_argument(
+            '--manifest',
+            help='Progress manifest used to resume (default: <source>.import-manifest.jsonl)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent reads, uploads and thumbnail jobs',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Images validated and committed together',
+        )
+        parser.add_argument(
+            '--no-derivatives',
+            action='store_true',
+            help='Skip thumbnail generation (run generate_image_derivatives later)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = ImageSource(options['source'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        importer = ImageImporter(
+            source,
+            manifest_path=options['manifest'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            derivatives=not options['no_derivatives'],
+            progress=self.report_progress if options['verbosity'] > 1 else None,
+        )
+        stats = importer.run()
+
+        for entry, error in importer.errors:
+            self.stdout.write(self.style.WARNING(f'{entry}: {error}'))
+
+        seconds = stats['seconds'] or 1e-9
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats['imported']} images ({stats['duplicates']} duplicates, "
+                f"{stats['skipped']} already imported, {stats['failed']} failed) in {stats['seconds']:.2f}s: "
+                f"{stats['imported'] / seconds:.1f} images/s, "
+                f"{stats['bytes_uploaded'] / (1024 * 1024) / seconds:.2f} MB/s uploaded"
+            )
+        )
+        self.stdout.write(f'Manifest: {importer.manifest_path}')
+
+    def report_progress(self, stats):
+        self.stdout.write(
+            f"  {stats['imported']} imported, {stats['failed']} failed, {stats['seconds']:.1f}s"
+        )
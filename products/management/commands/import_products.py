@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from ...catalog_import import FORMATS, ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Create or update products in bulk from a CSV or JSONL file (upsert by slug)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='CSV or JSONL file with one product per row')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows validated and written together',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file and report what would change without writing',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['source'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        if not os.path.isfile(options['source']):
+            raise CommandError(f"{options['source']} is not a file")
+
+        with open(options['source'], encoding='utf-8-sig', newline='') as source:
+            importer = ProductImporter(
+                source,
+                fmt=fmt,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                progress=self.report_progress if options['verbosity'] > 1 else None,
+            )
+            stats = importer.run()
+
+        for line_number, error in importer.errors:
+            self.stdout.write(self.style.WARNING(f'Line {line_number}: {error}'))
+
+        seconds = stats['seconds'] or 1e-9
+        prefix = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {stats['rows'] - stats['failed']} products ({stats['created']} new, "
+                f"{stats['updated']} updated, {stats['failed']} failed) in {stats['seconds']:.2f}s: "
+                f"{stats['rows'] / seconds:.0f} rows/s"
+            )
+        )
+
+    def report_progress(self, stats):
+        self.stdout.write(
+            f"  {stats['rows']} rows, {stats['failed']} failed, {stats['seconds']:.1f}s"
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from ...storage_probe import get_probe_interval, run_probe
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measure media storage latency (list/put/head/get/delete) and cache the result'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep probing every --interval seconds (for a worker process)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            help='Seconds between probes with --loop (default: STORAGE_PROBE_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_probe_interval()
+        while True:
+            self.probe()
+            if not options['loop']:
+                return
+            time.sleep(interval)
+
+    def probe(self):
+        result = run_probe()
+        latencies = ', '.join(
+            f"{operation} {value['ms']:.0f}ms" + ('' if value['ok'] else ' (failed)')
+            for operation, value in result['operations'].items()
+        )
+        style = self.style.SUCCESS if result['status'] == 'healthy' else self.style.WARNING
+        self.stdout.write(style(f"Storage {result['status']} ({result['storage_type']}): {latencies}"))
+        return result
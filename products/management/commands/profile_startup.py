@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from jewelry_catalog.startup import PHASES, package_totals, profile_startup, walk
+from jewelry_catalog.warmup import get_local_host
+import json
+
+
+class Command(BaseCommand):
+    help = 'Profile worker startup: import tree, time to first response and RSS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Path of the first request (default: /)')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters to boot; timings are medians')
+        parser.add_argument('--top', type=int, default=15, help='Slowest imports and packages to list')
+        parser.add_argument('--depth', type=int, default=2, help='Levels of each slow import to expand')
+        parser.add_argument(
+            '--min-ms', type=float, default=5, help='Hide nested imports faster than this (default: 5)',
+        )
+        parser.add_argument('--json', help='Also write the full profile to this file')
+
+    def handle(self, *args, **options):
+        profile = profile_startup(options['path'], get_local_host(), options['runs'])
+
+        self.stdout.write(f"{profile['runs']} runs, GET {profile['path']} -> {profile['status']}")
+        for phase in PHASES:
+            values = profile['phases'][phase]
+            self.stdout.write(f"  {phase:<16} {values['ms']:8.1f} ms  RSS {values['rss_kb'] / 1024:6.1f} MB")
+        self.stdout.write(self.style.SUCCESS(f"Time to first response: {profile['time_to_first_response_ms']:.0f} ms"))
+
+        imports = profile['imports']
+        self.stdout.write('\nImport time by phase (last run):')
+        for phase in PHASES:
+            roots = [node for node in imports if node['phase'] == phase]
+            total = sum(node['cumulative_ms'] for node in roots)
+            self.stdout.write(f"  {phase:<16} {total:8.1f} ms  {sum(1 for _ in walk(roots)):5d} modules")
+
+        self.stdout.write(f"\nSlowest imports (cumulative ms, nested >= {options['min_ms']:g} ms):")
+        for root in sorted(imports, key=lambda node: node['cumulative_ms'], reverse=True)[:options['top']]:
+            for depth, node in walk([root]):
+                if depth > options['depth'] or (depth and node['cumulative_ms'] < options['min_ms']):
+                    continue
+                self.stdout.write(
+                    f"  {node['cumulative_ms']:8.1f}  {'  ' * depth}{node['name']}"
+                    + ('' if depth else f"  [{node['phase']}]")
+                )
+
+        self.stdout.write('\nSelf time by package:')
+        for package, total in package_totals(imports)[:options['top']]:
+            self.stdout.write(f"  {total:8.1f}  {package}")
+
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(profile, output, indent=2)
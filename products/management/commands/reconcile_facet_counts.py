@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from ...facets import reconcile
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized facet counts from the products table and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the drift without fixing it',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        drift = reconcile(dry_run=options['dry_run'])
+        duration = time.perf_counter() - start
+
+        for (facet, value), (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"{facet}={value or '*'}: {stored} -> {actual}")
+
+        prefix = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {len(drift)} drifted counters in {duration:.2f}s"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from jewelry_catalog.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Warm up this process (URLs, templates, database, caches, serializers) and time each step'
+
+    def handle(self, *args, **options):
+        state = warm_up()
+        for name, result in state['steps'].items():
+            if result['ok']:
+                self.stdout.write(f"  {name:<12} {result['ms']:8.1f} ms  {result['detail']}")
+            else:
+                self.stdout.write(self.style.ERROR(f"  {name:<12} {result['ms']:8.1f} ms  {result['error']}"))
+        if not state['ready']:
+            raise CommandError('Warm-up failed: the workers would not report ready')
+        self.stdout.write(self.style.SUCCESS(f"Warm-up done in {state['seconds']:.2f}s"))
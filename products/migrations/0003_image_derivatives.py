@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_imageupload_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Generated thumbnails, see products.derivatives'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Generated thumbnails, see products.derivatives'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.TextField(blank=True, help_text='Cloudinary URL or image path', null=True),
+        ),
+    ]
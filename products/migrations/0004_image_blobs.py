@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(help_text='Storage name of the file', max_length=255, unique=True)),
+                ('size', models.PositiveIntegerField()),
+                ('content_type', models.CharField(max_length=50)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image Blob',
+                'verbose_name_plural': 'Image Blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='uploads', to='products.imageblob'),
+        ),
+    ]
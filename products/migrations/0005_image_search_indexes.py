@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+# Full-text indexes for products.image_queries.search_images; other databases
+# search with icontains and need no index.
+SEARCH_INDEX = 'imageupload_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            f'CREATE FULLTEXT INDEX {SEARCH_INDEX} ON products_imageupload (title, description)'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_INDEX} ON products_imageupload USING GIN '
+            "(to_tsvector('simple', COALESCE(title, '') || ' ' || COALESCE(description, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX {SEARCH_INDEX} ON products_imageupload')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='imageupload_uploaded_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
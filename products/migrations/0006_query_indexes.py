@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+# MySQL has no partial indexes (Django skips the ones below there), so it gets
+# composite indexes led by `available` instead.
+MYSQL_INDEXES = {
+    'product_avail_recent_my_idx': '(available, created_at)',
+    'product_avail_cat_my_idx': '(available, category_id, created_at)',
+    'product_avail_type_my_idx': '(available, jewelry_type, created_at)',
+    'product_avail_mat_my_idx': '(available, material, created_at)',
+}
+
+
+def create_mysql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for name, columns in MYSQL_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {name} ON products_product {columns}')
+
+
+def drop_mysql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for name in MYSQL_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name} ON products_product')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_image_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['-created_at'], name='product_available_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', '-created_at'], name='product_available_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['jewelry_type', '-created_at'], name='product_available_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['material', '-created_at'], name='product_available_mat_idx'),
+        ),
+        migrations.RunPython(create_mysql_indexes, drop_mysql_indexes),
+    ]
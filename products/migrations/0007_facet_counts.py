@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:37
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_facet_counts(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    FacetCount = apps.get_model('products', 'FacetCount')
+    counts = Counter()
+    groups = (
+        Product.objects.filter(available=True)
+        .values('category_id', 'jewelry_type', 'material').annotate(n=Count('pk')).order_by()
+    )
+    for group in groups:
+        counts[('all', '')] += group['n']
+        counts[('jewelry_type', group['jewelry_type'])] += group['n']
+        counts[('material', group['material'])] += group['n']
+        if group['category_id'] is not None:
+            counts[('category', str(group['category_id']))] += group['n']
+    FacetCount.objects.bulk_create(
+        FacetCount(facet=facet, value=value, count=count) for (facet, value), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value')],
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_facet_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField()),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('chunks', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+            },
+        ),
+    ]
@@ -1,8 +1,11 @@
 # products/models.py
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils.text import slugify
+from .image_urls import get_srcsets, get_thumbnail_url, resolve_image_url
 import logging
+import os
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -85,9 +88,36 @@ class Product(models.Model):
         null=True,
         help_text='Cloudinary URL or image path'
     )
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Generated thumbnails, see products.derivatives'
+    )
 
     class Meta:
         ordering = ['-created_at']
+        # Listings only show available products, newest first. PostgreSQL and
+        # SQLite get these partial indexes. MySQL has none (Django skips them,
+        # models.W037 is silenced in settings): migration 0006 creates
+        # (available, <column>, created_at) composite indexes there instead.
+        indexes = [
+            models.Index(
+                fields=['-created_at'], condition=models.Q(available=True), name='product_available_recent_idx'
+            ),
+            models.Index(
+                fields=['category', '-created_at'], condition=models.Q(available=True),
+                name='product_available_cat_idx'
+            ),
+            models.Index(
+                fields=['jewelry_type', '-created_at'], condition=models.Q(available=True),
+                name='product_available_type_idx'
+            ),
+            models.Index(
+                fields=['material', '-created_at'], condition=models.Q(available=True),
+                name='product_available_mat_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -107,9 +137,17 @@ class Product(models.Model):
     @property
     def get_image_url(self):
         """Return image URL for display - supports Cloudinary URLs or local paths."""
-        if not self.image:
-            return '/static/images/placeholder-product.jpg'
-        return self.image
+        return resolve_image_url(self.image)
+
+    @property
+    def thumbnail_url(self):
+        """Return the smallest generated thumbnail, falling back to the original."""
+        return get_thumbnail_url(self.derivatives) or self.get_image_url
+
+    @property
+    def srcsets(self):
+        """Return ``{format: srcset}`` for the generated thumbnails."""
+        return get_srcsets(self.derivatives)
 
     @property
     def is_new(self):
@@ -118,6 +156,63 @@ class Product(models.Model):
         return (timezone.now() - self.created_at).days <= 7
 
 
+class FacetCount(models.Model):
+    """
+    Denormalized count of available products per facet value.
+
+    ``facet`` is ``category`` (value: category id), ``jewelry_type``,
+    ``material`` or ``all`` (value: empty). Maintained by products.signals and
+    products.facets; ``reconcile_facet_counts`` repairs drift.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class ImageBlob(models.Model):
+    """
+    Content-addressed image file, shared by every upload with the same bytes.
+
+    Files live at ``blobs/<sha[:2]>/<sha[2:4]>/<sha>.<ext>``. ``ref_count``
+    counts the ImageUpload rows using the blob; unreferenced blobs are removed
+    by the ``gc_image_blobs`` management command.
+    """
+    PREFIX = 'blobs/'
+    EXTENSIONS = {
+        'image/jpeg': 'jpg',
+        'image/png': 'png',
+        'image/gif': 'gif',
+        'image/webp': 'webp',
+    }
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True, help_text='Storage name of the file')
+    size = models.PositiveIntegerField()
+    content_type = models.CharField(max_length=50)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Image Blob"
+        verbose_name_plural = "Image Blobs"
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def build_name(cls, sha256, content_type):
+        return f"{cls.PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}.{cls.EXTENSIONS.get(content_type, 'bin')}"
+
+
 class ImageUpload(models.Model):
     """Simple model for image uploads."""
     title = models.CharField(max_length=200, blank=True, help_text='Optional title for the image')
@@ -127,20 +222,83 @@ class ImageUpload(models.Model):
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, help_text='Optional description')
+    blob = models.ForeignKey(
+        ImageBlob,
+        related_name='uploads',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Generated thumbnails, see products.derivatives'
+    )
 
     class Meta:
         verbose_name = "Image Upload"
         verbose_name_plural = "Image Uploads"
         ordering = ['-uploaded_at']
+        indexes = [
+            # Gallery keyset pagination, see products.image_queries
+            models.Index(fields=['-uploaded_at', '-id'], name='imageupload_uploaded_idx'),
+        ]
 
     def __str__(self):
         return self.title or f"Image {self.id}"
 
+    @staticmethod
+    def title_from_filename(name):
+        """Build a title from a file name, without directories or extension."""
+        basename = os.path.basename(name)
+        filename = basename.rsplit('.', 1)[0] if '.' in basename else basename
+        return filename.replace('_', ' ').title()
+
+    @property
+    def get_image_url(self):
+        """Return the image URL without a storage lookup."""
+        return resolve_image_url(self.image.name)
+
+    @property
+    def thumbnail_url(self):
+        """Return the smallest generated thumbnail, falling back to the original."""
+        return get_thumbnail_url(self.derivatives) or self.get_image_url
+
+    @property
+    def srcsets(self):
+        """Return ``{format: srcset}`` for the generated thumbnails."""
+        return get_srcsets(self.derivatives)
+
     def save(self, *args, **kwargs):
         """Auto-generate title if not provided."""
         if not self.title and hasattr(self.image, 'name'):
-            # Extract filename without extension
-            filename = self.image.name.rsplit('.', 1)[0] if '.' in self.image.name else self.image.name
-            self.title = filename.replace('_', ' ').title()
+            self.title = self.title_from_filename(self.image.name)
         super().save(*args, **kwargs)
-        logger.info(f"Image uploaded: {self.title}")
\ No newline at end of file
+        logger.info(f"Image uploaded: {self.title}")
+
+
+class UploadSession(models.Model):
+    """
+    Resumable chunked image upload (see products.uploads).
+
+    Kept in the database, and the chunks in the default storage, so any
+    worker can take the next chunk. ``chunks`` lists the storage names of
+    the chunks received so far, in order; ``offset`` is their total size.
+    """
+    id = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='upload_sessions', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    chunks = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,187 @@
+"""
+Direct-to-storage (presigned) image uploads.
+
+The browser asks for an upload ticket, PUTs the file straight to the storage
+and then calls the completion endpoint, so no gunicorn worker is tied up
+while the bytes travel. With S3 the target is a presigned ``put_object`` URL;
+with local storage ``LocalUploadSigner`` stands in for S3 with a signed,
+expiring URL on this site that streams the body to disk.
+
+Tickets are signed with ``django.core.signing`` and carry the storage key,
+so completion never trusts a client-supplied path. A ticket is single use:
+once an image or a product points at its key, completing it again fails.
+Issuing and completing uploads is limited to staff.
+"""
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from .models import ImageUpload, Product
+from .uploads import (
+    MAGIC_LENGTH, ImageStreamWriter, InvalidImageUpload, get_max_upload_size,
+    sniff_content_type
+)
+import logging
+
+logger = logging.getLogger('image_upload')
+
+TICKET_SALT = 'products.presigned.ticket'
+TOKEN_SALT = 'products.presigned.token'
+DIRECT_UPLOAD_PREFIX = 'uploads/direct/'
+ALLOWED_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+TARGETS = ('upload', 'product')
+
+
+def get_upload_expiry():
+    return getattr(settings, 'PRESIGNED_UPLOAD_EXPIRY', 15 * 60)
+
+
+class S3UploadSigner:
+    """Presigned ``put_object`` URLs for S3-compatible storages."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.client = storage.connection.meta.client
+
+    def _key(self, name):
+        from storages.utils import clean_name
+
+        return self.storage._normalize_name(clean_name(name))
+
+    def upload_target(self, name, content_type, request):
+        params = dict(self.storage.get_object_parameters(name))
+        params.update(Bucket=self.storage.bucket_name, Key=self._key(name), ContentType=content_type)
+        url = self.client.generate_presigned_url(
+            'put_object', Params=params, ExpiresIn=get_upload_expiry(), HttpMethod='PUT'
+        )
+        headers = {'Content-Type': content_type}
+        if 'CacheControl' in params:
+            headers['Cache-Control'] = params['CacheControl']
+        return {'method': 'PUT', 'url': url, 'headers': headers}
+
+    def inspect(self, name):
+        """Return ``(size, first bytes)`` of an uploaded object, or None if it is missing."""
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(
+                Bucket=self.storage.bucket_name, Key=self._key(name), Range=f'bytes=0-{MAGIC_LENGTH - 1}'
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'InvalidRange'):
+                return None
+            raise
+        size = int(response['ContentRange'].rsplit('/', 1)[1])
+        return size, response['Body'].read()
+
+
+class LocalUploadSigner:
+    """Local stand-in for presigned URLs, backed by ``LocalUploadSigner.receive``."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def upload_target(self, name, content_type, request):
+        token = signing.dumps({'name': name, 'content_type': content_type}, salt=TOKEN_SALT)
+        url = request.build_absolute_uri(
+            reverse('products_api:api_presigned_upload_put', kwargs={'token': token})
+        )
+        return {'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type}}
+
+    def receive(self, token, stream, length):
+        """Stream a PUT body to the key signed into ``token``; returns the StoredImageUpload."""
+        try:
+            payload = signing.loads(token, salt=TOKEN_SALT, max_age=get_upload_expiry())
+        except signing.BadSignature:
+            raise InvalidImageUpload('El enlace de subida no es válido o ha expirado.')
+        if self.storage.exists(payload['name']):
+            raise InvalidImageUpload('El enlace de subida ya fue utilizado.')
+
+        writer = ImageStreamWriter(payload['name'], storage=self.storage, name=payload['name'])
+        try:
+            remaining = length
+            while remaining:
+                data = stream.read(min(64 * 1024, remaining))
+                if not data:
+                    break
+                writer.write(data)
+                remaining -= len(data)
+            return writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+    def inspect(self, name):
+        if not self.storage.exists(name):
+            return None
+        with self.storage.open(name, 'rb') as uploaded:
+            return self.storage.size(name), uploaded.read(MAGIC_LENGTH)
+
+
+def get_upload_signer(storage=default_storage):
+    """Return the signer for ``storage``: S3 when it is an S3 storage, else the local stand-in."""
+    if hasattr(storage, 'bucket_name') and hasattr(storage, 'connection'):
+        return S3UploadSigner(storage)
+    return LocalUploadSigner(storage)
+
+
+def issue_upload(request, filename, content_type, target='upload', product_id=None):
+    """
+    Reserve a storage key and return the upload target and completion ticket.
+
+    ``target`` says what completion registers: an ``ImageUpload`` or the image
+    of product ``product_id`` (with no id the key is only returned, for forms
+    that save the product themselves).
+    """
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise InvalidImageUpload('Tipo de archivo no permitido. Use JPG, PNG, GIF o WebP.')
+    if target not in TARGETS:
+        raise InvalidImageUpload('Destino de subida no válido.')
+
+    valid_name = default_storage.get_valid_name(os.path.basename(filename)) or 'image'
+    name = f"{DIRECT_UPLOAD_PREFIX}{timezone.now():%Y/%m/%d}/{uuid.uuid4().hex}-{valid_name}"
+    ticket = signing.dumps({
+        'name': name,
+        'filename': filename,
+        'user_id': request.user.pk,
+        'target': target,
+        'product_id': product_id,
+    }, salt=TICKET_SALT)
+
+    upload = get_upload_signer().upload_target(name, content_type, request)
+    logger.info(f"[PRESIGNED] Issued upload {name} ({content_type}) for user {request.user.pk}")
+    return {'upload': upload, 'ticket': ticket, 'expires_in': get_upload_expiry()}
+
+
+def verify_upload(user, ticket):
+    """
+    Check a completed direct upload and return its ticket payload plus ``size``/``content_type``.
+
+    Files that are missing, too large or not images are deleted and raise
+    ``InvalidImageUpload``.
+    """
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=2 * get_upload_expiry())
+    except signing.BadSignature:
+        raise InvalidImageUpload('El ticket de subida no es válido o ha expirado.')
+    if payload['user_id'] != user.pk:
+        raise InvalidImageUpload('El ticket de subida no es válido o ha expirado.')
+    # Replays would register the same file twice, and deleting either copy deletes it
+    name = payload['name']
+    if ImageUpload.objects.filter(image=name).exists() or Product.objects.filter(image=name).exists():
+        raise InvalidImageUpload('El ticket de subida ya fue utilizado.')
+
+    details = get_upload_signer().inspect(payload['name'])
+    if details is None:
+        raise InvalidImageUpload('No se encontró el archivo subido.')
+    size, header = details
+    content_type = sniff_content_type(header)
+    if content_type is None or size > get_max_upload_size():
+        default_storage.delete(payload['name'])
+        logger.warning(f"[PRESIGNED] Rejected direct upload {payload['name']} ({size} bytes)")
+        raise InvalidImageUpload('El archivo subido no es una imagen válida de hasta 5MB.')
+    return dict(payload, size=size, content_type=content_type)
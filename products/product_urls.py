@@ -0,0 +1,47 @@
+"""
+Product and category URLs without per-card ``reverse()``.
+
+The product grid links every card to its detail page, and ``{% url %}``
+resolves the pattern again for each one. The patterns only take the id and
+the slug, so each is reversed once per process and script prefix into a
+format string (``get_url_format``) that ``product_url`` and ``category_url``
+fill in. Slugs are URL-safe by their converter; the result is what
+``reverse()`` returns for the same arguments.
+"""
+from functools import lru_cache
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, reverse
+from django.utils.encoding import iri_to_uri
+
+# Arguments that cannot appear elsewhere in the reversed path
+_PLACEHOLDERS = {int: 987654321, str: 'slug-placeholder'}
+
+
+@lru_cache(maxsize=None)
+def get_url_format(viewname, arg_types, script_prefix):
+    """Reverse ``viewname`` once with placeholder arguments; returns a ``str.format`` pattern."""
+    placeholders = [_PLACEHOLDERS[arg_type] for arg_type in arg_types]
+    url = reverse(viewname, args=placeholders).replace('{', '{{').replace('}', '}}')
+    for index, placeholder in enumerate(placeholders):
+        url = url.replace(str(placeholder), f'{{{index}}}', 1)
+    return url
+
+
+def product_url(product_id, slug):
+    return get_url_format('products:product_detail', (int, str), get_script_prefix()).format(
+        int(product_id), iri_to_uri(slug),
+    )
+
+
+def category_url(slug):
+    return get_url_format('products:product_list_by_category', (str,), get_script_prefix()).format(
+        iri_to_uri(slug),
+    )
+
+
+@receiver(setting_changed)
+def _clear_url_formats(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        get_url_format.cache_clear()
@@ -0,0 +1,65 @@
+"""
+EXPLAIN checks for the catalog's hot queries.
+
+``get_view_queries`` lists the querysets the listing views and API build
+(kept in step with them by hand), and ``find_sequential_scans`` reads a
+plan from ``QuerySet.explain()`` and returns the tables read in full.
+Used by the ``explain_queries`` management command.
+"""
+import json
+import re
+
+from django.db import connection
+from .models import Category, ImageUpload, Product
+
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def get_view_queries():
+    """Return ``[(name, queryset)]`` for the queries behind the main pages and API."""
+    from orders.models import Order
+
+    category = Category.objects.order_by('pk').first()
+    user_id = Order.objects.values_list('user_id', flat=True).first() or 0
+    available = Product.objects.filter(available=True)
+
+    return [
+        ('product_list', available.order_by('-created_at')),
+        ('product_list_by_category', available.filter(category=category).order_by('-created_at')),
+        ('api_products_by_type', available.filter(jewelry_type='ring').order_by('-created_at')),
+        ('api_products_by_material', available.filter(material='metal').order_by('-created_at')),
+        ('product_detail', available.filter(slug='anillo').select_related('category')),
+        ('order_list', Order.objects.filter(user_id=user_id).order_by('-created_at')),
+        ('image_list', ImageUpload.objects.order_by('-uploaded_at', '-id')[:13]),
+    ]
+
+
+def explain(queryset):
+    """Return the plan of ``queryset`` as text (JSON on MySQL)."""
+    if connection.vendor == 'mysql':
+        return queryset.explain(format='JSON')
+    return queryset.explain()
+
+
+def find_sequential_scans(plan, vendor=None):
+    """Return the tables the plan reads in full (no index)."""
+    vendor = vendor or connection.vendor
+    if vendor == 'postgresql':
+        return sorted(set(POSTGRES_SCAN_RE.findall(plan)))
+    if vendor == 'mysql':
+        tables = set()
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    tables.add(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(plan))
+        return sorted(tables)
+    return sorted(set(SQLITE_SCAN_RE.findall(plan)))
@@ -0,0 +1,243 @@
+"""
+Synthetic catalog, customers, carts and order history at scale.
+
+Used by ``create_sample_data --products N --orders N`` (and the benchmarks).
+Rows are written with ``bulk_create`` in batches and everything derives
+from one seeded ``random.Random``, so the same arguments produce the same
+data. Distributions:
+
+- prices are log-uniform within a range per jewelry type, scaled by material;
+- product popularity follows a power law (Zipf), which drives order items
+  and cart contents; customers' order counts follow a milder one;
+- orders are spread over ``days`` of history, and their status and payment
+  depend on their age.
+
+``bulk_create`` sends no signals, so the facet counters and sales rollups
+are rebuilt once at the end and the product caches are invalidated.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from orders.rollups import rebuild
+from .bulk import bulk_create_with_pks, notify_products_changed
+from .facets import reconcile
+from .models import Category, Product
+import logging
+
+logger = logging.getLogger('products')
+
+BATCH_SIZE = 5000
+# Rows per UPDATE when backdating orders (one CASE branch per row)
+UPDATE_BATCH_SIZE = 1000
+CUSTOMER_PASSWORD = 'cliente123'
+# (min, max) price in soles per jewelry type
+PRICE_RANGES = {
+    'ring': (15, 400),
+    'necklace': (20, 600),
+    'bracelet': (10, 300),
+    'earring': (8, 250),
+    'brooch': (12, 200),
+    'tiara': (40, 900),
+    'other': (5, 150),
+}
+MATERIAL_FACTORS = {
+    'metal': Decimal('1.3'),
+    'pearl': Decimal('1.5'),
+    'crystal': Decimal('1.2'),
+    'glass': Decimal('0.8'),
+    'resin': Decimal('0.6'),
+    'fabric': Decimal('0.5'),
+    'other': Decimal('1.0'),
+}
+TYPE_NAMES = {
+    'ring': 'Anillo', 'necklace': 'Collar', 'bracelet': 'Pulsera', 'earring': 'Pendientes',
+    'brooch': 'Broche', 'tiara': 'Tiara', 'other': 'Accesorio',
+}
+MATERIAL_NAMES = {
+    'metal': 'plata', 'pearl': 'perlas', 'crystal': 'cristal', 'glass': 'vidrio',
+    'resin': 'resina', 'fabric': 'tela', 'other': 'fantasía',
+}
+STYLES = ['Clásico', 'Moderno', 'Vintage', 'Minimalista', 'Bohemio', 'Elegante', 'Artesanal', 'Infinito']
+# Jewelry type frequency in the catalog
+TYPE_WEIGHTS = {'ring': 25, 'necklace': 22, 'bracelet': 18, 'earring': 25, 'brooch': 4, 'tiara': 1, 'other': 5}
+# Category slug (from create_sample_data) per jewelry type
+TYPE_CATEGORIES = {'ring': 'anillos', 'necklace': 'collares', 'bracelet': 'pulseras', 'earring': 'pendientes'}
+PRODUCT_SKEW = 1.1
+CUSTOMER_SKEW = 0.7
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights where rank ``k`` is ``1 / k**skew`` as likely as rank 1."""
+    return list(accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+class SampleDataGenerator:
+    """Generate ``products``, ``users`` (customers), ``orders`` and ``carts``; see the module docstring."""
+
+    def __init__(self, products=0, users=0, orders=0, carts=0, days=365, seed=0,
+                 batch_size=BATCH_SIZE, progress=None):
+        self.counts = {'products': products, 'users': users, 'orders': orders, 'carts': carts}
+        self.days = days
+        self.rng = random.Random(seed)
+        self.batch_size = max(1, batch_size)
+        self.progress = progress or (lambda label, done, total: None)
+        self.stats = dict.fromkeys(self.counts, 0)
+
+    def run(self):
+        start = time.perf_counter()
+        self.create_products(self.counts['products'])
+        self.create_customers(self.counts['users'])
+        if self.counts['orders'] or self.counts['carts']:
+            products = list(Product.objects.filter(available=True).values_list('pk', 'price'))
+            # Popularity is random with respect to creation order
+            self.rng.shuffle(products)
+            customers = list(
+                get_user_model().objects.filter(is_staff=False).order_by('pk').values_list('pk', flat=True)
+            )
+            if products and customers:
+                self.create_orders(self.counts['orders'], products, customers)
+                self.create_carts(self.counts['carts'], products, customers)
+
+        if self.stats.get('products') or self.stats.get('orders'):
+            reconcile()
+            rebuild()
+            notify_products_changed(None, None)
+        self.stats['seconds'] = round(time.perf_counter() - start, 1)
+        logger.info(f"Generated sample data: {self.stats}")
+        return self.stats
+
+    def _batches(self, total):
+        for offset in range(0, total, self.batch_size):
+            yield offset, min(offset + self.batch_size, total)
+
+    def _price(self, jewelry_type, material):
+        low, high = PRICE_RANGES[jewelry_type]
+        price = Decimal(math.exp(self.rng.uniform(math.log(low), math.log(high))))
+        return (price * MATERIAL_FACTORS[material]).quantize(Decimal('0.10'))
+
+    def create_products(self, total):
+        categories = {category.slug: category for category in Category.objects.all()}
+        others = list(categories.values())
+        types, weights = zip(*TYPE_WEIGHTS.items())
+        materials = list(MATERIAL_FACTORS)
+        # Continue numbering after an earlier run, so slugs stay unique
+        first = Product.objects.filter(slug__startswith='muestra-').count()
+        for start, end in self._batches(total):
+            batch = []
+            for index in range(first + start, first + end):
+                jewelry_type = self.rng.choices(types, weights)[0]
+                material = self.rng.choice(materials)
+                stock = 0 if self.rng.random() < 0.08 else int(self.rng.paretovariate(1.5) * 3)
+                category = categories.get(TYPE_CATEGORIES.get(jewelry_type))
+                batch.append(Product(
+                    name=f'{TYPE_NAMES[jewelry_type]} {self.rng.choice(STYLES)} de {MATERIAL_NAMES[material]} {index + 1}',
+                    slug=f'muestra-{index + 1}',
+                    description=f'{TYPE_NAMES[jewelry_type]} de {MATERIAL_NAMES[material]}, producto de muestra.',
+                    price=self._price(jewelry_type, material),
+                    jewelry_type=jewelry_type,
+                    material=material,
+                    category=category or (self.rng.choice(others) if others else None),
+                    stock=min(stock, 500),
+                    available=stock > 0 or self.rng.random() < 0.3,
+                ))
+            Product.objects.bulk_create(batch)
+            self.progress('products', end, total)
+        self.stats['products'] = total
+
+    def create_customers(self, total):
+        User = get_user_model()
+        # One hash for everyone: hashing would dominate otherwise
+        password = make_password(CUSTOMER_PASSWORD)
+        first = User.objects.filter(username__startswith='cliente').count()
+        joined = timezone.now() - timedelta(days=self.days)
+        for start, end in self._batches(total):
+            User.objects.bulk_create(
+                User(
+                    username=f'cliente{index + 1}', email=f'cliente{index + 1}@example.com', password=password,
+                    first_name='Cliente', last_name=str(index + 1), address=f'Av. Principal {index + 1}, Lima',
+                    date_joined=joined,
+                )
+                for index in range(first + start, first + end)
+            )
+            self.progress('users', end, total)
+        self.stats['users'] = total
+
+    def _order_status(self, age):
+        if self.rng.random() < 0.05:
+            return 'cancelled'
+        if age < timedelta(days=2):
+            return self.rng.choice(['pending', 'processing'])
+        if age < timedelta(days=7):
+            return self.rng.choice(['processing', 'shipped', 'delivered'])
+        return 'delivered'
+
+    def create_orders(self, total, products, customers):
+        product_weights = zipf_weights(len(products), PRODUCT_SKEW)
+        customer_weights = zipf_weights(len(customers), CUSTOMER_SKEW)
+        self.rng.shuffle(customers)
+        now = timezone.now()
+        first = Order.objects.count()
+        history = timedelta(days=self.days).total_seconds()
+        for start, end in self._batches(total):
+            orders, lines, placed_at = [], [], []
+            for index in range(first + start, first + end):
+                placed = now - timedelta(seconds=history * self.rng.random() ** 1.5)
+                status = self._order_status(now - placed)
+                picked = self.rng.choices(products, cum_weights=product_weights, k=self.rng.choice([1, 1, 1, 2, 2, 3, 4]))
+                items = {product_id: (price, self.rng.choice([1, 1, 1, 2, 3])) for product_id, price in picked}
+                subtotal = sum(price * quantity for price, quantity in items.values())
+                tax = (subtotal * Decimal('0.08')).quantize(Decimal('0.01'))
+                paid = status not in ('pending', 'cancelled')
+                orders.append(Order(
+                    user_id=self.rng.choices(customers, cum_weights=customer_weights)[0],
+                    order_number=f'ORD-{placed:%y%m%d}-{index + 1:08X}',
+                    status=status,
+                    subtotal=subtotal, tax=tax, shipping_cost=Decimal('5.00'),
+                    total=subtotal + tax + Decimal('5.00'),
+                    shipping_address='Av. Principal 123, Lima',
+                    payment_method=self.rng.choices(['credit_card', 'paypal', 'bank_transfer'], [80, 15, 5])[0],
+                    payment_status=paid, payment_date=placed if paid else None,
+                ))
+                lines.append(items)
+                placed_at.append(placed)
+            with transaction.atomic():
+                bulk_create_with_pks(Order, orders, key=('order_number',))
+                # created_at is auto_now_add: the generated history is written afterwards
+                for order, placed in zip(orders, placed_at):
+                    order.created_at = placed
+                Order.objects.bulk_update(orders, ['created_at'], batch_size=UPDATE_BATCH_SIZE)
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product_id=product_id, quantity=quantity, price=price)
+                    for order, items in zip(orders, lines)
+                    for product_id, (price, quantity) in items.items()
+                )
+            self.progress('orders', end, total)
+        self.stats['orders'] = total
+
+    def create_carts(self, total, products, customers):
+        product_weights = zipf_weights(len(products), PRODUCT_SKEW)
+        with_cart = set(Cart.objects.values_list('user_id', flat=True))
+        without_cart = [pk for pk in customers if pk not in with_cart]
+        owners = self.rng.sample(without_cart, min(total, len(without_cart)))
+        for start, end in self._batches(len(owners)):
+            carts = bulk_create_with_pks(Cart, [Cart(user_id=user_id) for user_id in owners[start:end]], key=('user_id',))
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product_id=product_id, quantity=self.rng.choice([1, 1, 2]))
+                for cart in carts
+                for product_id in {
+                    product_id for product_id, _ in
+                    self.rng.choices(products, cum_weights=product_weights, k=self.rng.randint(1, 5))
+                }
+            )
+            self.progress('carts', end, len(owners))
+        self.stats['carts'] = len(owners)
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from .facets import get_facet_counts
+from .image_urls import get_image_url_builder, get_srcsets, resolve_image_url
 from .models import Category, Product
 
 
@@ -15,7 +17,8 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def get_products_count(self, obj):
-        return obj.products.filter(available=True).count()
+        # Denormalized counters: one cached lookup instead of a COUNT per category
+        return get_facet_counts()['category'].get(obj.pk, 0)
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -23,24 +26,24 @@ class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     display_price = serializers.CharField(read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price', 'display_price',
             'jewelry_type', 'material', 'category', 'category_name',
-            'stock', 'available', 'created_at', 'updated_at', 'image', 'image_url'
+            'stock', 'available', 'created_at', 'updated_at', 'image', 'image_url', 'image_srcset'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'slug']
 
     def get_image_url(self, obj):
-        """Get full URL for product image."""
-        if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
+        """Get full URL for product image (``image`` stores a URL or path)."""
+        return resolve_image_url(obj.image, self.context.get('request'), placeholder=False)
+
+    def get_image_srcset(self, obj):
+        """Get ``{format: srcset}`` for the generated thumbnails."""
+        return get_srcsets(obj.derivatives, get_image_url_builder(self.context.get('request'), placeholder=False))
 
     def create(self, validated_data):
         """Create product with automatic slug generation."""
@@ -62,20 +65,63 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     display_price = serializers.CharField(read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'price', 'display_price',
             'jewelry_type', 'material', 'category_name',
-            'available', 'image_url'
+            'available', 'image_url', 'image_srcset'
         ]
 
     def get_image_url(self, obj):
-        """Get full URL for product image."""
-        if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
\ No newline at end of file
+        """Get full URL for product image (``image`` stores a URL or path)."""
+        return resolve_image_url(obj.image, self.context.get('request'), placeholder=False)
+
+    def get_image_srcset(self, obj):
+        """Get ``{format: srcset}`` for the generated thumbnails."""
+        return get_srcsets(obj.derivatives, get_image_url_builder(self.context.get('request'), placeholder=False))
+
+    # Fast path for read-only listings. Columns must stay in step with Meta.fields.
+    values_fields = (
+        'id', 'name', 'slug', 'price', 'jewelry_type', 'material',
+        'category__name', 'available', 'image', 'derivatives',
+    )
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        """Return ``queryset`` as the ``.values()`` rows consumed by ``serialize_values``."""
+        return queryset.values(*cls.values_fields)
+
+    @classmethod
+    def serialize_values(cls, rows, request=None):
+        """
+        Serialize ``.values()`` rows exactly like ``ProductListSerializer(many=True)``.
+
+        Skips field binding and per-row method calls: the category name comes
+        from the join, prices are formatted directly and image URLs are built
+        with a resolver bound once per call.
+        """
+        image_url = get_image_url_builder(request, placeholder=False)
+        data = []
+        for row in rows:
+            price = row['price']
+            item = {
+                'id': row['id'],
+                'name': row['name'],
+                'slug': row['slug'],
+                'price': f'{price:.2f}',
+                'display_price': f'S/. {price:.2f}',
+                'jewelry_type': row['jewelry_type'],
+                'material': row['material'],
+            }
+            # DRF skips category_name when the product has no category
+            if row['category__name'] is not None:
+                item['category_name'] = row['category__name']
+            item['available'] = row['available']
+            item['image_url'] = image_url(row['image'])
+            item['image_srcset'] = get_srcsets(row['derivatives'], image_url)
+            data.append(item)
+        return data
+
@@ -1,12 +1,24 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
-from .models import Product, Category
+from .models import Product, Category, FacetCount, ImageBlob, ImageUpload
+from .blobs import acquire_blob, release_blob
+from .bulk import products_changed
+from .derivatives import delete_derivatives, schedule_derivatives
+from .facets import apply_deltas, change_deltas, facet_keys, product_keys
+from .image_queries import invalidate_image_stats
+from .snapshot import invalidate_snapshot
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _delete_pattern(pattern):
+    """Delete keys matching a glob pattern on backends that support it (django-redis)."""
+    if hasattr(cache, 'delete_pattern'):
+        cache.delete_pattern(pattern)
+
+
 @receiver(post_save, sender=Product)
 def invalidate_product_cache(sender, instance, **kwargs):
     """Invalidate cache when a product is saved."""
@@ -20,8 +32,9 @@ def invalidate_product_cache(sender, instance, **kwargs):
     # Invalidate individual product cache
     cache.delete(f'product_detail_{instance.id}_{instance.slug}')
 
-    # Invalidate featured products cache
+    # Invalidate featured products cache and the materialized snapshot
     cache.delete('featured_products')
+    invalidate_snapshot()
 
     logger.info(f"Invalidated cache for product: {instance.name}")
 
@@ -39,8 +52,9 @@ def invalidate_product_cache_on_delete(sender, instance, **kwargs):
     # Invalidate individual product cache
     cache.delete(f'product_detail_{instance.id}_{instance.slug}')
 
-    # Invalidate featured products cache
+    # Invalidate featured products cache and the materialized snapshot
     cache.delete('featured_products')
+    invalidate_snapshot()
 
     logger.info(f"Invalidated cache for deleted product: {instance.name}")
 
@@ -52,7 +66,11 @@ def invalidate_category_cache(sender, instance, **kwargs):
     cache.delete('categories_list')
 
     # Invalidate all product lists (since category names might have changed)
-    cache.delete_pattern('products_list_*')
+    _delete_pattern('products_list_*')
+
+    # Category names and pages are part of the materialized snapshot
+    cache.delete('featured_products')
+    invalidate_snapshot()
 
     logger.info(f"Invalidated cache for category: {instance.name}")
 
@@ -67,18 +85,128 @@ def invalidate_category_cache_on_delete(sender, instance, **kwargs):
     cache.delete(f'products_list_{instance.slug}')
 
     # Invalidate all product lists
-    cache.delete_pattern('products_list_*')
+    _delete_pattern('products_list_*')
+
+    # Category names and pages are part of the materialized snapshot
+    cache.delete('featured_products')
+    invalidate_snapshot()
 
     logger.info(f"Invalidated cache for deleted category: {instance.name}")
 
 
+@receiver(products_changed)
+def invalidate_changed_products(sender, product_ids, category_ids, **kwargs):
+    """Invalidate the caches of a bulk change in one pass."""
+    if product_ids is None:
+        cache.delete_many([f'products_list_{slug}' for slug in Category.objects.values_list('slug', flat=True)])
+        invalidate_all_product_caches()
+        return
+
+    slugs = Product.objects.filter(pk__in=product_ids).values_list('id', 'slug')
+    category_slugs = Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True)
+    keys = ['products_list_all', 'featured_products']
+    keys += [f'product_detail_{product_id}_{slug}' for product_id, slug in slugs]
+    keys += [f'products_list_{slug}' for slug in category_slugs]
+    cache.delete_many(keys)
+    invalidate_snapshot()
+
+    logger.info(f"Invalidated cache for {len(product_ids)} products in {len(category_ids)} categories")
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_facets(sender, instance, **kwargs):
+    """Keep the stored facet values to compute counter deltas in post_save."""
+    stored = None
+    if instance.pk:
+        stored = Product.objects.filter(pk=instance.pk, available=True).values(
+            'category_id', 'jewelry_type', 'material'
+        ).first()
+    instance._stored_facet_keys = (
+        facet_keys(stored['category_id'], stored['jewelry_type'], stored['material']) if stored else []
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, **kwargs):
+    """Move the product between facet counters when it changes."""
+    apply_deltas(change_deltas(getattr(instance, '_stored_facet_keys', []), product_keys(instance)))
+
+
+@receiver(post_delete, sender=Product)
+def update_facet_counts_on_delete(sender, instance, **kwargs):
+    """Remove a deleted product from its facet counters."""
+    apply_deltas(change_deltas(product_keys(instance), []))
+
+
+@receiver(post_delete, sender=Category)
+def delete_category_facet(sender, instance, **kwargs):
+    """Products of a deleted category are uncategorized (SET_NULL, no signals)."""
+    FacetCount.objects.filter(facet='category', value=str(instance.pk)).delete()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ImageUpload)
+def queue_image_derivatives(sender, instance, **kwargs):
+    """Generate thumbnails when an image is added or replaced."""
+    if kwargs.get('raw'):
+        return
+    schedule_derivatives(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ImageUpload)
+def delete_image_derivatives(sender, instance, **kwargs):
+    """Remove thumbnails of deleted images."""
+    source = (instance.derivatives or {}).get('source') or ''
+    # Blob thumbnails are shared and removed with the blob by gc_image_blobs
+    if not source.startswith(ImageBlob.PREFIX):
+        delete_derivatives(instance.derivatives)
+
+
+@receiver(pre_save, sender=ImageUpload)
+def remember_image_blob(sender, instance, **kwargs):
+    """Keep the stored blob id to detect blob changes in post_save."""
+    instance._stored_blob_id = (
+        ImageUpload.objects.filter(pk=instance.pk).values_list('blob_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ImageUpload)
+def count_blob_references(sender, instance, **kwargs):
+    """Keep ImageBlob.ref_count in step with the uploads using each blob."""
+    previous = getattr(instance, '_stored_blob_id', None)
+    if previous == instance.blob_id:
+        return
+    if previous:
+        release_blob(previous)
+    if instance.blob_id:
+        acquire_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=ImageUpload)
+def release_blob_reference(sender, instance, **kwargs):
+    """Release the blob of a deleted upload; the file stays until gc_image_blobs."""
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_save, sender=ImageUpload)
+@receiver(post_delete, sender=ImageUpload)
+def invalidate_image_upload_stats(sender, instance, **kwargs):
+    """Invalidate the gallery counters when an upload is added or deleted."""
+    if kwargs.get('created', True):
+        invalidate_image_stats()
+
+
 # Helper functions for manual cache invalidation
 def invalidate_all_product_caches():
     """Invalidate all product-related caches."""
-    cache.delete_pattern('products_list_*')
-    cache.delete_pattern('product_detail_*')
+    _delete_pattern('products_list_*')
+    _delete_pattern('product_detail_*')
     cache.delete('featured_products')
     cache.delete('categories_list')
+    invalidate_snapshot()
     logger.info("Invalidated all product caches")
 
 
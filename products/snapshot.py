@@ -0,0 +1,324 @@
+"""
+Materialized catalog snapshot for read-heavy endpoints.
+
+The featured list, the product index and the category listings are served
+as compact pre-serialized JSON pages, straight from the cache (or from disk
+when ``CATALOG_SNAPSHOT_DIR`` is configured), bypassing the ORM and DRF.
+The index is paginated like the categories, so no entry holds the whole
+catalog.
+
+Each generation has a small manifest (product count per category), so
+requests for unknown categories or pages are answered without queries.
+Entries are built one page at a time, when first requested: an entry culled
+from a bounded cache (LocMemCache keeps 1000 keys) costs one query, never a
+rebuild of the whole catalog. A catalog change only moves to a new
+generation; with ``CATALOG_SNAPSHOT_DIR`` set, the disk copy is rebuilt by a
+background thread once the change commits, one rebuild for any number of
+changes queued meanwhile.
+
+With a per-process cache, other workers only learn about a new generation
+when their entries expire, so entries are cached for at most
+``LOCAL_CACHE_TIMEOUT`` there (``shared_timeout``).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q
+from jewelry_catalog.caching import shared_timeout
+from .models import Category, Product
+from .serializers import ProductListSerializer
+import logging
+
+logger = logging.getLogger('cache')
+
+GENERATION_KEY = 'catalog_snapshot_generation'
+ENTRY_KEY = 'catalog_snapshot:{generation}:{name}'
+MANIFEST_KEY = 'catalog_snapshot:{generation}:manifest'
+SNAPSHOT_TIMEOUT = 60 * 60
+MANIFEST_FILENAME = 'manifest.json'
+
+FEATURED = 'featured'
+FEATURED_LIMIT = 8
+PAGE_SIZE = 20
+INDEX_PAGE_SIZE = 500
+# Every listing is newest first; the pk makes pages of equal dates stable
+ORDERING = ('-created_at', '-pk')
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-snapshot')
+_disk_rebuild_queued = threading.Event()
+
+
+def category_page_name(category_slug, page):
+    return f'category/{category_slug}/{page}'
+
+
+def index_page_name(page):
+    return f'index/{page}'
+
+
+def _num_pages(count, page_size):
+    return max(1, -(-count // page_size))
+
+
+def _encode(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _entry(body, **meta):
+    return dict(meta, body=body, etag=f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"')
+
+
+def build_snapshot():
+    """
+    Serialize the whole catalog into snapshot entries.
+
+    Runs two queries: categories and available products (in listing order).
+    Used for the disk copy and ``build_catalog_snapshot``; requests build
+    their page alone (``get_entry``).
+    """
+    products = list(
+        Product.objects.filter(available=True).order_by(*ORDERING)
+        .values(*ProductListSerializer.values_fields, 'category__slug')
+    )
+    rows = ProductListSerializer.serialize_values(products)
+
+    by_category = OrderedDict((slug, []) for slug in Category.objects.values_list('slug', flat=True))
+    for product, row in zip(products, rows):
+        if product['category__slug'] is not None:
+            by_category.setdefault(product['category__slug'], []).append(row)
+
+    entries = {FEATURED: _entry(_encode(rows[:FEATURED_LIMIT]), count=min(len(rows), FEATURED_LIMIT), num_pages=1)}
+    entries.update(_pages(rows, INDEX_PAGE_SIZE, index_page_name))
+    for slug, category_rows in by_category.items():
+        entries.update(_pages(category_rows, PAGE_SIZE, partial(category_page_name, slug)))
+    return entries
+
+
+def _pages(rows, page_size, page_name):
+    num_pages = _num_pages(len(rows), page_size)
+    for page in range(1, num_pages + 1):
+        start = (page - 1) * page_size
+        yield page_name(page), _entry(_encode(rows[start:start + page_size]), count=len(rows), num_pages=num_pages)
+
+
+def rebuild_snapshot():
+    """
+    Build the whole snapshot, write it to disk (if configured) and prime the cache.
+
+    Only the manifest and the first page of each listing go to the cache;
+    the other pages are cached as they are requested.
+    """
+    generation = _get_generation()
+    entries = build_snapshot()
+    manifest = {
+        'count': entries[index_page_name(1)]['count'],
+        'categories': {
+            name.split('/')[1]: entry['count'] for name, entry in entries.items()
+            if name.startswith('category/') and name.endswith('/1')
+        },
+    }
+    _write_to_disk(manifest, entries)
+    values = {
+        ENTRY_KEY.format(generation=generation, name=name): entry
+        for name, entry in entries.items() if name == FEATURED or name.endswith('/1')
+    }
+    values[MANIFEST_KEY.format(generation=generation)] = manifest
+    cache.set_many(values, shared_timeout(SNAPSHOT_TIMEOUT))
+    logger.info(f"Catalog snapshot rebuilt: {len(entries)} entries (generation {generation})")
+    return entries
+
+
+def get_entry(name):
+    """
+    Return the snapshot entry ``name`` or None if it does not exist.
+
+    Entries are dicts with ``body`` (bytes), ``etag``, ``count`` and
+    ``num_pages``. A missing entry is read from disk or built alone; names
+    the manifest does not list return None straight away.
+    """
+    generation = _get_generation()
+    key = ENTRY_KEY.format(generation=generation, name=name)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    page = _locate(_get_manifest(generation), name)
+    if page is None:
+        return None
+    filters, start, stop, meta = page
+    body = _read_from_disk(name)
+    if body is None:
+        products = (
+            Product.objects.filter(available=True, **filters).order_by(*ORDERING)
+            .values(*ProductListSerializer.values_fields)[start:stop]
+        )
+        body = _encode(ProductListSerializer.serialize_values(list(products)))
+    entry = _entry(body, **meta)
+    cache.set(key, entry, shared_timeout(SNAPSHOT_TIMEOUT))
+    return entry
+
+
+def _get_manifest(generation):
+    key = MANIFEST_KEY.format(generation=generation)
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = _read_manifest_from_disk()
+        if manifest is None:
+            categories = Category.objects.annotate(
+                available_count=Count('products', filter=Q(products__available=True))
+            ).values_list('slug', 'available_count')
+            manifest = {
+                'count': Product.objects.filter(available=True).count(),
+                'categories': dict(categories),
+            }
+        cache.set(key, manifest, shared_timeout(SNAPSHOT_TIMEOUT))
+    return manifest
+
+
+def _locate(manifest, name):
+    """``(filters, start, stop, meta)`` of the page ``name``, or None if the snapshot has no such page."""
+    if name == FEATURED:
+        return {}, 0, FEATURED_LIMIT, {'count': min(manifest['count'], FEATURED_LIMIT), 'num_pages': 1}
+    kind, _, rest = name.partition('/')
+    if kind == 'index':
+        filters, count, page_size, page = {}, manifest['count'], INDEX_PAGE_SIZE, rest
+    elif kind == 'category':
+        slug, _, page = rest.rpartition('/')
+        if slug not in manifest['categories']:
+            return None
+        filters, count, page_size = {'category__slug': slug}, manifest['categories'][slug], PAGE_SIZE
+    else:
+        return None
+    num_pages = _num_pages(count, page_size)
+    if not page.isdigit() or not 1 <= int(page) <= num_pages:
+        return None
+    start = (int(page) - 1) * page_size
+    return filters, start, start + page_size, {'count': count, 'num_pages': num_pages}
+
+
+def invalidate_snapshot():
+    """
+    Move to a new snapshot generation, now and again once the transaction commits.
+
+    The second step drops entries other requests built from the data as it
+    was before the commit, and queues the disk rebuild.
+    """
+    _expire()
+    # One refresh per transaction, however many rows it touched
+    pending = any(func is _refresh_after_commit for _, func, _ in connection.run_on_commit)
+    if not pending:
+        transaction.on_commit(_refresh_after_commit, robust=True)
+
+
+def _expire():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+    _remove_from_disk()
+
+
+def _refresh_after_commit():
+    _expire()
+    if _snapshot_dir() and not _disk_rebuild_queued.is_set():
+        _disk_rebuild_queued.set()
+        _executor.submit(_rebuild_in_worker)
+
+
+def _rebuild_in_worker():
+    # Changes committed from here on queue another rebuild
+    _disk_rebuild_queued.clear()
+    try:
+        rebuild_snapshot()
+    except Exception as e:
+        logger.error(f"Catalog snapshot rebuild failed: {str(e)}")
+    finally:
+        connections.close_all()
+
+
+def _get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 0, None)
+        generation = cache.get(GENERATION_KEY, 0)
+    return generation
+
+
+def _snapshot_dir():
+    return getattr(settings, 'CATALOG_SNAPSHOT_DIR', None)
+
+
+def _entry_filename(name):
+    return hashlib.md5(name.encode(), usedforsecurity=False).hexdigest() + '.json'
+
+
+def _write_to_disk(manifest, entries):
+    directory = _snapshot_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    for name, entry in entries.items():
+        _atomic_write(os.path.join(directory, _entry_filename(name)), entry['body'])
+    # The manifest goes last: readers only trust the pages while it exists
+    _atomic_write(os.path.join(directory, MANIFEST_FILENAME), _encode(manifest))
+
+    current = {_entry_filename(name) for name in entries} | {MANIFEST_FILENAME}
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') and filename not in current:
+            os.remove(os.path.join(directory, filename))
+
+
+def _read_manifest_from_disk():
+    directory = _snapshot_dir()
+    if not directory:
+        return None
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'rb') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Catalog snapshot not available on disk: {e}")
+        return None
+
+
+def _read_from_disk(name):
+    """Return the body of page ``name`` from the disk copy, if there is a current one."""
+    directory = _snapshot_dir()
+    if not directory or not os.path.exists(os.path.join(directory, MANIFEST_FILENAME)):
+        return None
+    try:
+        with open(os.path.join(directory, _entry_filename(name)), 'rb') as blob:
+            return blob.read()
+    except OSError:
+        return None
+
+
+def _remove_from_disk():
+    directory = _snapshot_dir()
+    if not directory:
+        return
+    try:
+        os.remove(os.path.join(directory, MANIFEST_FILENAME))
+    except FileNotFoundError:
+        pass
+
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
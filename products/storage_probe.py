@@ -0,0 +1,180 @@
+"""
+Background health probe for the media storage.
+
+``run_probe`` times one round trip of each storage operation (list, put,
+head, get, delete) against a small scratch file and stores the result in the
+cache: the latest run plus a capped time series of per-operation latencies.
+Pages and health checks only read the cache, so they never wait on S3.
+
+Probes run on a schedule: ``python manage.py probe_storage --loop`` in a
+worker process (or cron without ``--loop``), and in-process as a fallback
+through ``schedule_probe``, which queues a run in a background thread when
+the latest result is older than ``STORAGE_PROBE_INTERVAL``.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+
+logger = logging.getLogger('image_upload')
+
+LATEST_KEY = 'storage_probe:latest'
+SERIES_KEY = 'storage_probe:series'
+LOCK_KEY = 'storage_probe:lock'
+SERIES_LENGTH = 288
+OPERATIONS = ('list', 'put', 'head', 'get', 'delete')
+PROBE_PREFIX = 'diagnostics/'
+PROBE_CONTENT = b'storage probe'
+# A probe slower than this (per operation) marks the storage as degraded
+SLOW_OPERATION_MS = 2000
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-probe')
+
+
+def get_probe_interval():
+    return getattr(settings, 'STORAGE_PROBE_INTERVAL', 5 * 60)
+
+
+def _list(storage):
+    if hasattr(storage, 'bucket') and hasattr(storage, '_normalize_name'):
+        objects = list(storage.bucket.objects.filter(Prefix=storage._normalize_name(PROBE_PREFIX)).limit(5))
+        return [obj.key for obj in objects]
+    try:
+        return storage.listdir(PROBE_PREFIX)[1][:5]
+    except FileNotFoundError:
+        return []
+
+
+def run_probe(storage=default_storage):
+    """Time each storage operation once, cache and return the result."""
+    name = f'{PROBE_PREFIX}probe-{uuid.uuid4().hex}.txt'
+    operations = {}
+
+    def timed(operation, function):
+        start = time.perf_counter()
+        try:
+            value = function()
+        except Exception as e:
+            operations[operation] = {
+                'ms': round((time.perf_counter() - start) * 1000, 2), 'ok': False, 'error': str(e)
+            }
+            logger.warning(f"[STORAGE_PROBE] {operation} failed: {str(e)}")
+            return None
+        operations[operation] = {'ms': round((time.perf_counter() - start) * 1000, 2), 'ok': True}
+        return value
+
+    def head():
+        # size() is a HEAD request on S3; exists() is skipped there when overwriting is allowed
+        if storage.size(stored) != len(PROBE_CONTENT):
+            raise RuntimeError('Unexpected size after upload')
+
+    def get():
+        with storage.open(stored, 'rb') as probe:
+            if probe.read() != PROBE_CONTENT:
+                raise RuntimeError('Content mismatch')
+
+    timed('list', lambda: _list(storage))
+    stored = timed('put', lambda: storage.save(name, ContentFile(PROBE_CONTENT)))
+    if stored:
+        timed('head', head)
+        timed('get', get)
+        timed('delete', lambda: storage.delete(stored))
+
+    failed = [operation for operation in OPERATIONS if not operations.get(operation, {}).get('ok')]
+    slow = [operation for operation, result in operations.items() if result['ms'] > SLOW_OPERATION_MS]
+    result = {
+        'timestamp': timezone.now().isoformat(),
+        'status': 'unhealthy' if failed else ('degraded' if slow else 'healthy'),
+        'storage_type': storage.__class__.__name__,
+        'bucket_name': getattr(storage, 'bucket_name', 'N/A'),
+        'region': getattr(storage, 'region_name', 'N/A'),
+        'operations': operations,
+        'failed': failed,
+    }
+    _record(result)
+    logger.info(
+        f"[STORAGE_PROBE] {result['status']}: "
+        + ', '.join(f"{operation}={value['ms']}ms" for operation, value in operations.items())
+    )
+    return result
+
+
+def _record(result):
+    series = cache.get(SERIES_KEY) or []
+    series.append({
+        'timestamp': result['timestamp'],
+        **{operation: value['ms'] for operation, value in result['operations'].items() if value['ok']},
+    })
+    # No expiry: the probe overwrites both keys on every run
+    cache.set_many({LATEST_KEY: result, SERIES_KEY: series[-SERIES_LENGTH:]}, None)
+
+
+def get_latest_probe():
+    """Return the latest cached probe result, or None if no probe has run."""
+    return cache.get(LATEST_KEY)
+
+
+async def aget_latest_probe():
+    return await cache.aget(LATEST_KEY)
+
+
+def get_probe_series():
+    """Return the cached latency series, oldest first: ``[{'timestamp', op: ms, ...}]``."""
+    return cache.get(SERIES_KEY) or []
+
+
+async def aget_probe_series():
+    return await cache.aget(SERIES_KEY) or []
+
+
+def is_stale(result, interval=None):
+    if result is None:
+        return True
+    age = timezone.now() - parse_datetime(result['timestamp'])
+    return age.total_seconds() >= (interval or get_probe_interval())
+
+
+def schedule_probe(force=False):
+    """
+    Queue a probe in the background when the cached result is stale.
+
+    Does nothing with ``STORAGE_PROBE_IN_PROCESS`` off unless ``force``
+    (the diagnostic page's refresh button). A cache lock keeps concurrent workers from probing at the same time.
+    Returns True if a probe was queued.
+    """
+    if not force and not (getattr(settings, 'STORAGE_PROBE_IN_PROCESS', True) and is_stale(get_latest_probe())):
+        return False
+    if not cache.add(LOCK_KEY, True, get_probe_interval()):
+        return False
+    _executor.submit(_run_scheduled)
+    return True
+
+
+def _run_scheduled():
+    try:
+        run_probe()
+    except Exception as e:
+        logger.error(f"[STORAGE_PROBE] Probe crashed: {str(e)}")
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def get_storage_health():
+    """Summary of the latest probe for ``get_system_health``; queues a new probe if stale."""
+    result = get_latest_probe()
+    schedule_probe()
+    if result is None:
+        return {'status': 'unknown'}
+    return {
+        'status': result['status'],
+        'checked_at': result['timestamp'],
+        'latency_ms': {operation: value['ms'] for operation, value in result['operations'].items()},
+        'failed': result['failed'],
+    }
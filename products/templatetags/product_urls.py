@@ -0,0 +1,16 @@
+from django import template
+from products import product_urls
+
+register = template.Library()
+
+
+@register.filter
+def product_url(product):
+    """Detail page URL of a product, as ``{% url 'products:product_detail' product.id product.slug %}``."""
+    return product_urls.product_url(product.id, product.slug)
+
+
+@register.filter
+def category_url(category):
+    """Listing URL of a category, as ``{% url 'products:product_list_by_category' category.slug %}``."""
+    return product_urls.category_url(category.slug)
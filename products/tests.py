@@ -1,3 +1,1463 @@
-from django.test import TestCase
+import csv
+import importlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from botocore.stub import Stubber
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from cart.models import Cart
+from jewelry_catalog.caching import shared_timeout
+from jewelry_catalog.metrics import get_system_health
+from jewelry_catalog.storage import InstrumentedFileSystemStorage, InstrumentedS3Storage, storage_metrics
+from orders.models import Order, SalesRollup
+
+from . import snapshot, storage_probe
+from .blobs import acquire_blob, collect_garbage, iter_storage_names
+from .bulk import products_changed, save_products, update_products
+from .catalog_import import ProductImporter
+from .exports import ProductExporter
+from .facets import get_facet_counts, reconcile
+from .image_queries import search_images
+from .image_urls import resolve_image_url
+from .models import Category, FacetCount, ImageBlob, ImageUpload, Product, UploadSession
+from .query_plans import find_sequential_scans
+from .serializers import ProductListSerializer
+from . import uploads
+from .uploads import CHUNK_PREFIX, store_stream
+
+
+class CatalogTestMixin:
+    """Shared fixtures for catalog tests."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Anillos', slug='anillos')
+        self.product = Product.objects.create(
+            name='Anillo de Plata',
+            slug='anillo-de-plata',
+            description='Anillo clásico',
+            price=Decimal('45.00'),
+            jewelry_type='ring',
+            material='metal',
+            category=self.category,
+            stock=10,
+        )
+
+
+class ConditionalRequestTestCase(CatalogTestMixin, TestCase):
+    """Test ETag/Last-Modified support on the catalog API."""
+
+    def test_product_list_sets_validators_and_cache_control(self):
+        """Test that the product list exposes validators and a CDN policy."""
+        response = self.client.get(reverse('products_api:api_product_list'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('s-maxage=300', response['Cache-Control'])
+
+    def test_product_list_not_modified_skips_serialization(self):
+        """Test that a matching If-None-Match returns 304 with a single query."""
+        url = reverse('products_api:api_product_list')
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_when_product_changes(self):
+        """Test that updating or deleting a product invalidates the ETag."""
+        url = reverse('products_api:api_product_list')
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+
+        self.product.price = Decimal('50.00')
+        self.product.save()
+        response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.product.delete()
+        response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_query_parameters(self):
+        """Test that different filters produce different validators."""
+        url = reverse('products_api:api_product_list')
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+        response = self.client.get(url, {'jewelry_type': 'ring'}, HTTP_ACCEPT='application/json')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_product_detail_not_modified(self):
+        """Test conditional GET on product detail."""
+        url = reverse('products_api:api_product_detail', kwargs={'slug': self.product.slug})
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            url, HTTP_ACCEPT='application/json', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_detail_missing_returns_404(self):
+        """Test that conditional handling does not mask missing products."""
+        url = reverse('products_api:api_product_detail', kwargs={'slug': 'missing'})
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_category_list_revalidates_on_product_change(self):
+        """Test that category validators follow product changes (products_count)."""
+        url = reverse('products_api:api_category_list')
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        Product.objects.create(
+            name='Anillo de Oro', slug='anillo-de-oro', description='Oro',
+            price=Decimal('90.00'), category=self.category, stock=2,
+        )
+        response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_featured_products_not_modified(self):
+        """Test conditional GET on featured products."""
+        url = reverse('products_api:api_featured_products')
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=120', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogSnapshotTestCase(CatalogTestMixin, TestCase):
+    """Test the materialized catalog snapshot endpoints."""
+
+    def _create_products(self, count):
+        for index in range(count):
+            Product.objects.create(
+                name=f'Anillo {index}', slug=f'anillo-{index}', description='Anillo',
+                price=Decimal('10.00'), category=self.category, stock=1,
+            )
+
+    def test_featured_products_served_without_queries(self):
+        """Test that a warm snapshot serves featured products without touching the ORM."""
+        url = reverse('products_api:api_featured_products')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()[0]['slug'], self.product.slug)
+
+    def test_snapshot_matches_serializer_output(self):
+        """Test that snapshot rows are the ProductListSerializer representation."""
+        response = self.client.get(reverse('products_api:api_catalog_index'))
+        expected = ProductListSerializer(Product.objects.filter(available=True), many=True).data
+        self.assertEqual(response.json(), [dict(row) for row in expected])
+
+    def test_snapshot_refreshes_after_product_change(self):
+        """Test that saving a product invalidates the snapshot."""
+        url = reverse('products_api:api_featured_products')
+        self.client.get(url)
+
+        self.product.name = 'Anillo Renombrado'
+        self.product.save()
+        self.assertEqual(self.client.get(url).json()[0]['name'], 'Anillo Renombrado')
+
+    def test_products_by_category_is_paginated(self):
+        """Test that category listings are paginated with headers."""
+        self._create_products(snapshot.PAGE_SIZE)
+        url = reverse('products_api:api_products_by_category', kwargs={'category_slug': self.category.slug})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), snapshot.PAGE_SIZE)
+        self.assertEqual(response['X-Total-Count'], str(snapshot.PAGE_SIZE + 1))
+        self.assertIn('rel="next"', response['Link'])
+
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.json()), 1)
+        self.assertIn('rel="prev"', response['Link'])
+
+        self.assertEqual(self.client.get(url, {'page': 3}).status_code, 404)
+
+    def test_products_by_unknown_category(self):
+        """Test that unknown categories return 404."""
+        url = reverse('products_api:api_products_by_category', kwargs={'category_slug': 'missing'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unknown_pages_do_not_rebuild(self):
+        """Test that unknown categories and pages of a warm snapshot are answered from its manifest."""
+        snapshot.rebuild_snapshot()
+        category_url = reverse('products_api:api_products_by_category', kwargs={'category_slug': self.category.slug})
+        with mock.patch.object(snapshot, 'build_snapshot') as build, self.assertNumQueries(0):
+            for slug in ('missing', 'otra'):
+                url = reverse('products_api:api_products_by_category', kwargs={'category_slug': slug})
+                self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(category_url, {'page': 99}).status_code, 404)
+        build.assert_not_called()
+
+    def test_missing_entries_are_built_alone(self):
+        """Test that a cold or culled entry costs its own page query, never a whole catalog build."""
+        self._create_products(snapshot.PAGE_SIZE)
+        with mock.patch.object(snapshot, 'build_snapshot') as build:
+            # Manifest (categories and count) and the page itself
+            with self.assertNumQueries(3):
+                entry = snapshot.get_entry(snapshot.category_page_name(self.category.slug, 2))
+            self.assertEqual((entry['count'], entry['num_pages']), (snapshot.PAGE_SIZE + 1, 2))
+            self.assertEqual(len(json.loads(entry['body'])), 1)
+
+            generation = snapshot._get_generation()
+            snapshot.get_entry(snapshot.FEATURED)
+            cache.delete(snapshot.ENTRY_KEY.format(generation=generation, name=snapshot.FEATURED))
+            with self.assertNumQueries(1):
+                entry = snapshot.get_entry(snapshot.FEATURED)
+            self.assertEqual(entry['count'], snapshot.FEATURED_LIMIT)
+        build.assert_not_called()
+
+    def test_pages_match_full_build(self):
+        """Test that pages built on request are the bytes of the full build."""
+        self._create_products(snapshot.PAGE_SIZE)
+        entries = snapshot.build_snapshot()
+        for name in (snapshot.FEATURED, snapshot.index_page_name(1), snapshot.category_page_name(self.category.slug, 2)):
+            self.assertEqual(snapshot.get_entry(name), entries[name])
+
+    def test_index_is_paginated(self):
+        """Test that the index endpoint serves bounded pages with headers."""
+        url = reverse('products_api:api_catalog_index')
+        with mock.patch.object(snapshot, 'INDEX_PAGE_SIZE', 1):
+            self._create_products(1)
+            response = self.client.get(url)
+            self.assertEqual(len(response.json()), 1)
+            self.assertEqual(response['X-Total-Count'], '2')
+            self.assertIn('rel="next"', response['Link'])
+            self.assertEqual(self.client.get(url, {'page': 3}).status_code, 404)
+
+    def test_product_save_does_not_rebuild(self):
+        """Test that saves only move the generation, with one background disk rebuild per transaction."""
+        self.addCleanup(snapshot._disk_rebuild_queued.clear)
+        generation = snapshot._get_generation()
+        with mock.patch.object(snapshot, 'build_snapshot') as build, \
+                mock.patch.object(snapshot, '_executor') as executor:
+            for _ in range(3):
+                self.product.save()
+            refreshes = [func for _, func, _ in connection.run_on_commit if func is snapshot._refresh_after_commit]
+            self.assertEqual(len(refreshes), 1)
+            self.assertGreater(snapshot._get_generation(), generation)
+
+            # Without a disk copy there is nothing to rebuild
+            snapshot._refresh_after_commit()
+            executor.submit.assert_not_called()
+            with tempfile.TemporaryDirectory() as directory, override_settings(CATALOG_SNAPSHOT_DIR=directory):
+                snapshot._refresh_after_commit()
+                snapshot._refresh_after_commit()
+            executor.submit.assert_called_once_with(snapshot._rebuild_in_worker)
+        build.assert_not_called()
+
+    def test_snapshot_expires_in_per_process_cache(self):
+        """Test that entries in a per-process cache expire within LOCAL_CACHE_TIMEOUT."""
+        self.assertEqual(shared_timeout(snapshot.SNAPSHOT_TIMEOUT), settings.LOCAL_CACHE_TIMEOUT)
+        self.assertEqual(shared_timeout(None), settings.LOCAL_CACHE_TIMEOUT)
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://x'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(shared_timeout(snapshot.SNAPSHOT_TIMEOUT), snapshot.SNAPSHOT_TIMEOUT)
+
+    def test_snapshot_round_trips_through_disk(self):
+        """Test that a snapshot written to disk is served after the cache is lost."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(CATALOG_SNAPSHOT_DIR=directory):
+            snapshot.rebuild_snapshot()
+            cache.clear()
+            with self.assertNumQueries(0):
+                entry = snapshot.get_entry(snapshot.FEATURED)
+            self.assertEqual(entry['count'], 1)
+
+
+class FastListSerializationTestCase(CatalogTestMixin, TestCase):
+    """Test the ``.values()`` fast path of ProductListSerializer."""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(
+            name='Collar Suelto', slug='collar-suelto', description='Sin categoría',
+            price=Decimal('19.9'), stock=1, image='/media/products/collar.jpg',
+        )
+        Product.objects.create(
+            name='Arete Remoto', slug='arete-remoto', description='Imagen externa',
+            price=Decimal('7.25'), category=self.category, stock=1,
+            image='https://cdn.example.com/aretes/ñandú.jpg',
+        )
+        Product.objects.create(
+            name='Pulsera Relativa', slug='pulsera-relativa', description='Ruta relativa',
+            price=Decimal('12.00'), category=self.category, stock=1, image='products/pulsera.jpg',
+        )
+
+    def _assert_identical(self, request):
+        queryset = Product.objects.order_by('pk')
+        expected = ProductListSerializer(queryset, many=True, context={'request': request}).data
+        actual = ProductListSerializer.serialize_values(ProductListSerializer.values_queryset(queryset), request)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_matches_serializer_with_request(self):
+        """Test identical JSON when image URLs are made absolute."""
+        self._assert_identical(RequestFactory().get('/api/products/', HTTP_HOST='localhost'))
+
+    def test_matches_serializer_without_request(self):
+        """Test identical JSON when no request is available."""
+        self._assert_identical(None)
+
+    def test_product_list_api_uses_single_query(self):
+        """Test that listing products does not query per row."""
+        url = reverse('products_api:api_product_list')
+        with self.assertNumQueries(3):  # validators, count, page
+            response = self.client.get(url, {'page_size': 100}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['count'], 4)
+
+
+class ImageUrlResolverTestCase(TestCase):
+    """Test the shared image URL resolver."""
+
+    def test_absolute_urls_are_kept(self):
+        """Test that Cloudinary/S3 URLs are returned unchanged."""
+        url = 'https://res.cloudinary.com/demo/image/upload/anillo.jpg'
+        self.assertEqual(resolve_image_url(url), url)
+
+    def test_storage_paths_use_media_base(self):
+        """Test that storage paths are prefixed with the media base URL."""
+        with override_settings(MEDIA_URL='https://cdn.example.com/media/'):
+            self.assertEqual(
+                resolve_image_url('uploads/anillo.jpg'), 'https://cdn.example.com/media/uploads/anillo.jpg'
+            )
+        self.assertEqual(resolve_image_url('uploads/anillo.jpg'), '/media/uploads/anillo.jpg')
+
+    def test_placeholder(self):
+        """Test the placeholder for empty images."""
+        self.assertEqual(resolve_image_url(''), '/static/images/placeholder-product.jpg')
+        self.assertIsNone(resolve_image_url('', placeholder=False))
+
+    def test_request_makes_urls_absolute(self):
+        """Test that a request turns paths into absolute URLs."""
+        request = RequestFactory().get('/api/products/', HTTP_HOST='localhost')
+        self.assertEqual(
+            resolve_image_url('/media/products/anillo.jpg', request), 'http://localhost/media/products/anillo.jpg'
+        )
+        self.assertEqual(resolve_image_url('products/anillo.jpg', request), 'http://localhost/media/products/anillo.jpg')
+
+
+class ImageDerivativesTestCase(TestCase):
+    """Test thumbnail generation for uploaded images."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, IMAGE_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _image_file(self, name='anillo.png', size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 160, 40, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_thumbnails(self):
+        """Test that an upload gets WebP and JPEG thumbnails no wider than the original."""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = ImageUpload.objects.create(title='Anillo', image=self._image_file())
+        upload.refresh_from_db()
+
+        self.assertEqual(upload.derivatives['source'], upload.image.name)
+        self.assertEqual(sorted(upload.derivatives['webp']), ['320', '640'])
+        self.assertEqual(sorted(upload.derivatives['jpeg']), ['320', '640'])
+        with default_storage.open(upload.derivatives['jpeg']['320']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 240))
+        self.assertTrue(upload.thumbnail_url.endswith('__320w.jpg'))
+        self.assertIn('640w', upload.srcsets['webp'])
+
+    def test_delete_removes_thumbnails(self):
+        """Test that deleting an upload removes its thumbnails."""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = ImageUpload.objects.create(title='Anillo', image=self._image_file())
+        upload.refresh_from_db()
+        names = list(upload.derivatives['webp'].values())
+
+        upload.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_small_images_get_one_thumbnail(self):
+        """Test that images narrower than every width still get the smallest one."""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = ImageUpload.objects.create(title='Icono', image=self._image_file(size=(100, 100)))
+        upload.refresh_from_db()
+        self.assertEqual(list(upload.derivatives['jpeg']), ['320'])
+
+    def test_product_api_exposes_srcset(self):
+        """Test that products pointing at stored images expose srcsets."""
+        name = default_storage.save('products/collar.png', self._image_file())
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='Collar', slug='collar', description='Collar', price=Decimal('30.00'),
+                stock=1, image=f'/media/{name}',
+            )
+        product.refresh_from_db()
+        self.assertEqual(product.derivatives['source'], name)
+
+        cache.clear()
+        response = APIClient().get(reverse('products_api:api_product_list'), HTTP_ACCEPT='application/json')
+        srcset = response.json()['results'][0]['image_srcset']
+        self.assertIn('http://testserver/media/products/collar__320w.webp 320w', srcset['webp'])
+
+    def test_external_images_are_skipped(self):
+        """Test that Cloudinary URLs are not processed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='Arete', slug='arete', description='Arete', price=Decimal('10.00'),
+                stock=1, image='https://res.cloudinary.com/demo/image/upload/arete.jpg',
+            )
+        product.refresh_from_db()
+        self.assertEqual(product.derivatives, {})
+
+
+class StreamingUploadTestCase(TestCase):
+    """Test streamed and chunked image uploads."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), (10, 120, 200)).save(buffer, 'PNG')
+        self.png = buffer.getvalue()
+
+    def test_form_upload_is_streamed_to_storage(self):
+        """Test that the upload view stores the file through the streaming handler."""
+        client = Client(enforce_csrf_checks=False)
+        client.force_login(self.user)
+        response = client.post(reverse('products:image_upload'), {
+            'title': 'Anillo',
+            'image': SimpleUploadedFile('anillo.png', self.png, content_type='image/png'),
+        })
+        self.assertRedirects(response, reverse('products:image_list'), fetch_redirect_response=False)
+
+        upload = ImageUpload.objects.get()
+        self.assertTrue(upload.image.name.startswith(ImageBlob.PREFIX))
+        with default_storage.open(upload.image.name) as stored:
+            self.assertEqual(stored.read(), self.png)
+
+    def test_form_upload_rejects_fake_images(self):
+        """Test that magic bytes, not the file name, decide whether a file is an image."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('products:image_upload'), {
+            'image': SimpleUploadedFile('anillo.png', b'#!/bin/sh\necho not an image\n', content_type='image/png'),
+        })
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_form_upload_requires_csrf_token(self):
+        """Test that the streaming handler does not disable CSRF protection."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('products:image_upload'), {
+            'image': SimpleUploadedFile('anillo.png', self.png, content_type='image/png'),
+        })
+        self.assertEqual(response.status_code, 403)
+
+    def test_chunked_upload_can_resume(self):
+        """Test a chunked upload with an out-of-order chunk and completion."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        size = len(self.png)
+        response = client.post(
+            reverse('products_api:api_upload_session_create'), {'filename': 'anillo.png', 'size': size}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        url = reverse('products_api:api_upload_session_detail', kwargs={'session_id': response.json()['id']})
+
+        half = size // 2
+        response = client.put(
+            url, self.png[half:], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {half}-{size - 1}/{size}',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 0)
+
+        for start, end in ((0, half), (half, size)):
+            response = client.put(
+                url, self.png[start:end], content_type='application/octet-stream',
+                HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{size}',
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get(url).json()['offset'], size)
+
+        response = client.post(f'{url}complete/', {'title': 'Anillo'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload = ImageUpload.objects.get(pk=response.json()['id'])
+        with default_storage.open(upload.image.name) as stored:
+            self.assertEqual(stored.read(), self.png)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_chunked_upload_state_is_shared(self):
+        """Test that chunk state lives in the database and chunks in storage, not in the worker."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        size = len(self.png)
+        session_id = client.post(
+            reverse('products_api:api_upload_session_create'), {'filename': 'anillo.png', 'size': size}, format='json'
+        ).json()['id']
+        url = reverse('products_api:api_upload_session_detail', kwargs={'session_id': session_id})
+        half = size // 2
+        client.put(url, self.png[:half], content_type='application/octet-stream',
+                   HTTP_CONTENT_RANGE=f'bytes 0-{half - 1}/{size}')
+
+        # Another worker: nothing in its cache or temporary directory
+        cache.clear()
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(session.offset, half)
+        self.assertTrue(session.chunks[0].startswith(CHUNK_PREFIX) and default_storage.exists(session.chunks[0]))
+        response = client.put(url, self.png[half:], content_type='application/octet-stream',
+                              HTTP_CONTENT_RANGE=f'bytes {half}-{size - 1}/{size}')
+        self.assertEqual(response.json()['offset'], size)
+
+        self.assertEqual(client.post(f'{url}complete/', format='json').status_code, 201)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(any(default_storage.exists(name) for name in session.chunks))
+        self.assertEqual(client.post(f'{url}complete/', format='json').status_code, 404)
+
+    def test_invalid_form_leaves_no_file(self):
+        """Test that a streamed file is removed when its form is rejected."""
+        client = Client()
+        client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(reverse('products:image_upload'), {
+                'title': 'x' * 300,
+                'image': SimpleUploadedFile('anillo.png', self.png, content_type='image/png'),
+            })
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertEqual(list(iter_storage_names(default_storage, ImageBlob.PREFIX)), [])
+
+    def test_chunked_upload_requires_staff(self):
+        """Test that chunked uploads are limited to admin users."""
+        self.user.is_staff = False
+        self.user.save()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            reverse('products_api:api_upload_session_create'), {'filename': 'a.png', 'size': 10}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_streamed_writes_are_timed(self):
+        """Test that local and S3 streams report their writes to storage_metrics."""
+        storage_metrics.reset()
+        self.addCleanup(storage_metrics.reset)
+        store_stream(BytesIO(self.png), 'uploads/anillo.png', 'image/png', InstrumentedFileSystemStorage())
+
+        storage = InstrumentedS3Storage(
+            bucket_name='catalogo', access_key='test', secret_key='test', region_name='us-east-1'
+        )
+        stubber = Stubber(storage.connection.meta.client)
+        stubber.add_response('put_object', {})
+        stubber.add_response('create_multipart_upload', {'UploadId': 'u1'})
+        stubber.add_response('upload_part', {'ETag': '"e1"'})
+        stubber.add_response('complete_multipart_upload', {})
+        with stubber:
+            store_stream(BytesIO(b'pequeno'), 'uploads/a.png', 'image/png', storage)
+            with mock.patch.object(uploads, 'S3_PART_SIZE', 4):
+                store_stream(BytesIO(b'0123456789'), 'uploads/b.png', 'image/png', storage)
+            stubber.assert_no_pending_responses()
+
+        save = storage_metrics.snapshot()['operations']['save']
+        # Local file, S3 PUT, one part and the multipart completion
+        self.assertEqual(save['count'], 4)
+        self.assertEqual(save['bytes'], len(self.png) + len(b'pequeno') + 10)
+
+
+class ImageBlobTestCase(TestCase):
+    """Test the content-addressed image store."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, IMAGE_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        self.client.force_login(self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), (200, 40, 90)).save(buffer, 'PNG')
+        self.png = buffer.getvalue()
+
+    def upload(self, filename):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('products:image_upload'), {
+                'image': SimpleUploadedFile(filename, self.png, content_type='image/png'),
+            })
+        return ImageUpload.objects.latest('pk')
+
+    def test_identical_uploads_share_one_blob(self):
+        """Test that uploading the same bytes twice stores a single file."""
+        first = self.upload('anillo.png')
+        second = self.upload('anillo_copia.png')
+
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(second.title, 'Anillo Copia')
+        directories, files = default_storage.listdir(blob.name.rsplit('/', 1)[0])
+        self.assertEqual([name for name in files if '__' not in name], [blob.name.rsplit('/', 1)[1]])
+
+    def test_delete_releases_reference_and_gc_removes_blob(self):
+        """Test that deleting uploads only releases the blob until garbage collection."""
+        upload = self.upload('anillo.png')
+        blob = upload.blob
+        self.client.post(reverse('products:image_delete', kwargs={'image_id': upload.pk}))
+
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertTrue(default_storage.exists(blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = collect_garbage(grace=timedelta(0))
+        self.assertEqual(stats['blobs_deleted'], 1)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_gc_keeps_blob_acquired_during_collection(self):
+        """Test that a blob referenced again after being listed keeps its row and its files."""
+        upload = self.upload('anillo.png')
+        blob = upload.blob
+        upload.delete()
+
+        def acquire_meanwhile(names):
+            acquire_blob(blob.pk)
+            return set()
+
+        with mock.patch('products.blobs._referenced_by_products', side_effect=acquire_meanwhile), \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = collect_garbage(grace=timedelta(0))
+        self.assertEqual(stats['blobs_deleted'], 0)
+        self.assertTrue(ImageBlob.objects.filter(pk=blob.pk).exists())
+        self.assertTrue(default_storage.exists(blob.name))
+
+    def test_gc_keeps_blobs_used_by_products(self):
+        """Test that a blob referenced by a product image survives garbage collection."""
+        upload = self.upload('anillo.png')
+        blob = upload.blob
+        Product.objects.create(name='Anillo', price=Decimal('10.00'), stock=1, image=blob.name)
+        upload.delete()
+
+        collect_garbage(grace=timedelta(0))
+        self.assertTrue(ImageBlob.objects.filter(pk=blob.pk).exists())
+        self.assertTrue(default_storage.exists(blob.name))
+
+    def test_gc_removes_orphan_files(self):
+        """Test that files under the blob prefix without a row are removed."""
+        orphan = default_storage.save(f'{ImageBlob.PREFIX}ff/ff/{"f" * 64}.png', SimpleUploadedFile('x.png', self.png))
+
+        self.assertEqual(collect_garbage(grace=timedelta(hours=1))['orphans_deleted'], 0)
+        stats = collect_garbage(grace=timedelta(0))
+        self.assertEqual(stats['orphans_deleted'], 1)
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_gc_on_s3_uses_listing_dates(self):
+        """Test that orphan ages on S3 come from the listing, without a HEAD per object."""
+        storage = InstrumentedS3Storage(
+            bucket_name='catalogo', access_key='test', secret_key='test', region_name='us-east-1'
+        )
+        now = timezone.now()
+        stubber = Stubber(storage.connection.meta.client)
+        stubber.add_response('list_objects', {'IsTruncated': False, 'Contents': [
+            {'Key': f'{ImageBlob.PREFIX}aa/aa/{"a" * 64}.png', 'LastModified': now - timedelta(days=2)},
+            {'Key': f'{ImageBlob.PREFIX}bb/bb/{"b" * 64}.png', 'LastModified': now},
+        ]})
+        stubber.add_response(
+            'delete_objects', {},
+            {'Bucket': 'catalogo', 'Delete': {'Objects': [{'Key': f'{ImageBlob.PREFIX}aa/aa/{"a" * 64}.png'}], 'Quiet': True}},
+        )
+        with stubber:
+            stats = collect_garbage(grace=timedelta(hours=24), storage=storage)
+            stubber.assert_no_pending_responses()
+        self.assertEqual((stats['files_scanned'], stats['orphans_deleted']), (2, 1))
+
+
+class ImageListTestCase(TestCase):
+    """Test the uploaded image gallery."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for index in range(30):
+            ImageUpload.objects.create(
+                title=f'Imagen {index}', image=f'uploads/{index}.png',
+                description='collar de perlas' if index % 10 == 0 else '',
+            )
+        ImageUpload.objects.filter(pk__in=ImageUpload.objects.order_by('pk').values('pk')[:10]).update(
+            uploaded_at=now - timedelta(days=30)
+        )
+
+    def test_stats_use_one_cached_aggregate(self):
+        """Test that the list renders with one stats query, cached until an upload changes."""
+        cache.clear()
+        response = self.client.get(reverse('products:image_list'))
+        self.assertEqual(response.context['total_images'], 30)
+        self.assertEqual(response.context['recent_uploads'], 20)
+
+        # Session, user, cart (context processor) and the page itself
+        with self.assertNumQueries(4):
+            self.client.get(reverse('products:image_list'))
+
+        ImageUpload.objects.create(title='Nueva', image='uploads/nueva.png')
+        self.assertEqual(self.client.get(reverse('products:image_list')).context['total_images'], 31)
+
+    def test_cursor_pagination_walks_all_images(self):
+        """Test that next/previous cursors visit every image once, newest first."""
+        seen = []
+        response = self.client.get(reverse('products:image_list'))
+        while True:
+            page = response.context['page_obj']
+            seen.extend(image.pk for image in page)
+            if not page.has_next:
+                break
+            response = self.client.get(reverse('products:image_list'), {'cursor': page.next_cursor})
+
+        expected = list(ImageUpload.objects.order_by('-uploaded_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(reverse('products:image_list'), {'cursor': page.previous_cursor})
+        self.assertEqual([image.pk for image in previous.context['page_obj']], expected[12:24])
+
+    def test_search_and_invalid_cursor(self):
+        """Test that search filters title/description and a bad cursor shows the first page."""
+        response = self.client.get(reverse('products:image_list'), {'q': 'perlas'})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+        response = self.client.get(reverse('products:image_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous)
+
+    def test_mysql_search_keeps_prefix_and_short_matches(self):
+        """Test that MySQL searches prefixes in boolean mode and short words with icontains."""
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            full_text = str(search_images(ImageUpload.objects.all(), 'perl coll').query)
+            short = str(search_images(ImageUpload.objects.all(), 'de').query)
+        self.assertIn('IN BOOLEAN MODE', full_text)
+        self.assertIn('+perl* +coll*', full_text)
+        self.assertNotIn('MATCH', short)
+        self.assertIn('LIKE', short)
+
+    def test_postgresql_search_matches_prefixes(self):
+        """Test that PostgreSQL searches every word as an escaped tsquery prefix."""
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            full_text = str(search_images(ImageUpload.objects.all(), "anil & o'luna!").query)
+            symbols = str(search_images(ImageUpload.objects.all(), '&|!').query)
+        self.assertIn("to_tsquery('simple', anil:* & o:* & luna:*)", full_text)
+        self.assertIn('LIKE', symbols)
+
+
+@override_settings(STORAGE_PROBE_IN_PROCESS=False)
+class StorageProbeTestCase(TestCase):
+    """Test the background storage probe and the diagnostic page."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_probe_records_latency_per_operation(self):
+        """Test that a probe times every operation and leaves no file behind."""
+        result = storage_probe.run_probe()
+        self.assertEqual(result['status'], 'healthy')
+        self.assertEqual(set(result['operations']), set(storage_probe.OPERATIONS))
+        self.assertEqual(default_storage.listdir(storage_probe.PROBE_PREFIX)[1], [])
+
+        storage_probe.run_probe()
+        series = storage_probe.get_probe_series()
+        self.assertEqual(len(series), 2)
+        self.assertIn('put', series[-1])
+        self.assertEqual(get_system_health()['storage']['status'], 'healthy')
+
+    def test_diagnostic_page_reads_cached_probe(self):
+        """Test that the page renders the cached result without probing the storage."""
+        user = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        self.client.force_login(user)
+        response = self.client.get(reverse('products:s3_diagnostic'))
+        self.assertEqual(response.context['diagnostic_info']['status'], 'unknown')
+        self.assertIsNone(storage_probe.get_latest_probe())
+
+        storage_probe.run_probe()
+        response = self.client.get(reverse('products:s3_diagnostic'))
+        self.assertEqual(response.context['diagnostic_info']['status'], 'healthy')
+        self.assertContains(response, 'Subida (put)')
+        self.assertEqual(len(storage_probe.get_probe_series()), 1)
+
+    async def test_diagnostic_page_under_asgi(self):
+        """Test that the async page and health check serve through the ASGI handler and middleware."""
+        user = await get_user_model().objects.acreate_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('products:s3_diagnostic'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['diagnostic_info']['user'], 'admin')
+
+        response = await self.async_client.get(reverse('health_check'))
+        self.assertIn(response.status_code, (200, 503))
+        self.assertIn('database', response.json())
+
+
+class QueryPlanTestCase(TestCase):
+    """Test the index plan and the explain_queries command."""
+
+    def test_listing_queries_use_indexes(self):
+        """Test that no view query scans a whole table on the test database."""
+        out = StringIO()
+        call_command('explain_queries', fail_on_scan=True, stdout=out)
+        self.assertNotIn('full scan', out.getvalue())
+
+    def test_find_sequential_scans_per_backend(self):
+        """Test that full scans are recognised in PostgreSQL, MySQL and SQLite plans."""
+        postgres = 'Sort\n  ->  Seq Scan on products_product\n        Filter: available'
+        mysql = '{"query_block": {"table": {"table_name": "orders_order", "access_type": "ALL"}}}'
+        sqlite = '2 0 0 SCAN products_category\n4 0 0 SCAN products_product USING INDEX product_available_recent_idx'
+        self.assertEqual(find_sequential_scans(postgres, 'postgresql'), ['products_product'])
+        self.assertEqual(find_sequential_scans(mysql, 'mysql'), ['orders_order'])
+        self.assertEqual(find_sequential_scans(sqlite, 'sqlite'), ['products_category'])
+
+    def test_mysql_gets_composite_indexes(self):
+        """Test that MySQL gets (available, ...) indexes instead of the partial ones."""
+        migration = importlib.import_module('products.migrations.0006_query_indexes')
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = 'mysql'
+        migration.create_mysql_indexes(None, schema_editor)
+        statements = [call.args[0] for call in schema_editor.execute.call_args_list]
+        self.assertEqual(len(statements), len(migration.MYSQL_INDEXES))
+        self.assertTrue(all('ON products_product (available,' in sql for sql in statements))
+
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = 'sqlite'
+        migration.create_mysql_indexes(None, schema_editor)
+        schema_editor.execute.assert_not_called()
+
+
+class FacetCountTestCase(CatalogTestMixin, TestCase):
+    """Test the denormalized facet counters."""
+
+    def counts(self):
+        cache.clear()
+        return get_facet_counts()
+
+    def test_cached_counts_expire_in_per_process_cache(self):
+        """Test that a worker whose cache was not invalidated picks up changes within LOCAL_CACHE_TIMEOUT."""
+        self.assertEqual(self.counts()['all'], 1)
+        # Changed by another worker: this one's cache still holds the old counts
+        FacetCount.objects.filter(facet='all').update(count=5)
+        self.assertEqual(get_facet_counts()['all'], 1)
+
+        later = time.time() + settings.LOCAL_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(get_facet_counts()['all'], 5)
+
+    def test_counts_follow_product_changes(self):
+        """Test that saves and deletes move products between counters."""
+        counts = self.counts()
+        self.assertEqual(counts['all'], 1)
+        self.assertEqual(counts['category'], {self.category.pk: 1})
+        self.assertEqual(counts['jewelry_type'], {'ring': 1})
+
+        other = Category.objects.create(name='Collares', slug='collares')
+        self.product.category = other
+        self.product.jewelry_type = 'necklace'
+        self.product.save()
+        counts = self.counts()
+        self.assertEqual(counts['category'], {other.pk: 1})
+        self.assertEqual(counts['jewelry_type'], {'necklace': 1})
+
+        self.product.available = False
+        self.product.save()
+        self.assertEqual(self.counts()['all'], 0)
+
+        self.product.available = True
+        self.product.save()
+        self.product.delete()
+        counts = self.counts()
+        self.assertEqual(counts['all'], 0)
+        self.assertEqual(counts['material'], {})
+
+    def test_bulk_availability_counts_only_changed_rows(self):
+        """Test that the admin bulk actions keep the counters in step."""
+        Product.objects.create(
+            name='Aretes', slug='aretes', description='Aretes', price=Decimal('20.00'),
+            jewelry_type='earring', material='metal', category=self.category, available=False,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            updated = update_products(Product.objects.all(), available=True)
+        self.assertEqual(updated, 1)
+        self.assertEqual(get_facet_counts()['category'], {self.category.pk: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_products(Product.objects.filter(slug='aretes'), available=False)
+        counts = get_facet_counts()
+        self.assertEqual(counts['all'], 1)
+        self.assertEqual(counts['jewelry_type'], {'ring': 1})
+
+    def test_category_api_reads_counters(self):
+        """Test that the category API counts come from the counters."""
+        for name in ('Collares', 'Pulseras', 'Tiaras'):
+            Category.objects.create(name=name, slug=name.lower())
+        self.counts()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('products_api:api_category_list'))
+        self.assertFalse([q for q in queries if 'FROM "products_product"' in q['sql']])
+        results = response.json()
+        results = {row['slug']: row['products_count'] for row in results.get('results', results)}
+        self.assertEqual(results, {'anillos': 1, 'collares': 0, 'pulseras': 0, 'tiaras': 0})
+
+    def test_reconcile_command_fixes_drift(self):
+        """Test that reconcile_facet_counts repairs counters that drifted."""
+        FacetCount.objects.filter(facet='all').update(count=7)
+        Product.objects.filter(pk=self.product.pk).update(material='glass')
+
+        out = StringIO()
+        call_command('reconcile_facet_counts', dry_run=True, stdout=out)
+        self.assertIn('Found 3 drifted counters', out.getvalue())
+        self.assertEqual(FacetCount.objects.get(facet='all').count, 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_facet_counts', stdout=StringIO())
+        counts = get_facet_counts()
+        self.assertEqual(counts['all'], 1)
+        self.assertEqual(counts['material'], {'glass': 1})
+
+
+class BulkProductChangeTestCase(CatalogTestMixin, TestCase):
+    """Test bulk product changes and their batched invalidation."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = Product.objects.create(
+            name='Collar de Perlas', slug='collar-de-perlas', description='Collar', price=Decimal('80.00'),
+            jewelry_type='necklace', material='pearl', category=self.category, stock=3,
+        )
+        self.events = []
+        handler = lambda sender, **kwargs: self.events.append(kwargs)
+        products_changed.connect(handler)
+        self.addCleanup(products_changed.disconnect, handler)
+
+    def test_update_products_sends_one_event(self):
+        """Test that a bulk update is one UPDATE and one invalidation event."""
+        detail_key = f'product_detail_{self.product.id}_{self.product.slug}'
+        cache.set(detail_key, 'stale')
+        cache.set('products_list_anillos', 'stale')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                updated = update_products(Product.objects.all(), available=False)
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual((updated, len(updates)), (2, 1))
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.events[0]['product_ids'], {self.product.pk, self.other.pk})
+        self.assertEqual(self.events[0]['category_ids'], {self.category.pk})
+        self.assertIsNone(cache.get(detail_key))
+        self.assertIsNone(cache.get('products_list_anillos'))
+        self.assertEqual(get_facet_counts()['all'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_products(Product.objects.all(), available=False), 0)
+        self.assertEqual(len(self.events), 1)
+
+    def test_save_products_writes_edited_rows(self):
+        """Test that per-row edits are written with one bulk_update."""
+        self.product.price = Decimal('50.00')
+        self.other.available = False
+        with self.captureOnCommitCallbacks(execute=True):
+            save_products([self.product, self.other], ['price', 'available'])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).price, Decimal('50.00'))
+        self.assertEqual(get_facet_counts()['material'], {'metal': 1})
+        self.assertEqual(len(self.events), 1)
+
+    def test_admin_list_editable_uses_one_statement(self):
+        """Test that saving the admin change list updates all rows at once."""
+        get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        client = Client()
+        client.login(username='admin', password='secret')
+        rows = [self.other, self.product]  # admin ordering: newest first
+        data = {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '2', 'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000', '_save': 'Guardar',
+        }
+        for index, product in enumerate(rows):
+            data.update({
+                f'form-{index}-id': str(product.pk),
+                f'form-{index}-price': '99.00',
+                f'form-{index}-stock': str(product.stock),
+                f'form-{index}-available': 'on',
+            })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(reverse('admin:products_product_changelist'), data)
+        self.assertEqual(response.status_code, 302)
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Product.objects.values_list('price', flat=True)), {Decimal('99.00')})
+        self.assertEqual(len(self.events), 1)
+
+
+class ProductExportTestCase(CatalogTestMixin, TestCase):
+    """Test the streaming product exports."""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(
+            name='Collar "Luna", perlas', slug='collar-luna', description='Collar', price=Decimal('80.00'),
+            jewelry_type='necklace', material='pearl', available=False,
+        )
+
+    def export(self, fmt, chunk_size=1):
+        exporter = ProductExporter(Product.objects.all(), fmt, chunk_size)
+        return exporter, ''.join(exporter)
+
+    def test_csv_uses_labels(self):
+        """Test that the CSV has Spanish headers, display labels and quoting."""
+        exporter, body = self.export('csv')
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(exporter.rows, 2)
+        self.assertEqual(rows[0][:2], ['ID', 'Nombre'])
+        self.assertEqual(rows[1][1:], ['Anillo de Plata', 'anillo-de-plata', 'Anillos', 'Ring', 'Metal', '45.00', '10', 'Sí'])
+        self.assertEqual(rows[2][1], 'Collar "Luna", perlas')
+        self.assertEqual(rows[2][-1], 'No')
+
+    def test_pages_by_primary_key(self):
+        """Test that each chunk is its own query after the last exported pk."""
+        with CaptureQueriesContext(connection) as queries:
+            exporter, body = self.export('jsonl')
+        self.assertEqual(exporter.rows, 2)
+        self.assertEqual(len(queries), 3)
+        self.assertIn(f'> {self.product.pk}', queries[1]['sql'])
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_jsonl_and_compact(self):
+        """Test that the JSON formats hold the stored values, one product per line."""
+        _, body = self.export('jsonl')
+        first = json.loads(body.splitlines()[0])
+        self.assertEqual(first['jewelry_type'], 'ring')
+        self.assertEqual(first['price'], '45.00')
+        self.assertIs(first['available'], True)
+
+        _, body = self.export('compact', chunk_size=10)
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(dict(zip(lines[0], lines[2]))['category__name'], None)
+
+    def test_admin_action_streams(self):
+        """Test that the admin CSV action returns a streaming response."""
+        get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        client = Client()
+        client.login(username='admin', password='secret')
+        response = client.post(reverse('admin:products_product_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.product.pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('productos.csv', response['Content-Disposition'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_export_products_command(self):
+        """Test that export_products writes the file and reports the rate."""
+        path = os.path.join(tempfile.mkdtemp(), 'catalogo.jsonl')
+        out = StringIO()
+        call_command('export_products', format='jsonl', output=path, available_only=True, stdout=out)
+        with open(path, encoding='utf-8') as export:
+            self.assertEqual(len(export.readlines()), 1)
+        self.assertIn('Exported 1 products', out.getvalue())
+
+
+class ProductImportTestCase(CatalogTestMixin, TestCase):
+    """Test the bulk product import."""
+
+    def setUp(self):
+        super().setUp()
+        self.events = []
+        handler = lambda sender, **kwargs: self.events.append(kwargs)
+        products_changed.connect(handler)
+        self.addCleanup(products_changed.disconnect, handler)
+
+    def run_import(self, text, fmt='csv', **kwargs):
+        importer = ProductImporter(StringIO(text), fmt=fmt, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.run()
+        return importer
+
+    def test_csv_creates_and_updates_by_slug(self):
+        """Test that rows upsert by slug and only the given columns change."""
+        importer = self.run_import(
+            'name,slug,description,price,jewelry_type,material,category,stock\n'
+            'Anillo de Plata,anillo-de-plata,Nuevo texto,50.00,ring,metal,anillos,4\n'
+            'Collar Luna,,Collar de perlas,80.00,Necklace,Pearl,Anillos,2\n'
+            'Collar Luna,,Otro collar,70.00,necklace,pearl,,1\n'
+        )
+        self.assertEqual(importer.stats, {**importer.stats, 'rows': 3, 'created': 2, 'updated': 1, 'failed': 0})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.description, self.product.price), ('Nuevo texto', Decimal('50.00')))
+        collar = Product.objects.get(slug='collar-luna')
+        self.assertEqual((collar.jewelry_type, collar.category), ('necklace', self.category))
+        self.assertTrue(Product.objects.filter(slug='collar-luna-2', category=None).exists())
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(get_facet_counts()['category'], {self.category.pk: 2})
+
+        self.run_import('slug,name,description,price\ncollar-luna,Collar Luna,Collar,90.00\n')
+        collar.refresh_from_db()
+        self.assertEqual((collar.price, collar.stock, collar.category), (Decimal('90.00'), 2, self.category))
+
+    def test_upsert_without_conflict_target(self):
+        """Test that backends without ON CONFLICT targets (MySQL) upsert without unique_fields."""
+        with mock.patch.object(type(connection.features), 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(Product.objects, 'bulk_create') as bulk_create:
+            self.run_import('slug,name,description,price\nanillo-de-oro,Anillo de Oro,Texto,50.00\n')
+        self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+        self.assertNotIn('unique_fields', bulk_create.call_args.kwargs)
+
+    def test_partial_columns_update_existing_products(self):
+        """Test that a file with only some columns updates those and leaves the rest stored."""
+        importer = self.run_import('slug,stock\nanillo-de-plata,3\nnuevo-anillo,5\n')
+        self.assertEqual(importer.stats, {**importer.stats, 'rows': 2, 'updated': 1, 'failed': 1})
+        self.assertIn('price', importer.errors[0][1])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price), (3, Decimal('45.00')))
+        self.assertEqual(self.product.name, 'Anillo de Plata')
+
+    def test_invalid_rows_are_reported(self):
+        """Test that invalid rows fail with their line numbers and the rest is imported."""
+        importer = self.run_import(
+            '{"name": "Pulsera", "description": "Pulsera", "price": "-1"}\n'
+            '{"name": "Tiara", "description": "Tiara", "price": 30, "category": "coronas"}\n'
+            'no es json\n'
+            '{"name": "Broche", "description": "Broche", "price": 12.5, "available": false}\n'
+            '{"name": "Otro", "slug": "broche", "description": "Broche", "price": 10}\n',
+            fmt='jsonl',
+        )
+        self.assertEqual([line for line, _ in importer.errors], [1, 2, 3, 5])
+        self.assertIn('price', importer.errors[0][1])
+        self.assertIn('coronas', importer.errors[1][1])
+        self.assertFalse(Product.objects.get(slug='broche').available)
+        self.assertEqual(get_facet_counts()['all'], 1)
+
+    def test_export_imports_back(self):
+        """Test that the exported CSV imports without changes."""
+        body = ''.join(ProductExporter(Product.objects.all(), 'csv'))
+        importer = self.run_import(body, dry_run=True)
+        self.assertEqual((importer.stats['updated'], importer.stats['failed']), (1, 0))
+        self.assertEqual(self.events, [])
+
+        self.run_import(body)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.jewelry_type, self.product.stock), ('ring', 10))
+
+    def test_command_and_admin_upload(self):
+        """Test the import_products command and the admin upload view."""
+        path = os.path.join(tempfile.mkdtemp(), 'productos.csv')
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write('name,description,price\nAretes,Aretes,20\n')
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_products', path, stdout=out)
+        self.assertIn('Imported 1 products (1 new', out.getvalue())
+
+        get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        client = Client()
+        client.login(username='admin', password='secret')
+        upload = SimpleUploadedFile('productos.jsonl', b'{"name": "Tiara", "description": "Tiara", "price": 30}\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('admin:products_product_import'), {'file': upload, 'format': 'jsonl'})
+        self.assertRedirects(response, reverse('admin:products_product_changelist'), fetch_redirect_response=False)
+        self.assertTrue(Product.objects.filter(slug='tiara').exists())
+
+
+class SampleDataTestCase(TestCase):
+    """Test the synthetic data generator behind create_sample_data."""
+
+    def generate(self, **options):
+        call_command('create_sample_data', stdout=StringIO(), **options)
+
+    def test_generates_consistent_history(self):
+        """Test that products, customers, orders and carts are created with their counters in step."""
+        self.generate(products=300, users=40, orders=500, carts=10, seed=7)
+        self.assertEqual(Product.objects.filter(slug__startswith='muestra-').count(), 300)
+        self.assertEqual(get_user_model().objects.filter(username__startswith='cliente').count(), 40)
+        self.assertEqual(Order.objects.count(), 500)
+        self.assertEqual(Cart.objects.filter(items__isnull=False).distinct().count(), 10)
+
+        ring_prices = Product.objects.filter(slug__startswith='muestra-', jewelry_type='ring', material='resin')
+        for price in ring_prices.values_list('price', flat=True):
+            self.assertTrue(Decimal('9') <= price <= Decimal('240'))
+        oldest = Order.objects.order_by('created_at').first()
+        self.assertLess(oldest.created_at, timezone.now() - timedelta(days=30))
+        self.assertIn(oldest.status, ('delivered', 'cancelled'))
+
+        # Popularity is skewed: the best seller sells far more than the median product
+        sales = list(
+            Product.objects.annotate(sold=Count('orderitem')).filter(sold__gt=0).order_by('-sold')
+            .values_list('sold', flat=True)
+        )
+        self.assertGreater(sales[0], 5 * sales[len(sales) // 2])
+
+        self.assertEqual(reconcile(dry_run=True), {})
+        self.assertEqual(sum(SalesRollup.objects.filter(period='day').values_list('orders', flat=True)), 500)
+
+    def test_generates_history_without_bulk_insert_returning(self):
+        """Test orders and carts on backends that do not return pks from bulk inserts (MySQL)."""
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.generate(products=30, users=10, orders=40, carts=5, seed=2)
+        self.assertEqual(Order.objects.filter(items__isnull=False).distinct().count(), 40)
+        self.assertEqual(Cart.objects.filter(items__isnull=False).distinct().count(), 5)
+        self.assertLess(Order.objects.order_by('created_at').first().created_at, timezone.now() - timedelta(days=7))
+        self.assertTrue(Order._meta.get_field('created_at').auto_now_add)
+
+    def test_same_seed_same_data(self):
+        """Test that the seed makes the data reproducible and reruns add rows instead of clashing."""
+        self.generate(products=50, seed=3)
+        first = list(Product.objects.filter(slug__startswith='muestra-').order_by('pk').values_list('name', 'price'))
+        Product.objects.filter(slug__startswith='muestra-').delete()
+        self.generate(products=50, seed=3)
+        again = list(Product.objects.filter(slug__startswith='muestra-').order_by('pk').values_list('name', 'price'))
+        self.assertEqual(first, again)
+
+        self.generate(products=20, seed=3)
+        self.assertEqual(Product.objects.filter(slug__startswith='muestra-').count(), 70)
+
+
+class ImageImportTestCase(TestCase):
+    """Test the import_images management command."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.source = os.path.join(source.name, 'proveedor')
+        os.makedirs(os.path.join(self.source, 'aretes'))
+        self.images = {}
+        for name, color in (('anillo_oro.png', (200, 160, 40)), ('aretes/perla.png', (240, 240, 230))):
+            buffer = BytesIO()
+            Image.new('RGB', (400, 300), color).save(buffer, 'PNG')
+            self.images[name] = buffer.getvalue()
+        self.images['aretes/perla_copia.png'] = self.images['aretes/perla.png']
+        self.images['notas.png'] = b'no es una imagen'
+        for name, content in self.images.items():
+            with open(os.path.join(self.source, name), 'wb') as image:
+                image.write(content)
+
+    def run_import(self, source, **options):
+        out = StringIO()
+        call_command('import_images', source, workers=2, batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_directory_deduplicates_and_resumes(self):
+        """Test that a folder is imported once, sharing blobs, and a rerun skips it."""
+        output = self.run_import(self.source)
+        self.assertIn('Imported 3 images (1 duplicates, 0 already imported, 1 failed)', output)
+
+        uploads = ImageUpload.objects.select_related('blob')
+        self.assertEqual(uploads.count(), 3)
+        self.assertEqual(ImageBlob.objects.count(), 2)
+        self.assertEqual(ImageBlob.objects.get(uploads__title='Perla Copia').ref_count, 2)
+        for upload in uploads:
+            self.assertEqual(upload.derivatives['source'], upload.image.name)
+            with default_storage.open(upload.image.name) as stored:
+                self.assertIn(stored.read(), self.images.values())
+
+        output = self.run_import(self.source)
+        self.assertIn('Imported 0 images (0 duplicates, 3 already imported, 1 failed)', output)
+        self.assertEqual(ImageUpload.objects.count(), 3)
+
+    def test_import_without_bulk_insert_returning(self):
+        """Test that rows get their pks on backends that do not return them from bulk inserts (MySQL)."""
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.run_import(self.source)
+        self.assertEqual(ImageUpload.objects.filter(derivatives={}).count(), 0)
+        with open(f'{self.source}.import-manifest.jsonl') as lines:
+            imported = [json.loads(line) for line in lines]
+        self.assertEqual(
+            sorted(row['upload'] for row in imported), sorted(ImageUpload.objects.values_list('pk', flat=True))
+        )
+
+    def test_import_zip_archive(self):
+        """Test importing from a zip archive with a custom manifest."""
+        archive_path = f'{self.source}.zip'
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.writestr('anillo_oro.png', self.images['anillo_oro.png'])
+            archive.writestr('__MACOSX/._anillo_oro.png', b'metadata')
+        manifest = f'{self.source}.json'
+
+        self.run_import(archive_path, manifest=manifest, no_derivatives=True)
+        upload = ImageUpload.objects.get()
+        self.assertEqual(upload.title, 'Anillo Oro')
+        self.assertEqual(upload.derivatives, {})
+        with open(manifest) as lines:
+            self.assertIn('"entry": "anillo_oro.png"', lines.read())
+
+
+class PresignedUploadTestCase(TestCase):
+    """Test direct-to-storage uploads with the local signer."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='testpass123', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), (200, 30, 30)).save(buffer, 'JPEG')
+        self.jpeg = buffer.getvalue()
+
+    def _upload(self, body, **extra):
+        response = self.client.post(reverse('products_api:api_presigned_upload_create'), dict(
+            {'filename': 'aretes.jpg', 'content_type': 'image/jpeg'}, **extra
+        ), format='json')
+        self.assertEqual(response.status_code, 201)
+        issued = response.json()
+        upload = issued['upload']
+        response = APIClient().put(upload['url'], body, content_type=upload['headers']['Content-Type'])
+        return issued, response
+
+    def test_upload_registers_image(self):
+        """Test the full flow: ticket, direct PUT, completion."""
+        issued, response = self._upload(self.jpeg)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            reverse('products_api:api_presigned_upload_complete'),
+            {'ticket': issued['ticket'], 'title': 'Aretes'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        upload = ImageUpload.objects.get(pk=response.json()['id'])
+        self.assertEqual(upload.title, 'Aretes')
+        self.assertTrue(upload.image.name.startswith('uploads/direct/'))
+        with default_storage.open(upload.image.name) as stored:
+            self.assertEqual(stored.read(), self.jpeg)
+
+    def test_upload_sets_product_image(self):
+        """Test that product tickets update the product image."""
+        product = Product.objects.create(
+            name='Aretes', slug='aretes', description='Aretes', price=Decimal('15.00'), stock=1
+        )
+        issued, _ = self._upload(self.jpeg, target='product', product_id=product.pk)
+        response = self.client.post(
+            reverse('products_api:api_presigned_upload_complete'), {'ticket': issued['ticket']}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        product.refresh_from_db()
+        self.assertEqual(product.image, response.json()['image'])
+
+    def test_upload_url_is_single_use(self):
+        """Test that a signed upload URL cannot overwrite an uploaded file."""
+        issued, _ = self._upload(self.jpeg)
+        response = APIClient().put(issued['upload']['url'], self.jpeg, content_type='image/jpeg')
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_images_are_rejected(self):
+        """Test that the stand-in signer refuses non-image bodies."""
+        _, response = self._upload(b'<html>not an image</html>')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_ticket_is_bound_to_user(self):
+        """Test that another user cannot complete someone else's upload."""
+        issued, _ = self._upload(self.jpeg)
+        other = get_user_model().objects.create_user(username='other', email='o@example.com', password='x', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post(
+            reverse('products_api:api_presigned_upload_complete'), {'ticket': issued['ticket']}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_ticket_is_single_use(self):
+        """Test that completing the same ticket twice registers the image once."""
+        issued, _ = self._upload(self.jpeg)
+        url = reverse('products_api:api_presigned_upload_complete')
+        self.assertEqual(self.client.post(url, {'ticket': issued['ticket']}, format='json').status_code, 201)
+        self.assertEqual(self.client.post(url, {'ticket': issued['ticket']}, format='json').status_code, 400)
+        self.assertEqual(ImageUpload.objects.count(), 1)
+
+    def test_direct_uploads_require_staff(self):
+        """Test that customers can neither request upload targets nor register uploads."""
+        issued, _ = self._upload(self.jpeg, target='product')
+        customer = get_user_model().objects.create_user(username='cliente', email='c@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(customer)
+        response = client.post(reverse('products_api:api_presigned_upload_create'), {
+            'filename': 'aretes.jpg', 'content_type': 'image/jpeg',
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = client.post(
+            reverse('products_api:api_presigned_upload_complete'), {'ticket': issued['ticket']}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_product_form_stores_posted_file(self):
+        """Test that the product form still accepts a posted file without JavaScript."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('products:product_create'), {
+            'name': 'Broche', 'description': 'Broche', 'price': '25.00', 'jewelry_type': 'brooch',
+            'material': 'metal', 'stock': 3, 'available': 'on',
+            'image': SimpleUploadedFile('broche.jpg', self.jpeg, content_type='image/jpeg'),
+        })
+        product = Product.objects.get(slug='broche')
+        self.assertTrue(default_storage.exists(product.image))
@@ -0,0 +1,508 @@
+"""
+Streaming image uploads.
+
+``ImageStreamWriter`` validates the magic bytes, hashes and streams an image
+to the default storage in a single pass with bounded memory: local storage
+gets a temporary file renamed into place, S3 gets a multipart upload. It
+backs both ``StreamingImageUploadHandler`` (multipart form posts) and the
+resumable chunked-upload sessions used by the admin API.
+
+Streamed form uploads are stored while the request is parsed, before the
+form is validated: a view that rejects the form calls
+``discard_stored_upload`` so the file does not stay behind.
+"""
+import hashlib
+import os
+import tempfile
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from jewelry_catalog.storage import delete_many
+from .blobs import delete_unreferenced
+from .models import ImageBlob, ImageUpload, UploadSession
+import logging
+
+logger = logging.getLogger('image_upload')
+
+# Leading bytes of the accepted formats
+MAGIC_BYTES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+MAGIC_LENGTH = 12
+
+# S3 rejects multipart parts smaller than 5 MB (except the last one)
+S3_PART_SIZE = 5 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+SESSION_TIMEOUT = 24 * 60 * 60
+CHUNK_SIZE = 1024 * 1024
+CHUNK_PREFIX = 'uploads/chunks/'
+
+
+class InvalidImageUpload(Exception):
+    """Raised when an upload is not an accepted image."""
+
+
+def sniff_content_type(header):
+    """Return the image content type for the first bytes of a file, or None."""
+    for signature, content_type in MAGIC_BYTES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def get_max_upload_size():
+    return getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024)
+
+
+class StoredImageUpload(UploadedFile):
+    """
+    An uploaded image that is already in storage.
+
+    ``storage_name`` is the final name in the default storage; assigning it to
+    an ``ImageField`` stores the reference without copying the file again.
+    Content-addressed uploads also carry their ``ImageBlob`` in ``blob``, and
+    ``blob_created`` tells whether this upload stored it.
+    """
+
+    def __init__(self, storage_name, name, size, content_type, sha256, blob=None, blob_created=False):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.storage_name = storage_name
+        self.sha256 = sha256
+        self.blob = blob
+        self.blob_created = blob_created
+
+    def open(self, mode='rb'):
+        self.file = default_storage.open(self.storage_name, mode)
+        return self
+
+
+# Streams write to ``name`` (made unique with get_available_name) or, when
+# close() is given a final name, to exactly that name. Content-addressed
+# names are deterministic, so overwriting them is harmless. They bypass
+# Storage._save, so they report their writes to storage_metrics themselves.
+
+def _timed_save(storage, nbytes):
+    """Record a write of ``nbytes`` on instrumented storages (see jewelry_catalog.storage)."""
+    if hasattr(storage, '_timed'):
+        return storage._timed('save', nbytes)
+    return nullcontext()
+
+
+class _LocalStream:
+    """Write to a temporary file in the target directory and rename it into place."""
+
+    def __init__(self, storage, name, content_type):
+        self.storage = storage
+        self.name = name
+        directory = os.path.dirname(storage.path(name))
+        os.makedirs(directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def close(self, final_name=None):
+        with _timed_save(self.storage, self.size):
+            self.file.close()
+            name = final_name or self.storage.get_available_name(self.name)
+            os.makedirs(os.path.dirname(self.storage.path(name)), exist_ok=True)
+            os.chmod(self.tmp_path, self.storage.file_permissions_mode or 0o644)
+            os.replace(self.tmp_path, self.storage.path(name))
+        return name
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class _S3MultipartStream:
+    """Upload to S3 in parts, holding at most one part in memory."""
+
+    def __init__(self, storage, name, content_type, final_name_known=True):
+        self.storage = storage
+        # Multipart uploads need their key up front: a temporary one when the
+        # final (content-addressed) name is only known at close()
+        self.name = storage.get_available_name(name) if final_name_known else f'{name}.{uuid.uuid4().hex}.upload'
+        self.content_type = content_type
+        self.buffer = BytesIO()
+        self.upload = None
+        self.parts = []
+
+    def _object(self, name):
+        from storages.utils import clean_name
+
+        return self.storage.bucket.Object(self.storage._normalize_name(clean_name(name)))
+
+    def _params(self, name):
+        params = self.storage._get_write_parameters(name)
+        params['ContentType'] = self.content_type
+        return params
+
+    def write(self, data):
+        self.buffer.write(data)
+        if self.buffer.tell() >= S3_PART_SIZE:
+            self._flush_part()
+
+    def _flush_part(self):
+        body = self.buffer.getvalue()
+        with _timed_save(self.storage, len(body)):
+            if self.upload is None:
+                self.upload = self._object(self.name).initiate_multipart_upload(**self._params(self.name))
+            number = len(self.parts) + 1
+            response = self.upload.Part(number).upload(Body=body)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self.buffer = BytesIO()
+
+    def close(self, final_name=None):
+        name = final_name or self.name
+        if self.upload is None:
+            # Small file: a single PUT is cheaper than a multipart upload
+            body = self.buffer.getvalue()
+            with _timed_save(self.storage, len(body)):
+                self._object(name).put(Body=body, **self._params(name))
+            return name
+
+        if self.buffer.tell():
+            self._flush_part()
+        with _timed_save(self.storage, 0):
+            self.upload.complete(MultipartUpload={'Parts': self.parts})
+        if name != self.name:
+            # Server-side copy: the bytes do not pass through this process again
+            source = self._object(self.name)
+            self._object(name).copy_from(
+                CopySource={'Bucket': source.bucket_name, 'Key': source.key},
+                MetadataDirective='REPLACE', **self._params(name)
+            )
+            source.delete()
+        return name
+
+    def abort(self):
+        if self.upload is not None:
+            self.upload.abort()
+
+
+class _SpooledStream:
+    """Fallback for other storages: spool to disk past 1 MB, then ``storage.save``."""
+
+    def __init__(self, storage, name, content_type):
+        self.storage = storage
+        self.name = name
+        self.file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self, final_name=None):
+        self.file.seek(0)
+        try:
+            if final_name:
+                self.storage.delete(final_name)
+            return self.storage.save(final_name or self.name, File(self.file))
+        finally:
+            self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+def _open_stream(storage, name, content_type, final_name_known=True):
+    if hasattr(storage, 'bucket') and hasattr(storage, '_normalize_name'):
+        return _S3MultipartStream(storage, name, content_type, final_name_known)
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        return _SpooledStream(storage, name, content_type)
+    return _LocalStream(storage, name, content_type)
+
+
+def store_stream(source, name, content_type, storage=default_storage):
+    """Copy the file object ``source`` to exactly ``name`` through the streaming backends."""
+    stream = _open_stream(storage, name, content_type)
+    try:
+        for data in iter(lambda: source.read(READ_SIZE), b''):
+            stream.write(data)
+        return stream.close(name)
+    except Exception:
+        stream.abort()
+        raise
+
+
+class ImageStreamWriter:
+    """
+    Validate, hash and store an image as its bytes arrive.
+
+    The destination is opened once the magic bytes identify an accepted
+    format; anything else raises ``InvalidImageUpload`` before a byte is
+    stored. ``close()`` returns a ``StoredImageUpload``. ``name`` overrides
+    the storage name derived from ``ImageUpload.image``'s ``upload_to``.
+
+    With ``content_addressed`` the file is stored once per SHA-256 as an
+    ``ImageBlob``: bytes already in the store are discarded and the existing
+    blob is returned.
+    """
+
+    def __init__(self, filename, storage=default_storage, max_size=None, name=None, content_addressed=False):
+        self.filename = os.path.basename(filename)
+        self.name = name
+        self.content_addressed = content_addressed
+        self.storage = storage
+        self.max_size = max_size or get_max_upload_size()
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.header = b''
+        self.content_type = None
+        self.stream = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise InvalidImageUpload(
+                f"El archivo es demasiado grande. Máximo {self.max_size // (1024 * 1024)}MB."
+            )
+        self.hash.update(data)
+
+        if self.stream is None:
+            self.header += data
+            if len(self.header) < MAGIC_LENGTH:
+                return
+            self._open(self.header)
+            data, self.header = self.header, b''
+        self.stream.write(data)
+
+    def _open(self, header):
+        self.content_type = sniff_content_type(header)
+        if self.content_type is None:
+            raise InvalidImageUpload("Tipo de archivo no permitido. Use JPG, PNG, GIF o WebP.")
+        if self.content_addressed:
+            self.stream = _open_stream(
+                self.storage, ImageBlob.PREFIX + self.filename, self.content_type, final_name_known=False
+            )
+            return
+        name = self.name or ImageUpload._meta.get_field('image').generate_filename(None, self.filename)
+        self.stream = _open_stream(self.storage, name, self.content_type)
+
+    def close(self):
+        if self.stream is None:
+            # Fewer bytes than the magic header
+            self._open(self.header)
+            self.stream.write(self.header)
+        if self.content_addressed:
+            return self._close_blob()
+        storage_name = self.stream.close()
+        logger.info(
+            f"[UPLOAD] Streamed {self.filename} to {storage_name}: "
+            f"{self.size} bytes, {self.content_type}, sha256={self.hash.hexdigest()}"
+        )
+        return StoredImageUpload(storage_name, self.filename, self.size, self.content_type, self.hash.hexdigest())
+
+    def _close_blob(self):
+        sha256 = self.hash.hexdigest()
+        blob = ImageBlob.objects.filter(sha256=sha256).first()
+        created = blob is None
+        if blob is not None:
+            self.abort()
+            logger.info(f"[UPLOAD] {self.filename} is a duplicate of {blob.name}, {self.size} bytes not stored")
+        else:
+            name = self.stream.close(ImageBlob.build_name(sha256, self.content_type))
+            try:
+                with transaction.atomic():
+                    blob = ImageBlob.objects.create(
+                        sha256=sha256, name=name, size=self.size, content_type=self.content_type
+                    )
+            except IntegrityError:
+                # Same bytes stored concurrently; the file content is identical
+                blob = ImageBlob.objects.get(sha256=sha256)
+                created = False
+            logger.info(f"[UPLOAD] Stored {self.filename} as {name}: {self.size} bytes, {self.content_type}")
+        return StoredImageUpload(
+            blob.name, self.filename, self.size, self.content_type, sha256, blob=blob, blob_created=created
+        )
+
+    def abort(self):
+        if self.stream is not None:
+            self.stream.abort()
+            self.stream = None
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler streaming image fields straight to storage.
+
+    Install it as the only handler before ``request.POST``/``request.FILES``
+    are accessed. Other file fields are skipped. Validation failures are kept
+    in ``errors`` (by field name) so the view can report them; the rejected
+    file is left out of ``request.FILES``.
+    """
+
+    def __init__(self, request=None, field_names=('image',)):
+        super().__init__(request)
+        self.field_names = field_names
+        self.writer = None
+        self.errors = {}
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name not in self.field_names:
+            raise SkipFile()
+        self.writer = ImageStreamWriter(self.file_name, content_addressed=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.writer.write(raw_data)
+        except InvalidImageUpload as e:
+            self._reject(e)
+            raise SkipFile()
+        return None
+
+    def file_complete(self, file_size):
+        try:
+            return self.writer.close()
+        except InvalidImageUpload as e:
+            self._reject(e)
+            return None
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.abort()
+
+    def _reject(self, error):
+        self.writer.abort()
+        self.errors[self.field_name] = str(error)
+        logger.warning(f"[UPLOAD] Rejected streamed upload {self.file_name}: {error}")
+
+
+def discard_stored_upload(stored, storage=default_storage):
+    """
+    Remove a stored upload that will not be saved (e.g. its form was invalid).
+
+    A blob is only removed if this upload created it and nothing has
+    referenced it since; a duplicate of an existing blob leaves it alone.
+    """
+    if stored.blob is None:
+        storage.delete(stored.storage_name)
+    elif stored.blob_created:
+        delete_unreferenced([stored.blob.pk], storage=storage)
+    logger.info(f"[UPLOAD] Discarded unsaved upload {stored.name} ({stored.storage_name})")
+
+
+# Resumable chunked uploads. Sessions are UploadSession rows and every chunk
+# is stored as its own object under CHUNK_PREFIX in the default storage, so
+# consecutive chunks may reach different workers and a client can resume
+# from ``offset`` after a dropped connection. Completion streams the chunks
+# in order once through ImageStreamWriter.
+
+class _LimitedReader:
+    """File-like view of at most ``length`` bytes of ``stream``, counting what was read."""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.stream.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        self.bytes_read += len(data)
+        return data
+
+
+def create_upload_session(user, filename, size):
+    """Start a chunked upload and return its UploadSession."""
+    if size > get_max_upload_size():
+        raise InvalidImageUpload(
+            f"El archivo es demasiado grande. Máximo {get_max_upload_size() // (1024 * 1024)}MB."
+        )
+    return UploadSession.objects.create(
+        id=uuid.uuid4().hex, user=user, filename=os.path.basename(filename), size=size,
+    )
+
+
+def get_upload_session(session_id, user):
+    """Return the session if it exists, has not expired and belongs to ``user``, else None."""
+    cutoff = timezone.now() - timedelta(seconds=SESSION_TIMEOUT)
+    return UploadSession.objects.filter(pk=session_id, user_id=user.pk, updated_at__gte=cutoff).first()
+
+
+def append_chunk(session, start, stream, length, storage=default_storage):
+    """
+    Append ``length`` bytes read from ``stream`` at byte ``start``.
+
+    Returns False (nothing appended) when ``start`` is not the session
+    offset, also when another request appended at that offset first, so the
+    client can resume from the offset it gets back.
+    """
+    if start != session.offset or start + length > session.size:
+        return False
+    reader = _LimitedReader(stream, length)
+    name = store_stream(
+        reader, f'{CHUNK_PREFIX}{session.pk}/{start:012d}-{uuid.uuid4().hex[:8]}.part',
+        'application/octet-stream', storage,
+    )
+    offset = start + reader.bytes_read
+    chunks = session.chunks + [name]
+    # Only the request that finds the offset unchanged appends its chunk
+    appended = UploadSession.objects.filter(pk=session.pk, offset=start).update(
+        offset=offset, chunks=chunks, updated_at=timezone.now()
+    )
+    if not appended:
+        storage.delete(name)
+        session.refresh_from_db()
+        return False
+    session.offset, session.chunks = offset, chunks
+    return True
+
+
+def complete_upload_session(session, storage=default_storage):
+    """Store a fully received session through ImageStreamWriter and return the StoredImageUpload."""
+    # Deleting the row claims the session: a second completion finds nothing
+    claimed, _ = UploadSession.objects.filter(pk=session.pk, offset=session.size).delete()
+    if not claimed or session.offset != session.size:
+        raise InvalidImageUpload('La subida está incompleta.')
+    writer = ImageStreamWriter(session.filename, content_addressed=True)
+    try:
+        for name in session.chunks:
+            with storage.open(name, 'rb') as source:
+                for data in iter(lambda: source.read(READ_SIZE), b''):
+                    writer.write(data)
+        stored = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        delete_many(session.chunks, storage)
+    return stored
+
+
+def delete_upload_session(session, storage=default_storage):
+    UploadSession.objects.filter(pk=session.pk).delete()
+    delete_many(session.chunks, storage)
+
+
+def delete_expired_upload_sessions(storage=default_storage):
+    """Delete sessions untouched for SESSION_TIMEOUT and their chunks; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=SESSION_TIMEOUT)
+    expired = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in expired:
+        delete_upload_session(session, storage)
+    return len(expired)
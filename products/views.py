@@ -1,7 +1,7 @@
 # products/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
 from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 from django.utils.decorators import method_decorator
@@ -9,23 +9,42 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from rest_framework.utils.urls import replace_query_param
 from .models import Category, Product, ImageUpload
 from .forms import ProductSearchForm, ProductForm, SimpleImageUploadForm
 from .serializers import (
     CategorySerializer, ProductSerializer,
     ProductListSerializer
 )
+from .conditional import (
+    CACHE_CONTROL, CatalogValidators, ConditionalGetMixin,
+    get_not_modified_response
+)
+from .uploads import (
+    CHUNK_SIZE, InvalidImageUpload, StoredImageUpload, StreamingImageUploadHandler,
+    append_chunk, complete_upload_session, create_upload_session,
+    delete_upload_session, discard_stored_upload, get_upload_session
+)
+from .facets import get_facet_counts
+from .image_queries import KeysetPage, get_image_stats, search_images
+from .image_urls import resolve_image_url
+from .presigned import LocalUploadSigner, get_upload_signer, issue_upload, verify_upload
+from . import snapshot, storage_probe
 import logging
+import re
 import os
 
 logger = logging.getLogger('products')
@@ -44,6 +63,10 @@ def product_list(request, category_slug=None):
         category = get_object_or_404(Category, slug=category_slug)
         products = products.filter(category=category)
 
+    category_counts = get_facet_counts()['category']
+    for c in categories:
+        c.available_count = category_counts.get(c.pk, 0)
+
     context = {
         'category': category,
         'categories': categories,
@@ -108,7 +131,23 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class CategoryListAPIView(generics.ListCreateAPIView):
+class ValuesListMixin:
+    """
+    List GET requests through ``ProductListSerializer``'s ``.values()`` fast path.
+
+    Filtering, ordering and pagination behave as usual; only the row fetch and
+    serialization are replaced.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = ProductListSerializer.values_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(ProductListSerializer.serialize_values(page, request))
+        return Response(ProductListSerializer.serialize_values(queryset, request))
+
+
+class CategoryListAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     """API view for listing and creating categories."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -117,6 +156,9 @@ class CategoryListAPIView(generics.ListCreateAPIView):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    cache_control_endpoint = 'category_list'
+    # products_count changes whenever a product of the category changes
+    validator_related = ('products__updated_at',)
 
 
 class CategoryDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -126,7 +168,7 @@ class CategoryDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [AllowAny]
 
 
-class ProductListAPIView(generics.ListCreateAPIView):
+class ProductListAPIView(ConditionalGetMixin, ValuesListMixin, generics.ListCreateAPIView):
     """API view for listing and creating products."""
     queryset = Product.objects.filter(available=True)
     permission_classes = [AllowAny]
@@ -140,6 +182,8 @@ class ProductListAPIView(generics.ListCreateAPIView):
     ordering_fields = ['name', 'price', 'created_at', 'updated_at']
     ordering = ['-created_at']
     pagination_class = StandardResultsSetPagination
+    cache_control_endpoint = 'product_list'
+    validator_related = ('category__updated_at',)
 
     def get_serializer_class(self):
         """Use different serializer for list vs create."""
@@ -148,37 +192,98 @@ class ProductListAPIView(generics.ListCreateAPIView):
         return ProductSerializer
 
 
-class ProductDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailAPIView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """API view for retrieving, updating and deleting products."""
     queryset = Product.objects.filter(available=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
+    cache_control_endpoint = 'product_detail'
+    validator_related = ('category__updated_at',)
+
+
+def _snapshot_response(request, entry, endpoint):
+    """Serve a pre-serialized snapshot entry as raw JSON bytes."""
+    validators = CatalogValidators(entry['etag'], None)
+    not_modified = get_not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    patch_cache_control(response, **CACHE_CONTROL[endpoint])
+    return response
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def featured_products_api(request):
-    """API endpoint for featured products."""
-    products = Product.objects.filter(available=True).order_by('-created_at')[:8]
-    serializer = ProductListSerializer(products, many=True, context={'request': request})
-    return Response(serializer.data)
+    """API endpoint for featured products, served from the catalog snapshot."""
+    entry = snapshot.get_entry(snapshot.FEATURED)
+    return _snapshot_response(request, entry, 'featured_products')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_index_api(request):
+    """
+    API endpoint with the index of available products, served from the catalog snapshot.
+
+    Paginated like ``products_by_category_api`` (``?page=N``, with
+    ``X-Total-Count`` and ``Link``), in pages of ``snapshot.INDEX_PAGE_SIZE``.
+    """
+    page = _snapshot_page(request)
+    entry = snapshot.get_entry(snapshot.index_page_name(page)) if page else None
+    if entry is None:
+        return Response(
+            {'error': 'Invalid page'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return _paged_snapshot_response(request, entry, page)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def products_by_category_api(request, category_slug):
-    """API endpoint for products by category."""
-    try:
-        category = Category.objects.get(slug=category_slug)
-        products = Product.objects.filter(category=category, available=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
-    except Category.DoesNotExist:
+    """
+    API endpoint for products by category, served from the catalog snapshot.
+
+    The body is a JSON list of one page (``?page=N``); the total and the
+    neighbouring pages are exposed through ``X-Total-Count`` and ``Link``.
+    """
+    page = _snapshot_page(request)
+    entry = snapshot.get_entry(snapshot.category_page_name(category_slug, page)) if page else None
+
+    if entry is None:
+        if snapshot.get_entry(snapshot.category_page_name(category_slug, 1)) is None:
+            return Response(
+                {'error': 'Category not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(
-            {'error': 'Category not found'},
+            {'error': 'Invalid page'},
             status=status.HTTP_404_NOT_FOUND
         )
+    return _paged_snapshot_response(request, entry, page)
+
+
+def _snapshot_page(request):
+    """The ``?page=N`` of a snapshot listing; 0 when it is not a number."""
+    page = request.query_params.get('page', '1')
+    return int(page) if page.isdigit() else 0
+
+
+def _paged_snapshot_response(request, entry, page):
+    response = _snapshot_response(request, entry, 'product_list')
+    response['X-Total-Count'] = entry['count']
+    links = []
+    if page > 1:
+        links.append(f'<{replace_query_param(request.build_absolute_uri(), "page", page - 1)}>; rel="prev"')
+    if page < entry['num_pages']:
+        links.append(f'<{replace_query_param(request.build_absolute_uri(), "page", page + 1)}>; rel="next"')
+    if links:
+        response['Link'] = ', '.join(links)
+    return response
 
 
 # Product Management Views (for admin/staff)
@@ -277,8 +382,21 @@ def product_delete(request, product_id):
 
 # Simple Image Upload Views
 @login_required
+@csrf_exempt
 def image_upload(request):
-    """Simple view for uploading images."""
+    """
+    Simple view for uploading images.
+
+    The image is streamed to storage while the request body is parsed, so the
+    upload handler has to be installed before CSRF validation reads POST.
+    """
+    upload_handler = StreamingImageUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+    return _image_upload(request, upload_handler)
+
+
+@csrf_protect
+def _image_upload(request, upload_handler):
     user = request.user.username or 'Anonymous'
 
     if request.method == 'POST':
@@ -302,6 +420,9 @@ def image_upload(request):
             image_logger.warning(f"[UPLOAD] No files received in POST request")
             image_logger.warning(f"[UPLOAD] POST data keys: {list(request.POST.keys()) if request.POST else 'None'}")
 
+        for field_name, error in upload_handler.errors.items():
+            messages.error(request, error)
+
         form = SimpleImageUploadForm(request.POST, request.FILES)
 
         if form.is_valid():
@@ -316,9 +437,10 @@ def image_upload(request):
 
                 # Check if image was actually saved
                 if image_upload.image:
-                    file_size = image_upload.image.size
+                    streamed = isinstance(request.FILES.get('image'), StoredImageUpload)
+                    file_size = request.FILES['image'].size if streamed else image_upload.image.size
                     file_name = image_upload.image.name
-                    file_url = image_upload.image.url if hasattr(image_upload.image, 'url') else 'No URL'
+                    file_url = image_upload.get_image_url
 
                     image_logger.info(f"[SUCCESS] === IMAGE UPLOAD COMPLETED SUCCESSFULLY ===")
                     image_logger.info(f"[SUCCESS] Image ID: {image_upload.id}")
@@ -330,20 +452,24 @@ def image_upload(request):
                     image_logger.info(f"[SUCCESS] User: {user}")
                     image_logger.info(f"[SUCCESS] Storage type: {type(image_upload.image.storage).__name__}")
 
-                    # Verify file exists in storage
-                    try:
-                        storage = image_upload.image.storage
-                        exists = storage.exists(file_name)
-                        image_logger.info(f"[STORAGE] File verification: exists={exists}")
+                    if streamed:
+                        image_logger.info(f"[SUCCESS] SHA-256: {request.FILES['image'].sha256}")
+
+                    # Verify file exists in storage (streamed files were written in place)
+                    if not streamed:
+                        try:
+                            storage = image_upload.image.storage
+                            exists = storage.exists(file_name)
+                            image_logger.info(f"[STORAGE] File verification: exists={exists}")
 
-                        # Additional storage info
-                        if hasattr(storage, 'bucket_name'):
-                            image_logger.info(f"[STORAGE] Bucket: {storage.bucket_name}")
-                        if hasattr(storage, 'region_name'):
-                            image_logger.info(f"[STORAGE] Region: {storage.region_name}")
+                            # Additional storage info
+                            if hasattr(storage, 'bucket_name'):
+                                image_logger.info(f"[STORAGE] Bucket: {storage.bucket_name}")
+                            if hasattr(storage, 'region_name'):
+                                image_logger.info(f"[STORAGE] Region: {storage.region_name}")
 
-                    except Exception as storage_check_error:
-                        image_logger.warning(f"[STORAGE] Could not verify file existence: {str(storage_check_error)}")
+                        except Exception as storage_check_error:
+                            image_logger.warning(f"[STORAGE] Could not verify file existence: {str(storage_check_error)}")
 
                     messages.success(request, f'Imagen "{image_upload.title}" subida exitosamente.')
                     image_logger.info(f"[REDIRECT] Redirecting to image list for user: {user}")
@@ -367,11 +493,13 @@ def image_upload(request):
                         image_logger.error(f"[ERROR] {line}")
 
                 messages.error(request, 'Error al guardar la imagen. Intente nuevamente.')
+                _discard_streamed_upload(request)
         else:
             image_logger.warning(f"[WARNING] Invalid form submission in image_upload: {form.errors}, User={user}")
             for field, errors in form.errors.items():
                 for error in errors:
                     image_logger.warning(f"   Field '{field}': {error}")
+            _discard_streamed_upload(request)
     else:
         image_logger.debug(f"[PAGE] GET request to image_upload page by user: {user}")
 
@@ -384,79 +512,208 @@ def image_upload(request):
     return render(request, 'products/image_upload.html', context)
 
 
-@login_required
-def image_list(request):
-    """View for listing uploaded images with pagination and search."""
-    user = request.user.username or 'Anonymous'
-    start_time = timezone.now()
+def _discard_streamed_upload(request):
+    """Remove the file the streaming handler stored for a submission that was not saved."""
+    uploaded = request.FILES.get('image')
+    if isinstance(uploaded, StoredImageUpload):
+        discard_stored_upload(uploaded)
 
-    # Get search query
-    search_query = request.GET.get('q', '').strip()
-    page = request.GET.get('page', '1')
 
-    image_logger.info(f"[LIST] === STARTING IMAGE LIST REQUEST ===")
-    image_logger.info(f"[LIST] GET request to image_list by user: {user}")
-    image_logger.info(f"[LIST] Page: {page}, Search: '{search_query}'")
-    image_logger.info(f"[LIST] Request timestamp: {start_time}")
-    image_logger.info(f"[LIST] Remote IP: {request.META.get('REMOTE_ADDR', 'Unknown')}")
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
 
-    # Base queryset
-    images = ImageUpload.objects.all()
-    total_before_filter = images.count()
-    image_logger.info(f"[LIST] Total images in database: {total_before_filter}")
 
-    # Apply search filter if query exists
-    if search_query:
-        images = images.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query)
+def _upload_session_payload(session):
+    return {
+        'id': session.id,
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'chunk_size': CHUNK_SIZE,
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def upload_session_create(request):
+    """Start a resumable chunked image upload (``filename`` and ``size`` in bytes)."""
+    filename = request.data.get('filename')
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        size = 0
+    if not filename or size <= 0:
+        return Response({'error': 'filename and size are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        session = create_upload_session(request.user, filename, size)
+    except InvalidImageUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    image_logger.info(f"[CHUNKED] Upload session {session.id} started: {filename} ({size} bytes)")
+    return Response(_upload_session_payload(session), status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAdminUser])
+def upload_session_detail(request, session_id):
+    """
+    Inspect, append to or abort a chunked upload.
+
+    ``PUT`` takes the raw bytes with ``Content-Range: bytes start-end/size``.
+    A chunk that does not start at the session offset gets 409 with the
+    offset to resume from.
+    """
+    session = get_upload_session(session_id, request.user)
+    if session is None:
+        return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        delete_upload_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    if request.method == 'PUT':
+        match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+        if not match or int(match.group(3)) != session.size:
+            return Response({'error': 'Invalid Content-Range'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = int(match.group(1)), int(match.group(2))
+        length = end - start + 1
+        if length <= 0 or length > CHUNK_SIZE or length != int(request.headers.get('Content-Length') or 0):
+            return Response({'error': 'Invalid chunk length'}, status=status.HTTP_400_BAD_REQUEST)
+        if not append_chunk(session, start, request.stream, length):
+            return Response(_upload_session_payload(session), status=status.HTTP_409_CONFLICT)
+
+    return Response(_upload_session_payload(session))
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def upload_session_complete(request, session_id):
+    """Store a fully received chunked upload as an ImageUpload."""
+    session = get_upload_session(session_id, request.user)
+    if session is None:
+        return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        stored = complete_upload_session(session)
+    except InvalidImageUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    image = ImageUpload(
+        title=request.data.get('title') or ImageUpload.title_from_filename(session.filename),
+        description=request.data.get('description', ''),
+        image=stored.storage_name,
+        blob=stored.blob,
+    )
+    image.save()
+    image_logger.info(f"[CHUNKED] Upload session {session_id} stored as image {image.id}")
+    return Response({
+        'id': image.id,
+        'title': image.title,
+        'image_url': image.get_image_url,
+        'size': stored.size,
+        'sha256': stored.sha256,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def presigned_upload_create(request):
+    """
+    Issue a direct-to-storage upload target for an image.
+
+    Body: ``filename``, ``content_type`` and optionally ``target``
+    (``upload`` or ``product``) and ``product_id``.
+    """
+    filename = request.data.get('filename')
+    if not filename:
+        return Response({'error': 'filename is required'}, status=status.HTTP_400_BAD_REQUEST)
+    product_id = request.data.get('product_id') or None
+    if product_id is not None and not Product.objects.filter(pk=product_id).exists():
+        return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        data = issue_upload(
+            request, filename, request.data.get('content_type', ''),
+            target=request.data.get('target', 'upload'), product_id=product_id,
         )
-        image_logger.info(f"[SEARCH] Search applied: '{search_query}'")
-        image_logger.info(f"[SEARCH] Results: {images.count()} of {total_before_filter} images found")
+    except InvalidImageUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['PUT'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def presigned_upload_put(request, token):
+    """Local stand-in for a presigned storage URL: the signed token authorizes the PUT."""
+    signer = get_upload_signer()
+    if not isinstance(signer, LocalUploadSigner):
+        return Response({'error': 'Direct uploads go to the storage service'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        stored = signer.receive(token, request.stream, int(request.headers.get('Content-Length') or 0))
+    except InvalidImageUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'size': stored.size, 'sha256': stored.sha256})
 
-    # Order by upload date (newest first)
-    images = images.order_by('-uploaded_at')
 
-    # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(images, 12)  # 12 images per page
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def presigned_upload_complete(request):
+    """
+    Register a finished direct upload and queue its thumbnails.
 
+    Creates an ``ImageUpload`` or sets the product image, depending on the
+    ticket; product tickets without a product just return the stored name.
+    """
     try:
-        images_page = paginator.page(page)
-        image_logger.debug(f"[PAGE] Page {page} loaded with {images_page.object_list.count()} images")
-    except PageNotAnInteger:
-        images_page = paginator.page(1)
-        image_logger.warning(f"[WARNING] Invalid page number '{page}', defaulting to page 1")
-    except EmptyPage:
-        images_page = paginator.page(paginator.num_pages)
-        image_logger.warning(f"[WARNING] Page {page} out of range, showing last page {paginator.num_pages}")
-
-    # Statistics
-    total_images = ImageUpload.objects.count()
-    recent_uploads = ImageUpload.objects.filter(
-        uploaded_at__gte=timezone.now() - timezone.timedelta(days=7)
-    ).count()
-
-    # Performance logging
-    end_time = timezone.now()
-    duration = (end_time - start_time).total_seconds() * 1000  # milliseconds
-
-    image_logger.info(f"[PERF] === IMAGE LIST RENDERED SUCCESSFULLY ===")
-    image_logger.info(f"[PERF] Execution time: {duration:.2f}ms")
-    image_logger.info(f"[PERF] Total images in DB: {total_images}")
-    image_logger.info(f"[PERF] Recent uploads (7 days): {recent_uploads}")
-    image_logger.info(f"[PERF] Images on current page: {images_page.object_list.count()}")
-    image_logger.info(f"[PERF] Page: {images_page.number}/{paginator.num_pages}")
-    image_logger.info(f"[PERF] Search query: '{search_query}'")
-    image_logger.info(f"[PERF] User: {user}")
-    image_logger.info(f"[PERF] Response: 200 OK")
+        upload = verify_upload(request.user, request.data.get('ticket', ''))
+    except InvalidImageUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = {'image': upload['name'], 'size': upload['size'], 'content_type': upload['content_type']}
+    if upload['target'] == 'upload':
+        image = ImageUpload(
+            title=request.data.get('title', ''),
+            description=request.data.get('description', ''),
+            image=upload['name'],
+        )
+        image.save()
+        data.update(id=image.id, title=image.title, image_url=image.get_image_url)
+    elif upload['product_id'] is not None:
+        product = get_object_or_404(Product, pk=upload['product_id'])
+        product.image = upload['name']
+        product.save()
+        data.update(id=product.id, image_url=product.get_image_url)
+    else:
+        data['image_url'] = resolve_image_url(upload['name'])
+
+    image_logger.info(f"[PRESIGNED] Registered direct upload {upload['name']} ({upload['target']})")
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@login_required
+def image_list(request):
+    """View for listing uploaded images with pagination and search."""
+    start_time = timezone.now()
+    search_query = request.GET.get('q', '').strip()
+
+    images = ImageUpload.objects.all()
+    if search_query:
+        images = search_images(images, search_query)
+    images_page = KeysetPage(images, request.GET.get('cursor'))
+    stats = get_image_stats()
+
+    duration = (timezone.now() - start_time).total_seconds() * 1000
+    image_logger.info(
+        f"[LIST] {len(images_page)} images, search='{search_query}', "
+        f"user={request.user.username or 'Anonymous'}, {duration:.2f}ms"
+    )
 
     context = {
         'images': images_page,
         'title': 'Imágenes Subidas',
         'search_query': search_query,
-        'total_images': total_images,
-        'recent_uploads': recent_uploads,
+        'total_images': stats['total'],
+        'recent_uploads': stats['recent'],
         'is_paginated': images_page.has_other_pages(),
         'page_obj': images_page,
     }
@@ -469,8 +726,11 @@ def image_detail(request, image_id):
     user = request.user.username or 'Anonymous'
 
     try:
-        image = get_object_or_404(ImageUpload, id=image_id)
-        file_size = image.image.size if image.image else 0
+        image = get_object_or_404(ImageUpload.objects.select_related('blob'), id=image_id)
+        if image.blob:
+            file_size = image.blob.size
+        else:
+            file_size = image.image.size if image.image else 0
         file_name = image.image.name if image.image else 'No file'
 
         image_logger.info(f"[VIEW] Image detail viewed: ID={image.id}, Title='{image.title}', File='{file_name}', Size={file_size} bytes, User={user}")
@@ -495,8 +755,11 @@ def image_delete(request, image_id):
     user = request.user.username or 'Anonymous'
 
     try:
-        image = get_object_or_404(ImageUpload, id=image_id)
-        file_size = image.image.size if image.image else 0
+        image = get_object_or_404(ImageUpload.objects.select_related('blob'), id=image_id)
+        if image.blob:
+            file_size = image.blob.size
+        else:
+            file_size = image.image.size if image.image else 0
         file_name = image.image.name if image.image else 'No file'
 
         if request.method == 'POST':
@@ -506,22 +769,18 @@ def image_delete(request, image_id):
             # Log before deletion
             image_logger.warning(f"[DELETE] Starting deletion process for image: ID={image_id_deleted}, Title='{title}', File='{file_name}', Size={file_size} bytes, User={user}")
 
-            # Step 1: Delete the physical file first
+            # Step 1: Delete the physical file first. Deduplicated files are
+            # shared: deleting the record releases the blob for gc_image_blobs.
             file_deleted = False
-            if image.image and image.image.name:
+            if image.blob:
+                file_deleted = True
+                image_logger.info(f"[FILE] Releasing shared blob '{file_name}', User={user}")
+            elif image.image and image.image.name:
                 try:
-                    # Get the storage backend
-                    storage = image.image.storage
-
-                    # Check if file exists
-                    if storage.exists(image.image.name):
-                        # Delete the file
-                        storage.delete(image.image.name)
-                        file_deleted = True
-                        image_logger.info(f"[FILE] Physical file deleted: '{file_name}' from storage, User={user}")
-                    else:
-                        image_logger.warning(f"[WARNING] Physical file not found: '{file_name}' - may have been already deleted, User={user}")
-                        file_deleted = True  # Consider it deleted since it doesn't exist
+                    # delete() is a no-op for missing files, no exists() round trip needed
+                    image.image.storage.delete(image.image.name)
+                    file_deleted = True
+                    image_logger.info(f"[FILE] Physical file deleted: '{file_name}' from storage, User={user}")
                 except Exception as file_error:
                     image_logger.error(f"[ERROR] Error deleting physical file '{file_name}': {str(file_error)}, User={user}")
                     # Continue with database deletion even if file deletion fails
@@ -564,282 +823,88 @@ def image_delete(request, image_id):
 
 
 # S3 Diagnostic View
-@login_required
-def s3_diagnostic(request):
-    """Diagnostic view for S3 configuration and connectivity"""
-    try:
-        user = request.user.username or 'Anonymous'
-        start_time = timezone.now()
-
-        image_logger.info(f"[S3_DIAGNOSTIC] Starting diagnostic for user: {user}")
-        image_logger.info(f"[S3_DIAGNOSTIC] Request timestamp: {start_time}")
-        image_logger.info(f"[S3_DIAGNOSTIC] User agent: {request.META.get('HTTP_USER_AGENT', 'Unknown')}")
-
-        # Basic info
-        diagnostic_info = {
-            'timestamp': timezone.now(),
-            'user': user,
-            'storage_type': 'Unknown',
-            'bucket_name': 'N/A',
-            'region': 'N/A',
-            'tests': [],
-            'folders': {
-                'count': 0,
-                'list': [],
-                'total_objects': 0,
-                'note': 'Diagnostic not completed'
-            },
-            'recent_uploads': []
-        }
+OPERATION_NAMES = {
+    'list': 'Listado (list)',
+    'put': 'Subida (put)',
+    'head': 'Existencia (head)',
+    'get': 'Lectura (get)',
+    'delete': 'Eliminación (delete)',
+}
 
-        # Safe storage info
-        try:
-            diagnostic_info['storage_type'] = default_storage.__class__.__name__
-            diagnostic_info['bucket_name'] = getattr(default_storage, 'bucket_name', 'N/A')
-            diagnostic_info['region'] = getattr(default_storage, 'region_name', 'N/A')
-
-            image_logger.info(f"[S3_DIAGNOSTIC] Storage type: {diagnostic_info['storage_type']}")
-            image_logger.info(f"[S3_DIAGNOSTIC] Bucket name: {diagnostic_info['bucket_name']}")
-            image_logger.info(f"[S3_DIAGNOSTIC] Region: {diagnostic_info['region']}")
-        except Exception as e:
-            image_logger.warning(f"[S3_DIAGNOSTIC] Could not get storage info: {str(e)}")
-            pass
-
-        # Test 1: Environment variables (safe)
-        image_logger.info("[S3_DIAGNOSTIC] === TEST 1: Environment Variables ===")
-        try:
-            aws_access_key = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
-            aws_secret_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
-            bucket_name = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'management360')
-            region_name = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-2')
-
-            env_status = 'success' if aws_access_key and aws_secret_key else 'error'
-
-            image_logger.info(f"[S3_DIAGNOSTIC] AWS_ACCESS_KEY_ID: {'✓ Set' if aws_access_key else '✗ Not set'}")
-            image_logger.info(f"[S3_DIAGNOSTIC] AWS_SECRET_ACCESS_KEY: {'✓ Set' if aws_secret_key else '✗ Not set'}")
-            image_logger.info(f"[S3_DIAGNOSTIC] AWS_STORAGE_BUCKET_NAME: {bucket_name}")
-            image_logger.info(f"[S3_DIAGNOSTIC] AWS_S3_REGION_NAME: {region_name}")
-            image_logger.info(f"[S3_DIAGNOSTIC] Environment test result: {env_status}")
-
-            diagnostic_info['tests'].append({
-                'name': 'Environment Variables',
-                'status': env_status,
-                'details': {
-                    'AWS_ACCESS_KEY_ID': 'Set' if aws_access_key else 'Not set',
-                    'AWS_SECRET_ACCESS_KEY': 'Set' if aws_secret_key else 'Not set',
-                    'AWS_STORAGE_BUCKET_NAME': bucket_name,
-                    'AWS_S3_REGION_NAME': region_name
-                }
-            })
-        except Exception as e:
-            image_logger.error(f"[S3_DIAGNOSTIC] Environment variables test failed: {str(e)}")
-            diagnostic_info['tests'].append({
-                'name': 'Environment Variables',
-                'status': 'error',
-                'details': {'error': str(e)}
-            })
-
-        # Test 2: Storage connectivity (safe)
-        image_logger.info("[S3_DIAGNOSTIC] === TEST 2: Storage Connectivity ===")
-        try:
-            if hasattr(default_storage, 'bucket') and default_storage.bucket:
-                image_logger.info("[S3_DIAGNOSTIC] S3 bucket detected")
-                if hasattr(default_storage.bucket, 'objects'):
-                    image_logger.info("[S3_DIAGNOSTIC] Bucket.objects available, attempting to list objects...")
-                    objects = list(default_storage.bucket.objects.limit(5))
-                    image_logger.info(f"[S3_DIAGNOSTIC] Found {len(objects)} objects in bucket")
-
-                    if objects:
-                        image_logger.info("[S3_DIAGNOSTIC] Sample objects:")
-                        for i, obj in enumerate(objects[:3]):
-                            image_logger.info(f"[S3_DIAGNOSTIC]   {i+1}. {obj.key} ({obj.size} bytes)")
-
-                    diagnostic_info['tests'].append({
-                        'name': 'S3 Connectivity',
-                        'status': 'success',
-                        'details': {
-                            'objects_found': len(objects),
-                            'sample_objects': [obj.key for obj in objects[:3]] if objects else []
-                        }
-                    })
-                else:
-                    image_logger.warning("[S3_DIAGNOSTIC] S3 storage detected but bucket.objects not available")
-                    diagnostic_info['tests'].append({
-                        'name': 'Storage Type',
-                        'status': 'info',
-                        'details': {'note': 'S3 storage detected but bucket.objects not available'}
-                    })
-            else:
-                image_logger.info(f"[S3_DIAGNOSTIC] Not S3 storage - using {diagnostic_info['storage_type']}")
-                diagnostic_info['tests'].append({
-                    'name': 'Storage Type',
-                    'status': 'info',
-                    'details': {
-                        'storage_type': diagnostic_info['storage_type'],
-                        'note': 'Not S3 storage - using local filesystem'
-                    }
-                })
-        except Exception as e:
-            image_logger.error(f"[S3_DIAGNOSTIC] Storage connectivity test failed: {str(e)}")
-            image_logger.error(f"[S3_DIAGNOSTIC] Error type: {type(e).__name__}")
-            diagnostic_info['tests'].append({
-                'name': 'S3 Connectivity',
-                'status': 'error',
-                'details': {
-                    'error': str(e),
-                    'error_type': type(e).__name__
-                }
-            })
-
-        # Test 3: File upload (safe)
-        image_logger.info("[S3_DIAGNOSTIC] === TEST 3: File Upload Test ===")
-        try:
-            test_content = b"S3 diagnostic test file"
-            test_filename = f"diagnostic_test_{int(timezone.now().timestamp())}.txt"
-
-            image_logger.info(f"[S3_DIAGNOSTIC] Creating test file: {test_filename}")
-            image_logger.info(f"[S3_DIAGNOSTIC] File content size: {len(test_content)} bytes")
-
-            file_obj = ContentFile(test_content)
-            image_logger.info("[S3_DIAGNOSTIC] ContentFile created, attempting to save...")
-
-            saved_name = default_storage.save(test_filename, file_obj)
-            image_logger.info(f"[S3_DIAGNOSTIC] File saved as: {saved_name}")
-
-            exists = default_storage.exists(saved_name)
-            image_logger.info(f"[S3_DIAGNOSTIC] File exists check: {exists}")
-
-            file_url = 'No URL method'
-            if hasattr(default_storage, 'url'):
-                try:
-                    file_url = default_storage.url(saved_name)
-                    image_logger.info(f"[S3_DIAGNOSTIC] Generated URL: {file_url}")
-                except Exception as url_error:
-                    file_url = 'URL generation failed'
-                    image_logger.warning(f"[S3_DIAGNOSTIC] URL generation failed: {str(url_error)}")
-            else:
-                image_logger.info("[S3_DIAGNOSTIC] Storage does not have URL method")
-
-            # Clean up
-            cleanup_ok = False
-            try:
-                default_storage.delete(saved_name)
-                cleanup_ok = True
-                image_logger.info("[S3_DIAGNOSTIC] Test file cleanup successful")
-            except Exception as cleanup_error:
-                image_logger.warning(f"[S3_DIAGNOSTIC] Test file cleanup failed: {str(cleanup_error)}")
-
-            upload_status = 'success' if exists else 'warning'
-            image_logger.info(f"[S3_DIAGNOSTIC] File upload test result: {upload_status}")
-
-            diagnostic_info['tests'].append({
-                'name': 'File Upload Test',
-                'status': upload_status,
-                'details': {
-                    'file_saved': saved_name,
-                    'file_exists': exists,
-                    'file_url': file_url,
-                    'cleanup_successful': cleanup_ok
-                }
-            })
-        except Exception as e:
-            image_logger.error(f"[S3_DIAGNOSTIC] File upload test failed: {str(e)}")
-            image_logger.error(f"[S3_DIAGNOSTIC] Error type: {type(e).__name__}")
-            import traceback
-            image_logger.error(f"[S3_DIAGNOSTIC] Traceback: {traceback.format_exc()}")
-
-            diagnostic_info['tests'].append({
-                'name': 'File Upload Test',
-                'status': 'error',
-                'details': {
-                    'error': str(e),
-                    'error_type': type(e).__name__
-                }
-            })
-
-        # Test 4: Recent uploads (safe)
-        try:
-            recent_uploads = ImageUpload.objects.filter(
-                uploaded_at__gte=timezone.now() - timezone.timedelta(hours=24)
-            ).order_by('-uploaded_at')[:5]
-
-            diagnostic_info['recent_uploads'] = []
-            for upload in recent_uploads:
-                try:
-                    diagnostic_info['recent_uploads'].append({
-                        'id': upload.id,
-                        'title': upload.title or f'Image {upload.id}',
-                        'filename': upload.image.name if upload.image else 'No file',
-                        'size': upload.image.size if upload.image else 0,
-                        'uploaded_at': upload.uploaded_at,
-                        'url': upload.image.url if upload.image else 'No URL'
-                    })
-                except:
-                    diagnostic_info['recent_uploads'].append({
-                        'id': upload.id,
-                        'title': f'Image {upload.id}',
-                        'filename': 'Error loading file info',
-                        'size': 0,
-                        'uploaded_at': upload.uploaded_at,
-                        'url': 'No URL'
-                    })
-        except Exception as e:
-            diagnostic_info['recent_uploads'] = []
-            diagnostic_info['tests'].append({
-                'name': 'Database Query',
-                'status': 'error',
-                'details': {'error': f'Could not query recent uploads: {str(e)}'}
-            })
-
-        # Calculate execution time
-        end_time = timezone.now()
-        execution_time = (end_time - start_time).total_seconds() * 1000  # milliseconds
-
-        # Count test results
-        test_counts = {'success': 0, 'error': 0, 'warning': 0, 'info': 0}
-        for test in diagnostic_info['tests']:
-            status = test.get('status', 'unknown')
-            if status in test_counts:
-                test_counts[status] += 1
-
-        # Log summary
-        image_logger.info("[S3_DIAGNOSTIC] === DIAGNOSTIC SUMMARY ===")
-        image_logger.info(f"[S3_DIAGNOSTIC] Execution time: {execution_time:.2f}ms")
-        image_logger.info(f"[S3_DIAGNOSTIC] Tests run: {len(diagnostic_info['tests'])}")
-        image_logger.info(f"[S3_DIAGNOSTIC] Results: {test_counts['success']} success, {test_counts['error']} errors, {test_counts['warning']} warnings, {test_counts['info']} info")
-        image_logger.info(f"[S3_DIAGNOSTIC] Recent uploads found: {len(diagnostic_info['recent_uploads'])}")
-        image_logger.info(f"[S3_DIAGNOSTIC] Folders detected: {diagnostic_info['folders']['count']}")
-        image_logger.info("[S3_DIAGNOSTIC] === END DIAGNOSTIC ===")
 
-        context = {
-            'diagnostic_info': diagnostic_info,
-            'title': 'Diagnóstico S3'
+@login_required
+async def s3_diagnostic(request):
+    """
+    Show the latest cached storage probe (see products.storage_probe).
+
+    The page never talks to the storage itself; a POST queues a new probe.
+    Async: cache reads and the uploads query are awaited, and only the
+    template (context processors query the database) renders in a thread.
+    """
+    if request.method == 'POST':
+        if await sync_to_async(storage_probe.schedule_probe)(force=True):
+            messages.info(request, 'Diagnóstico en ejecución. Recargue la página en unos segundos.')
+        else:
+            messages.info(request, 'Ya hay un diagnóstico en ejecución.')
+        return redirect('products:s3_diagnostic')
+
+    probe = await storage_probe.aget_latest_probe()
+    await sync_to_async(storage_probe.schedule_probe)()
+    user = await request.auser()
+
+    aws_access_key = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
+    aws_secret_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
+    tests = [{
+        'name': 'Environment Variables',
+        'status': 'success' if aws_access_key and aws_secret_key else 'error',
+        'details': {
+            'AWS_ACCESS_KEY_ID': 'Set' if aws_access_key else 'Not set',
+            'AWS_SECRET_ACCESS_KEY': 'Set' if aws_secret_key else 'Not set',
+            'AWS_STORAGE_BUCKET_NAME': getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'management360'),
+            'AWS_S3_REGION_NAME': getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-2'),
+        },
+    }]
+    for operation, result in (probe or {}).get('operations', {}).items():
+        details = {'latency': f"{result['ms']:.0f} ms"}
+        if not result['ok']:
+            details['error'] = result['error']
+        tests.append({
+            'name': OPERATION_NAMES.get(operation, operation),
+            'status': 'success' if result['ok'] else 'error',
+            'details': details,
+        })
+
+    recent_uploads = [
+        {
+            'id': upload.id,
+            'title': upload.title or f'Image {upload.id}',
+            'filename': upload.image.name,
+            'size': upload.blob.size if upload.blob else None,
+            'uploaded_at': upload.uploaded_at,
+            'url': upload.get_image_url,
         }
+        async for upload in ImageUpload.objects.select_related('blob').filter(
+            uploaded_at__gte=timezone.now() - timezone.timedelta(hours=24)
+        )[:5]
+    ]
 
-        return render(request, 'products/s3_diagnostic.html', context)
-
-    except Exception as e:
-        # Ultimate fallback for any unexpected error
-        error_time = timezone.now()
-        image_logger.critical(f"[S3_DIAGNOSTIC] CRITICAL ERROR at {error_time}: {str(e)}")
-        image_logger.critical(f"[S3_DIAGNOSTIC] Error type: {type(e).__name__}")
-        import traceback
-        image_logger.critical(f"[S3_DIAGNOSTIC] Full traceback: {traceback.format_exc()}")
-
-        context = {
-            'diagnostic_info': {
-                'timestamp': error_time,
-                'user': request.user.username if request.user.is_authenticated else 'Anonymous',
-                'error': f'Critical error in diagnostic: {str(e)}',
-                'error_type': type(e).__name__,
-                'tests': [{
-                    'name': 'System Status',
-                    'status': 'error',
-                    'details': {'message': 'Diagnostic system failed to load'}
-                }],
-                'folders': {'count': 0, 'list': [], 'note': 'Diagnostic failed'},
-                'recent_uploads': []
-            },
-            'title': 'Diagnóstico S3 - Error'
-        }
-        return render(request, 'products/s3_diagnostic.html', context)
\ No newline at end of file
+    diagnostic_info = {
+        'timestamp': parse_datetime(probe['timestamp']) if probe else None,
+        'user': user.username,
+        'status': probe['status'] if probe else 'unknown',
+        'storage_type': probe['storage_type'] if probe else default_storage.__class__.__name__,
+        'bucket_name': probe['bucket_name'] if probe else getattr(default_storage, 'bucket_name', 'N/A'),
+        'region': probe['region'] if probe else getattr(default_storage, 'region_name', 'N/A'),
+        'tests': tests,
+        'series': [
+            dict(point, timestamp=parse_datetime(point['timestamp']))
+            for point in reversed((await storage_probe.aget_probe_series())[-20:])
+        ],
+        'operations': storage_probe.OPERATIONS,
+        'recent_uploads': recent_uploads,
+    }
+    context = {
+        'diagnostic_info': diagnostic_info,
+        'title': 'Diagnóstico S3'
+    }
+    return await sync_to_async(render)(request, 'products/s3_diagnostic.html', context)
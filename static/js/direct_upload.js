@@ -0,0 +1,96 @@
+// Direct-to-storage image uploads
+//
+// File inputs marked with data-direct-upload="product" or "upload" send the
+// selected image straight to the storage (S3 presigned URL or the local
+// stand-in) instead of through the Django form post:
+//   1. POST /api/products/presigned/          -> upload target + ticket
+//   2. PUT the file to the upload target
+//   3. POST /api/products/presigned/complete/ -> registers the image
+// "product" inputs are then replaced by a hidden field holding the stored
+// name; "upload" forms redirect to data-success-url once registered.
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[type="file"][data-direct-upload]').forEach(initDirectUpload);
+});
+
+function initDirectUpload(input) {
+    const form = input.form;
+    if (!form || !window.fetch) return;
+
+    form.addEventListener('submit', function(event) {
+        const file = input.files[0];
+        if (!file || form.dataset.directUploadDone) return;
+        event.preventDefault();
+
+        const submit = form.querySelector('[type="submit"]');
+        if (submit) submit.disabled = true;
+
+        directUpload(input, file)
+            .then(function(result) {
+                if (input.dataset.directUpload === 'upload') {
+                    window.location.href = form.dataset.successUrl || window.location.href;
+                    return;
+                }
+                const hidden = document.createElement('input');
+                hidden.type = 'hidden';
+                hidden.name = input.name;
+                hidden.value = result.image;
+                form.appendChild(hidden);
+                input.removeAttribute('name');
+                form.dataset.directUploadDone = '1';
+                form.submit();
+            })
+            .catch(function(error) {
+                if (submit) submit.disabled = false;
+                alert('Error al subir la imagen: ' + error.message);
+            });
+    });
+}
+
+function directUpload(input, file) {
+    const form = input.form;
+    const csrfInput = form.querySelector('[name="csrfmiddlewaretoken"]');
+    const headers = {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': csrfInput ? csrfInput.value : ''
+    };
+    const target = input.dataset.directUpload;
+
+    return postJson('/api/products/presigned/', {
+        filename: file.name,
+        content_type: file.type,
+        target: target,
+        product_id: input.dataset.productId || null
+    }, headers).then(function(issued) {
+        return fetch(issued.upload.url, {
+            method: issued.upload.method,
+            headers: issued.upload.headers,
+            body: file
+        }).then(function(response) {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            const fieldValue = function(name) {
+                const field = form.querySelector('[name="' + name + '"]');
+                return field ? field.value : '';
+            };
+            return postJson('/api/products/presigned/complete/', {
+                ticket: issued.ticket,
+                title: fieldValue('title'),
+                description: fieldValue('description')
+            }, headers);
+        });
+    });
+}
+
+function postJson(url, data, headers) {
+    return fetch(url, {
+        method: 'POST',
+        headers: headers,
+        credentials: 'same-origin',
+        body: JSON.stringify(data)
+    }).then(function(response) {
+        return response.json().then(function(body) {
+            if (!response.ok) throw new Error(body.error || ('HTTP ' + response.status));
+            return body;
+        });
+    });
+}